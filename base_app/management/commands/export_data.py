@@ -0,0 +1,161 @@
+import csv
+import gzip
+import io
+import itertools
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from base_app.models import Author, Book, BookCopy, BorrowRecord
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+EXPORT_MODELS = {
+    'author': Author,
+    'book': Book,
+    'bookcopy': BookCopy,
+    'borrowrecord': BorrowRecord,
+}
+# derived from title and author name, and large
+EXCLUDED_COLUMNS = {'search_vector'}
+STATE_FILE_NAME = 'export_state.json'
+
+
+def get_export_columns(model):
+    return [field.attname for field in model._meta.concrete_fields
+            if field.attname not in EXCLUDED_COLUMNS]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+# one json object per row, the same bytes with and without orjson
+def _write_jsonl(file, columns, rows):
+    if orjson is not None:
+        file.write(b''.join(orjson.dumps(dict(zip(columns, row)), default=_json_default) +
+                            b'\n' for row in rows))
+    else:
+        file.write(''.join(json.dumps(dict(zip(columns, row)), default=_json_default,
+                                      ensure_ascii=False, separators=(',', ':')) + '\n'
+                           for row in rows).encode())
+
+
+# a header row with the column names, then one row per row, null is an empty field
+def _write_csv(file, columns, rows):
+    text = io.StringIO()
+    csv.writer(text).writerows([_json_default(value) if value is not None else ''
+                                for value in row] for row in rows)
+    file.write(text.getvalue().encode())
+
+
+# Returns the start time of the export and the time the next incremental export starts at.
+# Rows changed by transactions which were still running when the export started are not
+# in its snapshot, so the next export has to start at the start time of the oldest of them.
+# Transactions of other database users are only seen with the pg_read_all_stats role
+def _get_export_times():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT now(), least(now(), min(xact_start)) FROM pg_stat_activity '
+                       'WHERE datname = current_database() AND pid <> pg_backend_pid()')
+        return cursor.fetchone()
+
+
+# Writes the rows of model (changed since since, if given) gzipped to path, chunk_size
+# rows at a time as they are read from a server-side cursor, so memory use does not grow
+# with the table. Returns the number of rows
+def export_model(model, path, export_format, since=None, chunk_size=10000):
+    columns = get_export_columns(model)
+    queryset = model.objects.all()
+    if since is not None:
+        queryset = queryset.filter(updated_at__gte=since)
+    rows = queryset.values_list(*columns).iterator(chunk_size=chunk_size)
+    write_rows = _write_csv if export_format == 'csv' else _write_jsonl
+    number_of_rows = 0
+    # a partial file is never left under the final name
+    temporary_path = Path(f'{path}.tmp')
+    with gzip.open(temporary_path, 'wb', compresslevel=6) as file:
+        if export_format == 'csv':
+            _write_csv(file, columns, [columns])
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if len(chunk) == 0:
+                break
+            write_rows(file, columns, chunk)
+            number_of_rows += len(chunk)
+    temporary_path.replace(path)
+    return number_of_rows
+
+
+class Command(BaseCommand):
+    help = ('Exports authors, books, book copies and borrow records to gzipped jsonl or csv '
+            'files, one per model, read with server-side cursors from one snapshot. With '
+            '--incremental only the rows changed since the last export are written.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_directory')
+        parser.add_argument('--models', nargs='+', choices=list(EXPORT_MODELS),
+                            default=list(EXPORT_MODELS))
+        parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+        parser.add_argument('--incremental', action='store_true',
+                            help='export the rows changed since the last export of each '
+                                 f'model, as recorded in {STATE_FILE_NAME} of the output '
+                                 'directory, and all rows of models never exported')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='rows fetched from the cursor and written at once')
+
+    def _read_state(self, state_path):
+        if state_path.exists() is False:
+            return {}
+        return {name: parse_datetime(since)
+                for name, since in json.loads(state_path.read_text()).items()}
+
+    def _write_state(self, state_path, state):
+        temporary_path = Path(f'{state_path}.tmp')
+        temporary_path.write_text(json.dumps({name: since.isoformat()
+                                              for name, since in state.items()}, indent=2))
+        temporary_path.replace(state_path)
+
+    def handle(self, *args, **options):
+        output_directory = Path(options['output_directory'])
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size has to be at least 1')
+        try:
+            output_directory.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            raise CommandError(e)
+        state_path = output_directory / STATE_FILE_NAME
+        state = self._read_state(state_path)
+
+        if connection.in_atomic_block is True:
+            raise CommandError('export_data has to run outside of a transaction')
+        # all models are read from one snapshot, which the server-side cursors need a
+        # transaction for anyway
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+            export_time, next_since = _get_export_times()
+            label = export_time.strftime('%Y%m%dT%H%M%S')
+            for name in options['models']:
+                since = state.get(name) if options['incremental'] is True else None
+                kind = 'full' if since is None else 'incremental'
+                path = output_directory / f'{name}-{label}-{kind}.{options["format"]}.gz'
+                start = time.perf_counter()
+                number_of_rows = export_model(EXPORT_MODELS[name], path, options['format'],
+                                              since=since, chunk_size=options['chunk_size'])
+                seconds = time.perf_counter()-start
+                state[name] = next_since
+                self.stdout.write(f'{path.name}: {number_of_rows} rows, '
+                                  f'{path.stat().st_size} bytes in {seconds:.1f}s, '
+                                  f'{number_of_rows / max(seconds, 1e-9):.0f} rows/s')
+        # only written once every file is complete, so a failed export is repeated in full
+        self._write_state(state_path, state)
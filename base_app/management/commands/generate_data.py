@@ -0,0 +1,233 @@
+import hashlib
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from base_app.bulk import copy_instances
+from base_app.models import (Author, Book, BookCopy, BorrowRecord, LibraryUser,
+                             get_book_borrow_duration_in_days, get_cool_down_period_end_date,
+                             is_author_name_popular, notify_catalog_changed, uuid7)
+from base_app.words import random_word
+
+# the data ends at END_DATE unless --end-date is given, a fixed date so that the same seed
+# gives the same data whenever it runs
+END_DATE = datetime(2026, 1, 1, tzinfo=timezone.utc)
+CATALOG_YEARS = 5
+HISTORY_DAYS = 2 * 365
+
+# books per author follow a pareto distribution (a few authors wrote many books, most of
+# them a few), about 7 books per author on average
+BOOKS_PER_AUTHOR_ALPHA = 1.16
+MAX_BOOKS_PER_AUTHOR = 500
+# (values, weights)
+COPIES_PER_BOOK = ([0, 1, 2, 3, 4, 5], [8, 45, 25, 12, 6, 4])
+COPY_TYPES = ([BookCopy.BOOK_COPY_TYPE.PAPERBACK, BookCopy.BOOK_COPY_TYPE.HARDCOVER,
+               BookCopy.BOOK_COPY_TYPE.HANDMADE], [55, 35, 10])
+BORROWS_PER_COPY = ([0, 1, 2, 3, 4, 6, 10], [20, 25, 20, 15, 10, 6, 4])
+# share of copies whose last borrow record is not returned, i.e. which are lent out
+LENT_SHARE = 0.25
+BOOKS_PER_USER = 20
+MIN_USERS = 100
+
+# columns which differ between runs with the same seed
+UNSEEDED_COLUMNS = {'updated_at', 'search_vector'}
+
+
+def _seeded_uuid4(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _timestamp_ms(date):
+    return int(date.timestamp() * 1000)
+
+
+# Generates users, then authors with their books, copies and borrow histories, everything
+# drawn from one random.Random(seed) in a fixed order, so a seed always gives the same rows
+class DataGenerator:
+    def __init__(self, seed, number_of_books, number_of_users, end_date):
+        self.rng = random.Random(seed)
+        self.number_of_books = number_of_books
+        self.number_of_users = number_of_users
+        self.end_date = end_date
+        self.catalog_start_ms = _timestamp_ms(end_date-timedelta(days=CATALOG_YEARS * 365))
+        self.author_names = set()
+        self.number_of_generated_books = 0
+        self.number_of_generated_copies = 0
+
+    def users(self):
+        date_joined = self.end_date-timedelta(days=HISTORY_DAYS)
+        # an unusable password, users of generated data authenticate with tokens or
+        # force_authenticate
+        return [LibraryUser(id=user_id, username=f'user{user_id}', password='!',
+                            date_joined=date_joined)
+                for user_id in range(1, self.number_of_users+1)]
+
+    def _author(self):
+        name = f'{random_word(self.rng).capitalize()} {random_word(self.rng).capitalize()}'
+        while name in self.author_names:
+            name = f'{name} {random_word(self.rng).capitalize()}'
+        self.author_names.add(name)
+        return Author(author_id=_seeded_uuid4(self.rng), name=name,
+                      is_popular=is_author_name_popular(name))
+
+    def _number_of_books_of_author(self):
+        number_of_books = int(self.rng.paretovariate(BOOKS_PER_AUTHOR_ALPHA))
+        return min(number_of_books, MAX_BOOKS_PER_AUTHOR,
+                   self.number_of_books-self.number_of_generated_books)
+
+    def _title(self, titles):
+        title = ' '.join(random_word(self.rng)
+                         for _ in range(self.rng.randint(1, 5))).capitalize()
+        while title in titles:
+            title = f'{title} {random_word(self.rng)}'
+        titles.add(title)
+        return title
+
+    # borrow records of one copy, one after the other, each by another of users
+    def _borrow_records(self, author, book_copy, users):
+        borrow_records = []
+        borrow_duration = timedelta(days=get_book_borrow_duration_in_days())
+        borrow_date = (self.end_date-timedelta(days=HISTORY_DAYS) +
+                       timedelta(seconds=self.rng.randrange(90 * 24 * 60 * 60)))
+        for user_id in users:
+            if borrow_date >= self.end_date:
+                break
+            borrow_records.append(BorrowRecord(
+                borrow_record_id=uuid7(_timestamp_ms(borrow_date), self.rng.getrandbits(80)),
+                borrow_date=borrow_date, return_date=borrow_date+borrow_duration,
+                is_returned=True,
+                next_eligible_borrow_date=get_cool_down_period_end_date(borrow_date,
+                                                                        author.name),
+                book_copy_id=book_copy.book_copy_id, book_id=book_copy.book_id,
+                library_user_id=user_id))
+            borrow_date += borrow_duration+timedelta(
+                           seconds=self.rng.randrange(1, 120 * 24 * 60 * 60))
+        if len(borrow_records) > 0 and self.rng.random() < LENT_SHARE:
+            borrow_records[-1].is_returned = False
+            book_copy.is_lent = True
+        return borrow_records
+
+    def _book(self, author, titles):
+        book = Book(owl_id=uuid7(self.catalog_start_ms+self.number_of_generated_books,
+                                 self.rng.getrandbits(80)),
+                    title=self._title(titles), author_id=author.author_id)
+        self.number_of_generated_books += 1
+        book_copies = []
+        for _ in range(self.rng.choices(*COPIES_PER_BOOK)[0]):
+            book_copies.append(BookCopy(
+                book_copy_id=uuid7(self.catalog_start_ms+self.number_of_generated_copies,
+                                   self.rng.getrandbits(80)),
+                book_id=book.owl_id, book_copy_type=self.rng.choices(*COPY_TYPES)[0]))
+            self.number_of_generated_copies += 1
+        # a user borrows at most one copy of a book, the services look up records by book
+        numbers_of_borrows = [self.rng.choices(*BORROWS_PER_COPY)[0] for _ in book_copies]
+        users = self.rng.sample(range(1, self.number_of_users+1),
+                                min(sum(numbers_of_borrows), self.number_of_users))
+        borrow_records = []
+        for book_copy, number_of_borrows in zip(book_copies, numbers_of_borrows):
+            copy_users, users = users[:number_of_borrows], users[number_of_borrows:]
+            borrow_records.extend(self._borrow_records(author, book_copy, copy_users))
+        book.available_copies = len([book_copy for book_copy in book_copies
+                                     if book_copy.is_lent is False])
+        return book, book_copies, borrow_records
+
+    # yields (authors, books, book copies, borrow records) of at least chunk_size books,
+    # whole authors at a time
+    def chunks(self, chunk_size):
+        while self.number_of_generated_books < self.number_of_books:
+            chunk = ([], [], [], [])
+            while (len(chunk[1]) < chunk_size and
+                    self.number_of_generated_books < self.number_of_books):
+                author = self._author()
+                chunk[0].append(author)
+                titles = set()
+                for _ in range(max(1, self._number_of_books_of_author())):
+                    book, book_copies, borrow_records = self._book(author, titles)
+                    chunk[1].append(book)
+                    chunk[2].extend(book_copies)
+                    chunk[3].extend(borrow_records)
+            yield chunk
+
+
+# sha256 of the seeded columns of instances in the order they were generated, equal
+# checksums mean equal data
+def update_checksum(checksum, instances):
+    for instance in instances:
+        fields = [field for field in instance._meta.concrete_fields
+                  if field.attname not in UNSEEDED_COLUMNS]
+        checksum.update(repr(tuple(getattr(instance, field.attname)
+                                   for field in fields)).encode())
+
+
+class Command(BaseCommand):
+    help = ('Fills an empty database with generated users, authors, books, book copies of '
+            'every type and borrow histories, written with COPY. Runs with the same seed and '
+            'options write the same rows (apart from updated_at) and print the same '
+            'checksum. The number of rows is about 6 times --books.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=10000)
+        parser.add_argument('--users', type=int,
+                            help=f'by default one per {BOOKS_PER_USER} books, at least '
+                                 f'{MIN_USERS}')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--end-date', type=datetime.fromisoformat,
+                            default=END_DATE.date().isoformat(),
+                            help='the borrow histories end at this date (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='books (with their copies and records) per transaction')
+
+    def handle(self, *args, **options):
+        number_of_books = options['books']
+        number_of_users = options['users']
+        if number_of_users is None:
+            number_of_users = max(MIN_USERS, number_of_books // BOOKS_PER_USER)
+        if number_of_books < 1 or number_of_users < 1 or options['chunk_size'] < 1:
+            raise CommandError('--books, --users and --chunk-size have to be at least 1')
+        for model in [LibraryUser, Author, Book, BookCopy, BorrowRecord]:
+            if model.objects.exists() is True:
+                raise CommandError(f'{model.__name__} has rows, generate_data needs an empty '
+                                   'database (e.g. run manage.py flush)')
+        end_date = options['end_date'].replace(tzinfo=timezone.utc)
+        generator = DataGenerator(options['seed'], number_of_books, number_of_users,
+                                  end_date)
+        checksum = hashlib.sha256()
+        counts = {model: 0 for model in [LibraryUser, Author, Book, BookCopy, BorrowRecord]}
+        start = time.perf_counter()
+
+        users = generator.users()
+        with transaction.atomic():
+            counts[LibraryUser] += copy_instances(LibraryUser, users)
+            # the ids were given, the next registered user continues after them
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [LibraryUser]):
+                    cursor.execute(sql)
+        update_checksum(checksum, users)
+
+        for authors, books, book_copies, borrow_records in generator.chunks(
+                options['chunk_size']):
+            with transaction.atomic():
+                for model, instances in [(Author, authors), (Book, books),
+                                         (BookCopy, book_copies),
+                                         (BorrowRecord, borrow_records)]:
+                    counts[model] += copy_instances(model, instances)
+                    update_checksum(checksum, instances)
+                Book.objects.update_search_vectors(owl_id__in=[book.owl_id for book in books])
+            if options['verbosity'] >= 1:
+                seconds = time.perf_counter()-start
+                self.stdout.write(f'{counts[Book]}/{number_of_books} books, '
+                                  f'{sum(counts.values()) / seconds:.0f} rows/s')
+        notify_catalog_changed(sender=Book)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        seconds = time.perf_counter()-start
+        self.stdout.write(', '.join(f'{count} {model.__name__}' for model, count
+                                    in counts.items()) +
+                          f' rows in {seconds:.1f}s')
+        self.stdout.write(self.style.SUCCESS(f'checksum {checksum.hexdigest()}'))
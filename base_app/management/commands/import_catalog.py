@@ -0,0 +1,227 @@
+import contextlib
+import csv
+import gzip
+import itertools
+import json
+import sys
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from base_app.bulk import bulk_insert
+from base_app.models import Author, Book, BookCopy, notify_catalog_changed
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n'}
+
+
+# is_popular None keeps the popularity of an existing author, copy_types has the type of
+# every copy of the book
+CatalogRow = namedtuple('CatalogRow', ['line', 'title', 'author_name', 'is_popular',
+                                       'copy_types'])
+
+
+def _parse_is_popular(value, line):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return value
+    if str(value).strip().lower() in TRUE_VALUES:
+        return True
+    if str(value).strip().lower() in FALSE_VALUES:
+        return False
+    raise CommandError(f'line {line}: is_popular has to be true or false, not {value!r}')
+
+
+def _parse_copy_types(counts, line):
+    copy_types = []
+    for copy_type, count in counts.items():
+        if copy_type not in BookCopy.BOOK_COPY_TYPE.values:
+            raise CommandError(f'line {line}: unknown book copy type {copy_type!r}')
+        if count is None or count == '':
+            continue
+        try:
+            count = int(count)
+        except (TypeError, ValueError):
+            count = -1
+        if count < 0:
+            raise CommandError(f'line {line}: number of {copy_type} copies has to be a '
+                               'positive integer')
+        copy_types.extend([copy_type] * count)
+    return copy_types
+
+
+def _catalog_row(line, title, author_name, is_popular, copy_counts):
+    title = (title or '').strip()
+    author_name = (author_name or '').strip()
+    if title == '' or author_name == '':
+        raise CommandError(f'line {line}: title and author are required')
+    for field, value in [('title', title), ('author', author_name)]:
+        if len(value) > 200:
+            raise CommandError(f'line {line}: {field} is longer than 200 characters')
+    return CatalogRow(line=line, title=title, author_name=author_name,
+                      is_popular=_parse_is_popular(is_popular, line),
+                      copy_types=_parse_copy_types(copy_counts, line))
+
+
+# title,author,is_popular,pb,hc,hm with the number of copies of each type, is_popular and
+# the copy columns are optional
+def read_csv_rows(lines):
+    reader = csv.DictReader(lines)
+    for record in reader:
+        copy_counts = {copy_type: record.get(copy_type)
+                       for copy_type in BookCopy.BOOK_COPY_TYPE.values}
+        yield _catalog_row(reader.line_num, record.get('title'), record.get('author'),
+                           record.get('is_popular'), copy_counts)
+
+
+# {"title": ..., "author": ..., "is_popular": true, "copies": {"hc": 2, "pb": 1}} per line
+def read_jsonl_rows(lines):
+    for line, text in enumerate(lines, start=1):
+        if text.strip() == '':
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as e:
+            raise CommandError(f'line {line}: {e}')
+        if isinstance(record, dict) is False or isinstance(record.get('copies', {}),
+                                                           dict) is False:
+            raise CommandError(f'line {line}: expected an object with title, author and '
+                               'copies')
+        yield _catalog_row(line, record.get('title'), record.get('author'),
+                           record.get('is_popular'), record.get('copies', {}))
+
+
+def _chunks(rows, chunk_size):
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+# Imports one chunk in one transaction with a fixed number of queries: authors are upserted
+# and their ids read back at once, the books of the chunk which exist already are looked up
+# at once and skipped together with their copies, so a chunk can be imported twice, then
+# new books and copies are inserted in bulk. Returns the numbers of books, copies and
+# skipped rows
+def import_chunk(rows, use_copy=False):
+    with transaction.atomic():
+        author_ids = Author.objects.upsert_authors([Author(name=row.author_name,
+                                                           is_popular=row.is_popular)
+                                                    for row in rows])
+        existing_books = set(Book.objects.get_all_books_by_titles_and_author_ids(
+                             titles={row.title for row in rows},
+                             author_ids=set(author_ids.values()))
+                             .values_list('title', 'author_id'))
+        books = []
+        book_copies = []
+        for row in rows:
+            key = (row.title, author_ids[row.author_name])
+            if key in existing_books:
+                continue
+            existing_books.add(key)
+            book = Book(title=row.title, author_id=key[1],
+                        available_copies=len(row.copy_types))
+            books.append(book)
+            book_copies.extend(BookCopy(book_id=book.owl_id, book_copy_type=copy_type)
+                               for copy_type in row.copy_types)
+        bulk_insert(Book, books, use_copy=use_copy)
+        bulk_insert(BookCopy, book_copies, use_copy=use_copy)
+        if len(books) > 0:
+            Book.objects.update_search_vectors(owl_id__in=[book.owl_id for book in books])
+            notify_catalog_changed(sender=Book)
+    return len(books), len(book_copies), len(rows)-len(books)
+
+
+class Command(BaseCommand):
+    help = ('Imports authors, books and book copies from a csv or jsonl file (optionally '
+            'gzipped, - for stdin) in chunks of bulk inserts. Books which exist already are '
+            'skipped with their copies.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='csv or jsonl file, .gz files are decompressed')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='format of the input, by default from the file extension')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='rows imported per transaction')
+        parser.add_argument('--copy', action='store_true',
+                            help='insert books and copies with COPY instead of INSERT')
+        parser.add_argument('--progress-file',
+                            help='file the number of imported rows is written to after every '
+                                 'chunk, an import with an existing progress file continues '
+                                 'after those rows')
+
+    def _open(self, path):
+        if path == '-':
+            return contextlib.nullcontext(sys.stdin)
+        if path.endswith('.gz'):
+            return gzip.open(path, 'rt', encoding='utf-8', newline='')
+        return open(path, encoding='utf-8', newline='')
+
+    def _get_format(self, options):
+        if options['format'] is not None:
+            return options['format']
+        suffixes = Path(options['input']).suffixes
+        if len(suffixes) > 0 and suffixes[-1] == '.gz':
+            suffixes = suffixes[:-1]
+        if len(suffixes) > 0 and suffixes[-1] in ['.csv', '.jsonl']:
+            return suffixes[-1][1:]
+        raise CommandError('cannot tell the format of the input, use --format')
+
+    def _read_progress(self, progress_file, path):
+        if progress_file is None or Path(progress_file).exists() is False:
+            return 0
+        progress = json.loads(Path(progress_file).read_text())
+        if progress['input'] != path:
+            raise CommandError(f'{progress_file} is the progress of {progress["input"]}')
+        return progress['rows']
+
+    def _write_progress(self, progress_file, path, number_of_rows):
+        if progress_file is not None:
+            # replaced atomically, so an interrupted import never leaves half a file
+            temporary_file = Path(f'{progress_file}.tmp')
+            temporary_file.write_text(json.dumps({'input': path, 'rows': number_of_rows}))
+            temporary_file.replace(progress_file)
+
+    def handle(self, *args, **options):
+        path = options['input']
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size has to be at least 1')
+        read_rows = read_csv_rows if self._get_format(options) == 'csv' else read_jsonl_rows
+        imported_rows = self._read_progress(options['progress_file'], path)
+        if imported_rows > 0:
+            self.stdout.write(f'continuing after {imported_rows} imported rows')
+
+        totals = {'rows': 0, 'books': 0, 'copies': 0, 'skipped': 0}
+        start = time.perf_counter()
+        try:
+            lines = self._open(path)
+        except OSError as e:
+            raise CommandError(e)
+        with lines as lines:
+            rows = itertools.islice(read_rows(lines), imported_rows, None)
+            chunk_start = time.perf_counter()
+            for chunk in _chunks(rows, chunk_size):
+                books, copies, skipped = import_chunk(chunk, use_copy=options['copy'])
+                imported_rows += len(chunk)
+                self._write_progress(options['progress_file'], path, imported_rows)
+                totals['rows'] += len(chunk)
+                totals['books'] += books
+                totals['copies'] += copies
+                totals['skipped'] += skipped
+                if options['verbosity'] >= 1:
+                    self.stdout.write(
+                        f'{imported_rows} rows: {books} books, {copies} copies, '
+                        f'{skipped} skipped, '
+                        f'{len(chunk) / (time.perf_counter()-chunk_start):.0f} rows/s')
+                chunk_start = time.perf_counter()
+        seconds = time.perf_counter()-start
+        self.stdout.write(self.style.SUCCESS(
+            f'imported {totals["books"]} books and {totals["copies"]} copies from '
+            f'{totals["rows"]} rows ({totals["skipped"]} books existed already) in '
+            f'{seconds:.1f}s, {totals["rows"] / max(seconds, 1e-9):.0f} rows/s'))
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.5 on 2026-10-16 23:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0006_alter_bookcopy_book'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title', 'owl_id'], name='book_title_owl_id_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.5 on 2026-10-16 23:04
+
+from django.db import migrations, models
+
+
+def mark_borrowed_books_unavailable(apps, schema_editor):
+    Book = apps.get_model('base_app', 'Book')
+    BorrowRecord = apps.get_model('base_app', 'BorrowRecord')
+    borrowed_book_ids = BorrowRecord.objects.filter(is_returned=False).values(
+                        'book_copy__book_id')
+    Book.objects.filter(owl_id__in=borrowed_book_ids).update(is_available=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0007_book_title_owl_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='is_available',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.RunPython(mark_borrowed_books_unavailable, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['title', 'owl_id'], name='book_available_title_idx'),
+        ),
+    ]
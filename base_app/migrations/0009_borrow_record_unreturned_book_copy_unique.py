@@ -0,0 +1,17 @@
+# Generated by Django 4.1.5 on 2026-10-16 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0008_book_is_available'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='borrowrecord',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_returned', False)), fields=('book_copy',), name='borrow_record_unreturned_book_copy_unique'),
+        ),
+    ]
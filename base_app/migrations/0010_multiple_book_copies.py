@@ -0,0 +1,60 @@
+# Generated by Django 4.1.5 on 2026-10-16 23:08
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def count_available_book_copies(apps, schema_editor):
+    Book = apps.get_model('base_app', 'Book')
+    BookCopy = apps.get_model('base_app', 'BookCopy')
+    BorrowRecord = apps.get_model('base_app', 'BorrowRecord')
+    lent_book_copy_ids = BorrowRecord.objects.filter(is_returned=False).values('book_copy_id')
+    BookCopy.objects.filter(book_copy_id__in=lent_book_copy_ids).update(is_lent=True)
+    free_book_copies = BookCopy.objects.filter(book_id=OuterRef('owl_id'), is_lent=False) \
+                                       .values('book_id').annotate(count=Count('*')) \
+                                       .values('count')
+    Book.objects.update(available_copies=Coalesce(Subquery(free_book_copies), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0009_borrow_record_unreturned_book_copy_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='available_copies',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='bookcopy',
+            name='is_lent',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='bookcopy',
+            name='book',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='base_app.book'),
+        ),
+        migrations.RunPython(count_available_book_copies, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_available_title_idx',
+        ),
+        migrations.RemoveField(
+            model_name='book',
+            name='is_available',
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('available_copies__gt', 0)), fields=['title', 'owl_id'], name='book_available_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookcopy',
+            index=models.Index(condition=models.Q(('is_lent', False)), fields=['book'], name='bookcopy_free_book_idx'),
+        ),
+    ]
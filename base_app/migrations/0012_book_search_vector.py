@@ -0,0 +1,37 @@
+# Generated by Django 4.1.5 on 2026-10-16 23:18
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+# same vector as base_app.models.book_search_vector, written against the historical models
+def build_book_search_vectors(apps, schema_editor):
+    Author = apps.get_model('base_app', 'Author')
+    Book = apps.get_model('base_app', 'Book')
+    author_name = Subquery(Author.objects.filter(author_id=OuterRef('author_id'))
+                                         .values('name')[:1])
+    Book.objects.update(search_vector=SearchVector('title', weight='A', config='simple') +
+                                      SearchVector(author_name, weight='B', config='simple'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0011_author_name_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(build_book_search_vectors, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='book_search_vector_idx'),
+        ),
+    ]
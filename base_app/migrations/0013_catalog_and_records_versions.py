@@ -0,0 +1,24 @@
+# Generated by Django 4.1.5 on 2026-10-16 23:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0012_book_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libraryuser',
+            name='records_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        # setval marks the sequence as called, so last_value is a valid version right away
+        migrations.RunSQL(
+            sql=['CREATE SEQUENCE base_app_catalog_version_seq',
+                 "SELECT setval('base_app_catalog_version_seq', 1)"],
+            reverse_sql=['DROP SEQUENCE base_app_catalog_version_seq'],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.5 on 2026-10-16 23:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0013_catalog_and_records_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowrecord',
+            name='next_eligible_borrow_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        # the cool-down rules of rest_api/services.py at the time of writing: 180 days after
+        # the borrow date for popular authors (names starting with j/J), 90 days otherwise
+        migrations.RunSQL(
+            sql="""
+                UPDATE base_app_borrowrecord AS borrow_record
+                SET next_eligible_borrow_date = borrow_record.borrow_date + CASE
+                    WHEN upper(left(author.name, 1)) = 'J' THEN interval '180 days'
+                    ELSE interval '90 days' END
+                FROM base_app_bookcopy AS book_copy
+                JOIN base_app_book AS book ON book.owl_id = book_copy.book_id
+                JOIN base_app_author AS author ON author.author_id = book.author_id
+                WHERE book_copy.book_copy_id = borrow_record.book_copy_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(condition=models.Q(('is_returned', True)), fields=['library_user', 'next_eligible_borrow_date'], name='borrowrecord_user_eligible_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.1.5 on 2026-10-17 00:16
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# The indexes are built and dropped CONCURRENTLY, which cannot run in a transaction, so that
+# the borrow record table stays writable while this migration runs on a large table. A
+# concurrent build that fails leaves an INVALID index behind, drop it before migrating again
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('base_app', '0014_borrow_record_next_eligible_borrow_date'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='borrowrecord',
+            index=models.Index(fields=['library_user', '-borrow_date', '-borrow_record_id'], name='borrowrecord_user_borrowed_idx'),
+        ),
+        # the single column foreign key indexes are prefixes of borrowrecord_user_borrowed_idx
+        # and of the unique_together index on (book_copy, library_user)
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='borrowrecord',
+                    name='book_copy',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='base_app.bookcopy'),
+                ),
+                migrations.AlterField(
+                    model_name='borrowrecord',
+                    name='library_user',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    sql='DROP INDEX CONCURRENTLY IF EXISTS "base_app_borrowrecord_book_copy_id_3918c00d"',
+                    reverse_sql='CREATE INDEX CONCURRENTLY IF NOT EXISTS "base_app_borrowrecord_book_copy_id_3918c00d" ON "base_app_borrowrecord" ("book_copy_id")',
+                ),
+                migrations.RunSQL(
+                    sql='DROP INDEX CONCURRENTLY IF EXISTS "base_app_borrowrecord_library_user_id_1c13a444"',
+                    reverse_sql='CREATE INDEX CONCURRENTLY IF NOT EXISTS "base_app_borrowrecord_library_user_id_1c13a444" ON "base_app_borrowrecord" ("library_user_id")',
+                ),
+            ],
+        ),
+    ]
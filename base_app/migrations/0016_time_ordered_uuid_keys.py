@@ -0,0 +1,29 @@
+# Generated by Django 4.1.5 on 2026-10-17 00:18
+
+import base_app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0015_borrow_record_user_borrowed_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='owl_id',
+            field=models.UUIDField(default=base_app.models.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='bookcopy',
+            name='book_copy_id',
+            field=models.UUIDField(default=base_app.models.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='borrowrecord',
+            name='borrow_record_id',
+            field=models.UUIDField(default=base_app.models.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.1.5 on 2026-10-17 00:56
+
+from django.db import migrations, models
+import django.utils.timezone
+
+TABLES = ['base_app_author', 'base_app_book', 'base_app_bookcopy', 'base_app_borrowrecord']
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0016_time_ordered_uuid_keys'),
+    ]
+
+    # the columns are added with a constant default (the time of the migration), which
+    # postgres stores in the catalog instead of rewriting the tables
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='bookcopy',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='borrowrecord',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        # inserted rows and updates which change a row get the start time of their
+        # transaction, whatever value the client wrote
+        migrations.RunSQL(
+            sql=["""
+                CREATE FUNCTION base_app_set_updated_at() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP = 'INSERT' OR NEW IS DISTINCT FROM OLD THEN
+                        NEW.updated_at = now();
+                    END IF;
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql
+            """] + [f"""
+                CREATE TRIGGER {table}_updated_at BEFORE INSERT OR UPDATE ON {table}
+                FOR EACH ROW EXECUTE PROCEDURE base_app_set_updated_at()
+            """ for table in TABLES],
+            reverse_sql=[f'DROP TRIGGER {table}_updated_at ON {table}' for table in TABLES] +
+                        ['DROP FUNCTION base_app_set_updated_at()'],
+        ),
+    ]
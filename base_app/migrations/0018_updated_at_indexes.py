@@ -0,0 +1,33 @@
+# Generated by Django 4.1.5 on 2026-10-17 00:56
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # see 0015_borrow_record_user_borrowed_idx
+    atomic = False
+
+    dependencies = [
+        ('base_app', '0017_updated_at'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='author',
+            index=models.Index(fields=['updated_at'], name='author_updated_at_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(fields=['updated_at'], name='book_updated_at_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='bookcopy',
+            index=models.Index(fields=['updated_at'], name='bookcopy_updated_at_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='borrowrecord',
+            index=models.Index(fields=['updated_at'], name='borrowrecord_updated_at_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.1.5 on 2026-10-17 02:10
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+# the table of the 'idempotency' DatabaseCache in CACHES, created by migrate so that every
+# deployment has it (createcachetable skips tables which exist)
+def create_idempotency_cache_table(apps, schema_editor):
+    call_command('createcachetable', 'base_app_idempotency_cache',
+                 database=schema_editor.connection.alias, verbosity=0)
+
+
+def drop_idempotency_cache_table(apps, schema_editor):
+    schema_editor.execute('DROP TABLE IF EXISTS base_app_idempotency_cache')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0018_updated_at_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_idempotency_cache_table,
+            reverse_code=drop_idempotency_cache_table,
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.1.5 on 2026-10-17 03:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Adds BorrowRecord.book as a nullable column (a change of the catalog, existing rows are not
+# written) and the triggers which fill it from now on. Existing rows are filled, and the
+# column made NOT NULL and unique per user, by 0021_borrow_record_book_backfill without
+# locking the table against writes
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0019_idempotency_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowrecord',
+            name='book',
+            field=models.ForeignKey(db_index=False, editable=False, null=True,
+                                    on_delete=django.db.models.deletion.PROTECT,
+                                    to='base_app.book'),
+        ),
+        # book_id is the book of book_copy_id whatever the client wrote, for every kind of
+        # write (save, bulk_create, queryset updates, COPY), and follows a copy moved to
+        # another book
+        migrations.RunSQL(
+            sql=["""
+                CREATE FUNCTION base_app_set_borrow_record_book() RETURNS trigger AS $$
+                BEGIN
+                    SELECT book_id INTO NEW.book_id FROM base_app_bookcopy
+                    WHERE book_copy_id = NEW.book_copy_id;
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql
+            """, """
+                CREATE TRIGGER base_app_borrowrecord_book
+                BEFORE INSERT OR UPDATE OF book_copy_id, book_id ON base_app_borrowrecord
+                FOR EACH ROW EXECUTE PROCEDURE base_app_set_borrow_record_book()
+            """, """
+                CREATE FUNCTION base_app_update_borrow_record_books() RETURNS trigger AS $$
+                BEGIN
+                    UPDATE base_app_borrowrecord SET book_id = NEW.book_id
+                    WHERE book_copy_id = NEW.book_copy_id;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """, """
+                CREATE TRIGGER base_app_bookcopy_borrow_record_books
+                AFTER UPDATE OF book_id ON base_app_bookcopy
+                FOR EACH ROW WHEN (NEW.book_id IS DISTINCT FROM OLD.book_id)
+                EXECUTE PROCEDURE base_app_update_borrow_record_books()
+            """],
+            reverse_sql=[
+                'DROP TRIGGER base_app_bookcopy_borrow_record_books ON base_app_bookcopy',
+                'DROP FUNCTION base_app_update_borrow_record_books()',
+                'DROP TRIGGER base_app_borrowrecord_book ON base_app_borrowrecord',
+                'DROP FUNCTION base_app_set_borrow_record_book()',
+            ],
+        ),
+    ]
@@ -0,0 +1,126 @@
+# Generated by Django 4.1.5 on 2026-10-17 03:40
+
+from django.core.management.base import CommandError
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 10000
+
+
+# fills book_id of the borrow records written before 0020 in batches of BATCH_SIZE rows in
+# primary key order, each batch is a transaction of its own and locks only its rows
+def backfill_borrow_record_books(apps, schema_editor):
+    last_borrow_record_id = '00000000-0000-0000-0000-000000000000'
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            cursor.execute('SELECT borrow_record_id FROM ('
+                           '  SELECT borrow_record_id FROM base_app_borrowrecord'
+                           '  WHERE borrow_record_id > %s ORDER BY borrow_record_id LIMIT %s'
+                           ') batch ORDER BY borrow_record_id DESC LIMIT 1',
+                           [last_borrow_record_id, BATCH_SIZE])
+            row = cursor.fetchone()
+            if row is None:
+                return
+            batch_end = row[0]
+            cursor.execute('UPDATE base_app_borrowrecord br SET book_id = bc.book_id '
+                           'FROM base_app_bookcopy bc WHERE bc.book_copy_id = br.book_copy_id '
+                           'AND br.borrow_record_id > %s AND br.borrow_record_id <= %s '
+                           'AND br.book_id IS NULL', [last_borrow_record_id, batch_end])
+            last_borrow_record_id = batch_end
+
+
+# the services never wrote several borrow records of a book for a user, but other writers
+# (admin, imports) could. Stops before building the unique index and names the records
+def check_borrow_record_books_are_unique(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT book_id, library_user_id, array_agg(borrow_record_id) '
+                       'FROM base_app_borrowrecord GROUP BY book_id, library_user_id '
+                       'HAVING count(*) > 1 LIMIT 10')
+        duplicates = cursor.fetchall()
+    if len(duplicates) > 0:
+        raise CommandError(
+            'Users have several borrow records of a book, keep one borrow record per book '
+            'and user (the services only read one) and migrate again: ' +
+            '; '.join(f'book {book_id}, user {library_user_id}: '
+                      f'{", ".join(str(borrow_record_id) for borrow_record_id in records)}'
+                      for book_id, library_user_id, records in duplicates))
+
+
+# Runs outside a transaction (see 0015_borrow_record_user_borrowed_idx), so that the borrow
+# record table stays writable: the backfill commits batch by batch, the unique index is
+# built CONCURRENTLY and then attached as the constraint, and NOT NULL is proven by a CHECK
+# constraint validated without blocking writes, which SET NOT NULL then uses instead of
+# scanning the table
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('base_app', '0020_borrow_record_book'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_borrow_record_books,
+                             reverse_code=migrations.RunPython.noop),
+        migrations.RunPython(check_borrow_record_books_are_unique,
+                             reverse_code=migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='borrowrecord',
+                    constraint=models.UniqueConstraint(fields=('book', 'library_user'),
+                                                       name='borrow_record_book_user_unique'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    sql='CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS '
+                        '"borrow_record_book_user_unique" ON "base_app_borrowrecord" '
+                        '("book_id", "library_user_id")',
+                    reverse_sql=migrations.RunSQL.noop,
+                ),
+                migrations.RunSQL(
+                    sql='ALTER TABLE "base_app_borrowrecord" ADD CONSTRAINT '
+                        '"borrow_record_book_user_unique" UNIQUE USING INDEX '
+                        '"borrow_record_book_user_unique"',
+                    reverse_sql='ALTER TABLE "base_app_borrowrecord" DROP CONSTRAINT '
+                                '"borrow_record_book_user_unique"',
+                ),
+            ],
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='borrowrecord',
+                    name='book',
+                    field=models.ForeignKey(db_index=False, editable=False,
+                                            on_delete=django.db.models.deletion.PROTECT,
+                                            to='base_app.book'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    sql='ALTER TABLE "base_app_borrowrecord" ADD CONSTRAINT '
+                        '"borrowrecord_book_id_not_null" CHECK ("book_id" IS NOT NULL) '
+                        'NOT VALID',
+                    reverse_sql=migrations.RunSQL.noop,
+                ),
+                migrations.RunSQL(
+                    sql='ALTER TABLE "base_app_borrowrecord" VALIDATE CONSTRAINT '
+                        '"borrowrecord_book_id_not_null"',
+                    reverse_sql=migrations.RunSQL.noop,
+                ),
+                migrations.RunSQL(
+                    sql='ALTER TABLE "base_app_borrowrecord" ALTER COLUMN "book_id" '
+                        'SET NOT NULL',
+                    reverse_sql='ALTER TABLE "base_app_borrowrecord" ALTER COLUMN '
+                                '"book_id" DROP NOT NULL',
+                ),
+                migrations.RunSQL(
+                    sql='ALTER TABLE "base_app_borrowrecord" DROP CONSTRAINT '
+                        '"borrowrecord_book_id_not_null"',
+                    reverse_sql=migrations.RunSQL.noop,
+                ),
+            ],
+        ),
+    ]
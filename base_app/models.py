@@ -1,9 +1,126 @@
+import os
+import re
+import time
 import uuid
+from datetime import timedelta
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.expressions import ArraySubquery
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import (SearchQuery, SearchRank, SearchVector,
+                                            SearchVectorField, TrigramWordSimilarity)
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
-from django.db import DatabaseError, models
+from django.db import DatabaseError, connection, models, transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Upper
+from django.dispatch import Signal
+from django.utils import timezone
+
+
+# Time-ordered UUID (version 7 of RFC 9562): 48 bits of unix time in milliseconds followed by
+# 74 random bits. New rows get keys larger than the existing ones, so inserts go to the
+# right-most pages of the primary key index instead of random pages all over it. Keys of the
+# same millisecond are not ordered among themselves. The key reveals when the row was
+# created. timestamp_ms and random_bits (80 bits, some are overwritten) default to the
+# current time and os.urandom, generated data passes its own
+def uuid7(timestamp_ms=None, random_bits=None):
+    if timestamp_ms is None:
+        timestamp_ms = time.time_ns() // 1000000
+    if random_bits is None:
+        random_bits = int.from_bytes(os.urandom(10), 'big')
+    value = (timestamp_ms & 0xffffffffffff) << 80 | random_bits & (1 << 80)-1
+    # version 7 in bits 76-79 and the 0b10 variant in bits 62-63
+    value = value & ~(0xf << 76) | 0x7 << 76
+    value = value & ~(0x3 << 62) | 0x2 << 62
+    return uuid.UUID(int=value)
+
+
+# updated_at of Author, Book, BookCopy and BorrowRecord is set to now(), the start time of
+# the writing transaction, by a trigger (migration 0017) on every insert and on every update
+# which changes the row. So it also follows queryset updates, bulk writes and raw SQL, which
+# auto_now does not. The export_data command exports the rows changed since its last run
+# with it
+def updated_at_field():
+    return models.DateTimeField(default=timezone.now, editable=False)
+
+
+# sent after any write that can change the catalog, i.e. books, their authors or their
+# availability. Receivers get the model class which was written as sender
+catalog_changed = Signal()
+
+
+# notifies right away and once more when the transaction commits, so that a reader which
+# cached the catalog from the snapshot before the commit does not keep it
+def notify_catalog_changed(sender):
+    catalog_changed.send(sender=sender)
+    transaction.on_commit(lambda: catalog_changed.send(sender=sender))
+
+
+# The catalog version is a postgres sequence (created in migration 0013) which is bumped on
+# every catalog_changed. Unlike a counter row, bumping a sequence never waits for a lock,
+# and every process sees the same version
+CATALOG_VERSION_SEQUENCE = 'base_app_catalog_version_seq'
+
+
+def get_catalog_version():
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT last_value FROM {CATALOG_VERSION_SEQUENCE}')
+        return cursor.fetchone()[0]
+
+
+# raw cursors have no async interface, the lookup runs in the thread of the async ORM
+aget_catalog_version = sync_to_async(get_catalog_version)
+
+
+def bump_catalog_version():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [CATALOG_VERSION_SEQUENCE])
+        return cursor.fetchone()[0]
+
+
+# authors whose name starts with 'j' or 'J' are popular. New authors get this popularity
+# unless it is given, and the services derive cool-down periods from it
+def is_author_name_popular(name):
+    if type(name) != str:
+        raise ValidationError('Only string arguments are allowed')
+    if len(name) == 0:
+        return False
+    return name[0] == 'j' or name[0] == 'J'
+
+
+# the borrowing rules, used by the services and for generated data
+def get_book_borrow_duration_in_days():
+    return 14
+
+
+def _get_number_of_days_in_month():
+    # taking average number of days in a month as 30
+    return 30
+
+
+def get_cool_down_period_of_popular_author_in_days():
+    cool_down_period_in_months = 6
+    return _get_number_of_days_in_month() * cool_down_period_in_months
+
+
+def get_cool_down_period_of_normal_author_in_days():
+    cool_down_period_in_months = 3
+    return _get_number_of_days_in_month() * cool_down_period_in_months
+
+
+def get_cool_down_period_in_days(author_name):
+    if is_author_name_popular(author_name) is True:
+        return get_cool_down_period_of_popular_author_in_days()
+    else:
+        return get_cool_down_period_of_normal_author_in_days()
+
+
+# a user may borrow a book again once the cool-down period after the previous borrow is over
+def get_cool_down_period_end_date(previous_borrow_date, author_name):
+    cool_down_period_in_days = get_cool_down_period_in_days(author_name)
+    return previous_borrow_date+timedelta(days=cool_down_period_in_days)
 
 
 # This model handles all queries related to Author model
@@ -15,6 +132,30 @@ class AuthorManager(models.Manager):
         except DatabaseError as e:
             raise e
 
+    # Inserts new authors and updates is_popular of existing ones with INSERT ... ON
+    # CONFLICT, returns {name: author_id} of all of them. Authors whose is_popular is None
+    # keep the popularity they have, new ones get is_author_name_popular
+    def upsert_authors(self, authors):
+        authors = {author.name: author for author in authors}
+        if len(authors) == 0:
+            return {}
+        known_popularity = [author for author in authors.values()
+                            if author.is_popular is not None]
+        unknown_popularity = [Author(name=author.name,
+                                     is_popular=is_author_name_popular(author.name))
+                              for author in authors.values() if author.is_popular is None]
+        queryset = self.get_queryset()
+        with transaction.atomic():
+            if len(known_popularity) > 0:
+                queryset.bulk_create(known_popularity, update_conflicts=True,
+                                     unique_fields=['name'], update_fields=['is_popular'])
+            if len(unknown_popularity) > 0:
+                queryset.bulk_create(unknown_popularity, ignore_conflicts=True)
+            author_ids = dict(queryset.filter(name__in=list(authors))
+                                      .values_list('name', 'author_id'))
+            notify_catalog_changed(sender=self.model)
+        return author_ids
+
     def get_author_count(self):
         queryset = self.get_queryset()
         return queryset.count()
@@ -28,10 +169,14 @@ class AuthorManager(models.Manager):
         except ObjectDoesNotExist as e:
             raise e
 
-    # this search is not case-sensitive
+    # this search is not case-sensitive and tolerates typos, authors are ranked by how
+    # closely their name matches. Both conditions are served by trigram indexes
     def get_all_authors_with_similar_name(self, name):
         queryset = self.get_queryset()
-        authors = queryset.filter(name__icontains=name)
+        authors = queryset.filter(Q(name__icontains=name) |
+                                  Q(name__trigram_word_similar=name)) \
+                          .annotate(similarity=TrigramWordSimilarity(name, 'name')) \
+                          .order_by('-similarity', 'name')
         return authors
 
     def get_author_by_owl_id(self, owl_id):
@@ -45,14 +190,22 @@ class AuthorManager(models.Manager):
         except ObjectDoesNotExist as e:
             raise e
 
+    # search vectors of the author's books contain the author name, so they are rebuilt in
+    # the same transaction
     def update_author_name(self, old_author_name, new_author_name):
         queryset = self.get_queryset()
-        rows_affected = queryset.filter(name=old_author_name).update(name=new_author_name)
+        with transaction.atomic():
+            rows_affected = queryset.filter(name=old_author_name).update(name=new_author_name)
+            if rows_affected > 0:
+                Book.objects.update_search_vectors(author__name=new_author_name)
+                notify_catalog_changed(sender=self.model)
         return rows_affected
 
     def update_author_popularity(self, author_name, is_popular):
         queryset = self.get_queryset()
         rows_affected = queryset.filter(name=author_name).update(is_popular=is_popular)
+        if rows_affected > 0:
+            notify_catalog_changed(sender=self.model)
         return rows_affected
 
     def delete_author(self, author_name):
@@ -65,14 +218,63 @@ class Author(models.Model):
     author_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(unique=True, max_length=200, help_text='Full name of author')
     is_popular = models.BooleanField()
+    updated_at = updated_at_field()
 
     objects = AuthorManager()
 
+    class Meta:
+        indexes = [
+            # trigram indexes for author search, the first one serves the similarity
+            # operators and the second one case insensitive LIKE which compares UPPER(name)
+            GinIndex(OpClass('name', name='gin_trgm_ops'), name='author_name_trgm_idx'),
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'),
+                     name='author_upper_name_trgm_idx'),
+            models.Index(fields=['updated_at'], name='author_updated_at_idx'),
+        ]
+
     def __str__(self) -> str:
         return f'{self.name}'
 
 
+# `owl_id__any=ArraySubquery(...)` compiles to owl_id = ANY(ARRAY(SELECT ...)), postgres
+# then runs the subquery first and fetches its rows by primary key. The equivalent
+# owl_id IN (SELECT ...) tends to be planned as a semi join over the whole table
+@models.UUIDField.register_lookup
+class AnyLookup(models.Lookup):
+    lookup_name = 'any'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} = ANY({rhs})', (*lhs_params, *rhs_params)
+
+
+# full text search runs on the 'simple' configuration, i.e. words are lower cased but not
+# stemmed, which suits author names and keeps prefix matching predictable for titles
+BOOK_SEARCH_CONFIG = 'simple'
+BOOK_SEARCH_CANDIDATE_LIMIT = 1000
+
+
+# search vector of a book, title words rank above author name words. The author name is
+# read with a subquery because UPDATE cannot reference joined columns
+def book_search_vector():
+    author_name = Subquery(Author.objects.filter(author_id=OuterRef('author_id'))
+                                         .values('name')[:1])
+    return (SearchVector('title', weight='A', config=BOOK_SEARCH_CONFIG) +
+            SearchVector(author_name, weight='B', config=BOOK_SEARCH_CONFIG))
+
+
 class BookManager(models.Manager):
+    # every word of the search text has to match the start of a title or author name word,
+    # e.g. 'tolk ring' matches 'The Lord of the Rings' by 'J. R. R. Tolkien'. The words are
+    # reduced to letters and digits so user input can never break the tsquery syntax
+    def _prefix_search_query(self, search_text):
+        words = re.findall(r'[^\W_]+', search_text or '')
+        if len(words) == 0:
+            return None
+        return SearchQuery(' & '.join(f'{word}:*' for word in words), search_type='raw',
+                           config=BOOK_SEARCH_CONFIG)
+
     def insert_book(self, book):
         if book.title is None or len(book.title) == 0:
             raise ValidationError('Cannot insert book with an empty title')
@@ -91,6 +293,15 @@ class BookManager(models.Manager):
         except ObjectDoesNotExist as e:
             raise e
 
+    # (owl_id, author name) rows of the books with the given owl_ids that exist
+    def get_author_name_rows_by_owl_ids(self, owl_ids):
+        queryset = self.get_queryset()
+        return queryset.filter(owl_id__in=owl_ids).values_list('owl_id', 'author__name')
+
+    # returns {owl_id: author name} of the books with the given owl_ids that exist
+    def get_author_names_by_owl_ids(self, owl_ids):
+        return dict(self.get_author_name_rows_by_owl_ids(owl_ids=owl_ids))
+
     # (Warning) use only if book with given title is known to exist, instead use
     # get_all_books_with_similar_title to check availability of book(s) with similar title
     def get_book_by_exact_title(self, book_title):
@@ -106,6 +317,40 @@ class BookManager(models.Manager):
         books = queryset.filter(title__icontains=book_title)
         return books
 
+    # single join counterpart of AuthorManager.get_all_authors_with_similar_name, books are
+    # ranked by how closely their author name matches
+    def get_all_books_by_similar_author_name(self, author_name):
+        queryset = self.get_queryset()
+        similarity = TrigramWordSimilarity(author_name, 'author__name')
+        books = queryset.filter(Q(author__name__icontains=author_name) |
+                                Q(author__name__trigram_word_similar=author_name)) \
+                        .annotate(similarity=similarity) \
+                        .order_by('-similarity', 'title', 'owl_id')
+        return books
+
+    # full text search over title and author name served by the GIN index on search_vector,
+    # best matches first. Returns no books if the search text has no words
+    def search_books(self, search_text):
+        queryset = self.get_queryset()
+        search_query = self._prefix_search_query(search_text)
+        if search_query is None:
+            return queryset.none()
+        # ranking reads the vector of every match, so a very broad search (a common word or
+        # a one letter prefix) is ranked among the first matches found by the index only
+        candidates = queryset.filter(search_vector=search_query) \
+                             .values('owl_id')[:BOOK_SEARCH_CANDIDATE_LIMIT]
+        books = queryset.filter(owl_id__any=ArraySubquery(candidates)) \
+                        .annotate(rank=SearchRank(F('search_vector'), search_query)) \
+                        .order_by('-rank', 'title', 'owl_id')
+        return books
+
+    # books with any of the titles by any of the authors, a superset of the books with the
+    # given (title, author_id) pairs which is found with the unique (title, author) index
+    def get_all_books_by_titles_and_author_ids(self, titles, author_ids):
+        queryset = self.get_queryset()
+        books = queryset.filter(title__in=titles, author_id__in=author_ids)
+        return books
+
     def get_all_books_by_author_id_list(self, author_id_list):
         queryset = self.get_queryset()
         books = queryset.filter(author_id__in=author_id_list)
@@ -115,16 +360,62 @@ class BookManager(models.Manager):
         queryset = self.get_queryset()
         return queryset.all()
 
+    # books with a copy which is not lent out, a book without copies is not available
+    def get_all_available_books(self):
+        queryset = self.get_queryset()
+        return queryset.filter(available_copies__gt=0)
+
+    # update_available_copies for many books in one query, changes is {owl_id: change}
+    def update_available_copies_of_books(self, changes):
+        if len(changes) == 0:
+            return 0
+        queryset = self.get_queryset()
+        change = Case(*[When(owl_id=owl_id, then=Value(change))
+                        for owl_id, change in changes.items()],
+                      output_field=models.IntegerField())
+        rows_affected = queryset.filter(owl_id__in=list(changes)).update(
+                        available_copies=F('available_copies')+change)
+        if rows_affected > 0:
+            notify_catalog_changed(sender=self.model)
+        return rows_affected
+
+    # moves the denormalized available_copies counter by change, F() makes concurrent
+    # updates of the same book add up instead of overwriting each other. The update locks
+    # the Book row until the transaction ends, so borrows and returns of one title are
+    # serialized on it. They update it as their last write, which keeps that window short
+    def update_available_copies(self, owl_id, change):
+        queryset = self.get_queryset()
+        rows_affected = queryset.filter(owl_id=owl_id).update(
+                        available_copies=F('available_copies')+change)
+        if rows_affected > 0:
+            notify_catalog_changed(sender=self.model)
+        return rows_affected
+
+    # rebuilds search_vector of all books matching filters (all books if none are given),
+    # has to run after every write to a book title or author name
+    def update_search_vectors(self, **filters):
+        queryset = self.get_queryset()
+        rows_affected = queryset.filter(**filters).update(search_vector=book_search_vector())
+        return rows_affected
+
     def update_book_title(self, owl_id, new_book_title):
         if new_book_title is None or len(new_book_title) == 0:
             raise ValidationError('Cannot update book title with an empty string')
         queryset = self.get_queryset()
-        rows_affected = queryset.filter(owl_id=owl_id).update(title=new_book_title)
+        with transaction.atomic():
+            rows_affected = queryset.filter(owl_id=owl_id).update(title=new_book_title)
+            self.update_search_vectors(owl_id=owl_id)
+            if rows_affected > 0:
+                notify_catalog_changed(sender=self.model)
         return rows_affected
 
     def update_book_author(self, owl_id, new_book_author):
         queryset = self.get_queryset()
-        rows_affected = queryset.filter(owl_id=owl_id).update(author=new_book_author)
+        with transaction.atomic():
+            rows_affected = queryset.filter(owl_id=owl_id).update(author=new_book_author)
+            self.update_search_vectors(owl_id=owl_id)
+            if rows_affected > 0:
+                notify_catalog_changed(sender=self.model)
         return rows_affected
 
     def delete_book(self, owl_id):
@@ -135,14 +426,28 @@ class BookManager(models.Manager):
 
 # Abstract representation of a book
 class Book(models.Model):
-    owl_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owl_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     title = models.CharField(max_length=200)
     author = models.ForeignKey('Author', on_delete=models.PROTECT)
+    # number of copies which are not lent out, maintained by BookCopyManager.update_lent_status
+    available_copies = models.PositiveIntegerField(default=0, editable=False)
+    # title and author name for full text search, maintained by
+    # BookManager.update_search_vectors and base_app/signals.py
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = updated_at_field()
 
     objects = BookManager()
 
     class Meta:
         unique_together = ('title', 'author')
+        # supports keyset pagination of the catalog on (title, owl_id)
+        indexes = [
+            models.Index(fields=['title', 'owl_id'], name='book_title_owl_id_idx'),
+            models.Index(fields=['title', 'owl_id'], name='book_available_title_idx',
+                         condition=Q(available_copies__gt=0)),
+            GinIndex(fields=['search_vector'], name='book_search_vector_idx'),
+            models.Index(fields=['updated_at'], name='book_updated_at_idx'),
+        ]
 
     def __str__(self) -> str:
         return f'{self.title}'
@@ -167,6 +472,95 @@ class BookCopyManager(models.Manager):
         except Exception as e:
             raise e
 
+    # must be called inside a transaction, picks any copy of the book which is not lent out
+    # and locks it until the transaction ends. Copies already locked by concurrent borrowers
+    # are skipped instead of waited on, so borrowers of one title do not queue on one row.
+    # Book and author are fetched in the same query but are not locked. Returns None if
+    # there is no free copy
+    def get_free_book_copy_with_matching_owl_id_for_update(self, owl_id):
+        queryset = self.get_queryset()
+        book_copies = list(queryset.select_related('book__author').select_for_update(
+                           of=('self',), skip_locked=True).filter(
+                           book__owl_id=owl_id, is_lent=False)[:1])
+        if len(book_copies) == 0:
+            return None
+        return book_copies[0]
+
+    # get_free_book_copy_with_matching_owl_id_for_update for many books, returns
+    # {owl_id: book copy} of the books that have a free copy. The lateral subquery locks one
+    # free copy per book, a plain SKIP LOCKED select with a filter on all the books could
+    # return more than one copy of a book or none
+    def get_free_book_copies_with_matching_owl_ids_for_update(self, owl_ids):
+        queryset = self.get_queryset()
+        quote_name = connection.ops.quote_name
+        table = quote_name(self.model._meta.db_table)
+        sql = (f'SELECT book_copy.{quote_name("book_copy_id")} '
+               f'FROM unnest(%s::uuid[]) AS book(owl_id) CROSS JOIN LATERAL ('
+               f'SELECT {quote_name("book_copy_id")} FROM {table} '
+               f'WHERE {quote_name("book_id")} = book.owl_id AND NOT {quote_name("is_lent")} '
+               f'LIMIT 1 FOR UPDATE SKIP LOCKED) AS book_copy')
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [list(owl_ids)])
+            book_copy_ids = [row[0] for row in cursor.fetchall()]
+        book_copies = queryset.select_related('book__author').filter(
+                      book_copy_id__in=book_copy_ids)
+        return {book_copy.book_id: book_copy for book_copy in book_copies}
+
+    # sets is_lent of a book copy and moves available_copies of its book by one, nothing
+    # changes if the copy is already in the requested state. Callers which know the book of
+    # the copy pass it as owl_id, which saves looking it up. Inside a transaction no
+    # savepoint is taken, an error rolls back the transaction of the caller
+    def update_lent_status(self, book_copy_id, is_lent, owl_id=None):
+        queryset = self.get_queryset()
+        with transaction.atomic(savepoint=False):
+            rows_affected = queryset.filter(book_copy_id=book_copy_id).exclude(
+                            is_lent=is_lent).update(is_lent=is_lent)
+            if rows_affected == 1:
+                if owl_id is None:
+                    owl_id = Subquery(queryset.filter(book_copy_id=book_copy_id)
+                                              .values('book_id'))
+                Book.objects.update_available_copies(owl_id=owl_id,
+                                                     change=-1 if is_lent is True else 1)
+        return rows_affected
+
+    # a book copy is lent out while it has an unreturned borrow record
+    def update_lent_status_from_borrow_records(self, book_copy_id):
+        is_lent = BorrowRecord.objects.filter(book_copy_id=book_copy_id,
+                                              is_returned=False).exists()
+        return self.update_lent_status(book_copy_id=book_copy_id, is_lent=is_lent)
+
+    # update_lent_status for many copies, the copies that change are updated with
+    # UPDATE ... RETURNING and the counters of their books in a single query
+    def update_lent_statuses(self, book_copy_ids, is_lent):
+        if len(book_copy_ids) == 0:
+            return 0
+        quote_name = connection.ops.quote_name
+        sql = (f'UPDATE {quote_name(self.model._meta.db_table)} '
+               f'SET {quote_name("is_lent")} = %s '
+               f'WHERE {quote_name("book_copy_id")} = ANY(%s) '
+               f'AND {quote_name("is_lent")} <> %s '
+               f'RETURNING {quote_name("book_id")}')
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [is_lent, list(book_copy_ids), is_lent])
+                owl_ids = [row[0] for row in cursor.fetchall()]
+            changes = {}
+            for owl_id in owl_ids:
+                changes[owl_id] = changes.get(owl_id, 0) + (-1 if is_lent is True else 1)
+            Book.objects.update_available_copies_of_books(changes=changes)
+        return len(owl_ids)
+
+    # update_lent_status_from_borrow_records for many copies
+    def update_lent_statuses_from_borrow_records(self, book_copy_ids):
+        lent_book_copy_ids = set(BorrowRecord.objects.filter(
+                                 book_copy_id__in=book_copy_ids, is_returned=False)
+                                 .values_list('book_copy_id', flat=True))
+        rows_affected = self.update_lent_statuses(book_copy_ids=lent_book_copy_ids,
+                                                  is_lent=True)
+        rows_affected += self.update_lent_statuses(
+                         book_copy_ids=set(book_copy_ids)-lent_book_copy_ids, is_lent=False)
+        return rows_affected
+
     def update_book_copy_type(self, book_copy_id, new_book_copy_type):
         if new_book_copy_type not in BookCopy.BOOK_COPY_TYPE:
             raise ValidationError('Cannot update BookCopy with invalid BOOK_COPY_TYPE')
@@ -184,9 +578,10 @@ class BookCopyManager(models.Manager):
 
 # This model represents one or more physical/soft copy of a book present in library
 class BookCopy(models.Model):
-    book_copy_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    # remove unique constraint and use ForeignKey to store more copies of the same book
-    book = models.OneToOneField('Book', on_delete=models.PROTECT, unique=True)
+    book_copy_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    book = models.ForeignKey('Book', on_delete=models.PROTECT)
+    # denormalized from BorrowRecord, True while the copy has an unreturned borrow record
+    is_lent = models.BooleanField(default=False, editable=False)
 
     class BOOK_COPY_TYPE(models.TextChoices):
         PAPERBACK = 'pb', 'PAPERBACK'
@@ -197,22 +592,51 @@ class BookCopy(models.Model):
         max_length=2,
         choices=BOOK_COPY_TYPE.choices
     )
+    updated_at = updated_at_field()
 
     objects = BookCopyManager()
 
+    class Meta:
+        indexes = [
+            # finds free copies of a book for the copy allocator
+            models.Index(fields=['book'], name='bookcopy_free_book_idx',
+                         condition=Q(is_lent=False)),
+            models.Index(fields=['updated_at'], name='bookcopy_updated_at_idx'),
+        ]
+
     def __str__(self) -> str:
         return f'{self.book_copy_id} ({self.book})'
 
 
 # LibraryUser model is actually a django User
 class LibraryUser(AbstractUser):
-    pass
+    # bumped on every write to the user's borrow records, see BorrowRecordManager
+    records_version = models.PositiveBigIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.username
 
 
 class BorrowRecordManager(models.Manager):
+    def _update_book_copy_lent_status(self, borrow_record_id):
+        book_copy_id = Subquery(self.get_queryset().filter(
+                       borrow_record_id=borrow_record_id).values('book_copy_id'))
+        BookCopy.objects.update_lent_status_from_borrow_records(book_copy_id=book_copy_id)
+
+    def bump_records_version(self, library_user_id):
+        rows_affected = LibraryUser.objects.filter(pk=library_user_id).update(
+                        records_version=F('records_version')+1)
+        return rows_affected
+
+    def _bump_records_versions(self, library_user_ids):
+        LibraryUser.objects.filter(pk__in=library_user_ids).update(
+            records_version=F('records_version')+1)
+
+    def _bump_records_version_of_borrow_record(self, borrow_record_id):
+        library_user_id = Subquery(self.get_queryset().filter(
+                          borrow_record_id=borrow_record_id).values('library_user_id'))
+        self.bump_records_version(library_user_id=library_user_id)
+
     def _borrow_date_greater_than_return_date(self, borrow_record):
         if borrow_record.borrow_date is not None and borrow_record.return_date is not None:
             if borrow_record.borrow_date > borrow_record.return_date:
@@ -228,11 +652,70 @@ class BorrowRecordManager(models.Manager):
             return queryset.create(borrow_date=borrow_record.borrow_date,
                                    return_date=borrow_record.return_date,
                                    is_returned=borrow_record.is_returned,
+                                   next_eligible_borrow_date=(
+                                       borrow_record.next_eligible_borrow_date),
                                    book_copy=borrow_record.book_copy,
                                    library_user=borrow_record.library_user)
         except (DatabaseError, ObjectDoesNotExist) as e:
             raise e
 
+    # Inserts an unreturned borrow record of a free copy of the book owl_id which the caller
+    # holds locked (see get_free_book_copy_with_matching_owl_id_for_update), for a user whose
+    # records version the caller bumped. The copy is known to become lent, so it is marked
+    # and counted directly instead of re-deriving it from the borrow records like the
+    # signals of create() do, which saves their queries and savepoint
+    def insert_borrow_record_of_locked_book_copy(self, borrow_record, owl_id):
+        if borrow_record.borrow_date >= borrow_record.return_date:
+            raise ValidationError('Borrow date cannot be greater than return date')
+        borrow_record.is_returned = False
+        borrow_record.book_id = owl_id
+        queryset = self.get_queryset()
+        with transaction.atomic(savepoint=False):
+            queryset.bulk_create([borrow_record])
+            BookCopy.objects.update_lent_status(book_copy_id=borrow_record.book_copy_id,
+                                                is_lent=True, owl_id=owl_id)
+        return borrow_record
+
+    # inserts many borrow records with one INSERT, is_lent of their copies and the records
+    # versions of their users are updated like the signals do for single records
+    def insert_borrow_records(self, borrow_records):
+        for borrow_record in borrow_records:
+            if self._borrow_date_greater_than_return_date(borrow_record=borrow_record) is True:
+                raise ValidationError('Borrow date cannot be greater than return date')
+
+        queryset = self.get_queryset()
+        with transaction.atomic():
+            inserted_records = queryset.bulk_create(borrow_records)
+            self._bump_records_versions(
+                library_user_ids={borrow_record.library_user_id
+                                  for borrow_record in borrow_records})
+            BookCopy.objects.update_lent_statuses_from_borrow_records(
+                book_copy_ids=[borrow_record.book_copy_id for borrow_record in borrow_records])
+        return inserted_records
+
+    # renew_borrow_record for many borrow records with one UPDATE. The records are written
+    # as given (book copy, dates, next eligible borrow date) and marked not returned. The
+    # copies they had before are passed as previous_book_copy_ids
+    def renew_borrow_records(self, borrow_records, previous_book_copy_ids):
+        for borrow_record in borrow_records:
+            if borrow_record.borrow_date >= borrow_record.return_date:
+                raise ValidationError('Borrow date cannot be greater than return date')
+            borrow_record.is_returned = False
+
+        queryset = self.get_queryset()
+        with transaction.atomic():
+            rows_affected = queryset.bulk_update(
+                            borrow_records, fields=['book_copy', 'borrow_date', 'return_date',
+                                                    'is_returned',
+                                                    'next_eligible_borrow_date'])
+            self._bump_records_versions(
+                library_user_ids={borrow_record.library_user_id
+                                  for borrow_record in borrow_records})
+            book_copy_ids = [borrow_record.book_copy_id for borrow_record in borrow_records]
+            BookCopy.objects.update_lent_statuses_from_borrow_records(
+                book_copy_ids=set(book_copy_ids) | set(previous_book_copy_ids))
+        return rows_affected
+
     def get_borrow_record_by_owl_id(self, borrow_record_id):
         queryset = self.get_queryset()
         try:
@@ -243,19 +726,48 @@ class BorrowRecordManager(models.Manager):
     def get_borrow_record_by_owl_id_and_username(self, owl_id, username):
         queryset = self.get_queryset()
         try:
-            return queryset.filter(book_copy__book__owl_id=owl_id,
-                                   library_user__username=username).get()
+            return queryset.filter(book_id=owl_id, library_user__username=username).get()
+        except ObjectDoesNotExist as e:
+            raise e
+
+    # the *_user_id variants filter on the library_user_id column, without joining
+    # LibraryUser
+    def get_borrow_record_by_owl_id_and_user_id(self, owl_id, user_id):
+        queryset = self.get_queryset()
+        try:
+            return queryset.filter(book_id=owl_id, library_user_id=user_id).get()
         except ObjectDoesNotExist as e:
             raise e
 
+    def get_all_borrow_records_by_owl_ids_and_user_id(self, owl_ids, user_id):
+        queryset = self.get_queryset()
+        return queryset.filter(book_id__in=owl_ids, library_user_id=user_id)
+
     def get_all_borrow_records_by_owl_id(self, owl_id):
         queryset = self.get_queryset()
-        borrow_records = queryset.filter(book_copy__book__owl_id=owl_id)
+        borrow_records = queryset.filter(book_id=owl_id)
         return borrow_records
 
+    # records of a user are returned newest first, read in that order from
+    # borrowrecord_user_borrowed_idx without sorting
     def get_all_borrow_records_by_username(self, username):
         queryset = self.get_queryset()
-        borrow_records = queryset.filter(library_user__username=username)
+        borrow_records = queryset.filter(library_user__username=username).order_by(
+                         '-borrow_date', '-borrow_record_id')
+        return borrow_records
+
+    def get_all_borrow_records_by_user_id(self, user_id):
+        queryset = self.get_queryset()
+        borrow_records = queryset.filter(library_user_id=user_id).order_by(
+                         '-borrow_date', '-borrow_record_id')
+        return borrow_records
+
+    # returned borrow records of the user whose cool-down period is over at date, i.e. the
+    # books the user may borrow again
+    def get_all_eligible_borrow_records_by_user_id(self, user_id, date):
+        queryset = self.get_queryset()
+        borrow_records = queryset.filter(library_user_id=user_id, is_returned=True,
+                                         next_eligible_borrow_date__lt=date)
         return borrow_records
 
     def get_all_borrow_records_by_return_status(self, is_returned):
@@ -265,19 +777,111 @@ class BorrowRecordManager(models.Manager):
 
     def update_return_status(self, borrow_record_id, return_status):
         queryset = self.get_queryset()
-        rows_affected = queryset.filter(
-                        borrow_record_id=borrow_record_id).update(is_returned=return_status)
+        with transaction.atomic():
+            rows_affected = queryset.filter(borrow_record_id=borrow_record_id).update(
+                            is_returned=return_status)
+            self._update_book_copy_lent_status(borrow_record_id)
+            self._bump_records_version_of_borrow_record(borrow_record_id)
+        return rows_affected
+
+    # update_return_status for many borrow records
+    def update_return_statuses(self, borrow_record_ids, return_status):
+        queryset = self.get_queryset().filter(borrow_record_id__in=borrow_record_ids)
+        with transaction.atomic():
+            rows_affected = queryset.update(is_returned=return_status)
+            self._bump_records_versions(
+                library_user_ids=queryset.values('library_user_id'))
+            BookCopy.objects.update_lent_statuses_from_borrow_records(
+                book_copy_ids=list(queryset.values_list('book_copy_id', flat=True)))
         return rows_affected
 
-    # update borrow_date, return_date and is_returned of BorrowRecord with borrw_record_id
+    # update borrow_date, return_date and is_returned of BorrowRecord with borrw_record_id.
+    # The length of the cool-down period does not depend on the dates, so
+    # next_eligible_borrow_date moves along with borrow_date
     def update_dates_and_status(self, borrow_record_id, borrow_date, return_date,
                                 return_status):
         if borrow_date >= return_date:
             raise ValidationError('Borrow date cannot be greater than return date')
         queryset = self.get_queryset()
-        rows_affected = queryset.filter(borrow_record_id=borrow_record_id).update(
-                        borrow_date=borrow_date, return_date=return_date,
-                        is_returned=return_status)
+        borrow_date_shift = (Value(borrow_date, output_field=models.DateTimeField()) -
+                             F('borrow_date'))
+        with transaction.atomic():
+            rows_affected = queryset.filter(borrow_record_id=borrow_record_id).update(
+                            borrow_date=borrow_date, return_date=return_date,
+                            is_returned=return_status,
+                            next_eligible_borrow_date=(
+                                F('next_eligible_borrow_date')+borrow_date_shift))
+            self._update_book_copy_lent_status(borrow_record_id)
+            self._bump_records_version_of_borrow_record(borrow_record_id)
+        return rows_affected
+
+    # renews a borrow record for the given (possibly different) copy of the same book with
+    # UPDATE ... RETURNING, i.e. a single round trip instead of an update followed by a
+    # select. Returns None if no such borrow record exists
+    def renew_borrow_record(self, borrow_record_id, book_copy_id, borrow_date, return_date,
+                            next_eligible_borrow_date=None):
+        with transaction.atomic():
+            borrow_record = self._renew_borrow_record(borrow_record_id, book_copy_id,
+                                                      borrow_date, return_date,
+                                                      next_eligible_borrow_date)
+            if borrow_record is None:
+                return None
+            self._update_book_copy_lent_status(borrow_record_id)
+            self._bump_records_version_of_borrow_record(borrow_record_id)
+        return borrow_record
+
+    # renew_borrow_record of a returned borrow record for a free copy of the book owl_id which
+    # the caller holds locked, for a user whose records version the caller bumped. Like
+    # insert_borrow_record_of_locked_book_copy the copy is marked and counted directly. The
+    # copy the record had before is not lent by it, it was returned
+    def renew_borrow_record_of_locked_book_copy(self, borrow_record_id, book_copy_id, owl_id,
+                                                borrow_date, return_date,
+                                                next_eligible_borrow_date):
+        with transaction.atomic(savepoint=False):
+            borrow_record = self._renew_borrow_record(borrow_record_id, book_copy_id,
+                                                      borrow_date, return_date,
+                                                      next_eligible_borrow_date)
+            if borrow_record is None:
+                return None
+            BookCopy.objects.update_lent_status(book_copy_id=book_copy_id, is_lent=True,
+                                                owl_id=owl_id)
+        return borrow_record
+
+    def _renew_borrow_record(self, borrow_record_id, book_copy_id, borrow_date, return_date,
+                             next_eligible_borrow_date):
+        if borrow_date >= return_date:
+            raise ValidationError('Borrow date cannot be greater than return date')
+        meta = self.model._meta
+        columns = [field.column for field in meta.concrete_fields]
+        quote_name = connection.ops.quote_name
+        sql = (f'UPDATE {quote_name(meta.db_table)} '
+               f'SET {quote_name("book_copy_id")} = %s, {quote_name("borrow_date")} = %s, '
+               f'{quote_name("return_date")} = %s, {quote_name("is_returned")} = false, '
+               f'{quote_name("next_eligible_borrow_date")} = %s '
+               f'WHERE {quote_name(meta.pk.column)} = %s '
+               f'RETURNING {", ".join(quote_name(column) for column in columns)}')
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [book_copy_id, borrow_date, return_date,
+                                 next_eligible_borrow_date, borrow_record_id])
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        field_names = [field.attname for field in meta.concrete_fields]
+        return self.model.from_db(self.db, field_names, row)
+
+    # Marks an unreturned borrow record returned, for a user whose records version the caller
+    # bumped. An unreturned record is the only one lending its copy (see
+    # borrow_record_unreturned_book_copy_unique), so the copy is freed and counted directly.
+    # Returns the number of records marked, 0 if it was returned already
+    def return_borrow_record(self, borrow_record):
+        queryset = self.get_queryset()
+        with transaction.atomic(savepoint=False):
+            rows_affected = queryset.filter(borrow_record_id=borrow_record.borrow_record_id,
+                                            is_returned=False).update(is_returned=True)
+            if rows_affected == 1:
+                BookCopy.objects.update_lent_status(book_copy_id=borrow_record.book_copy_id,
+                                                    is_lent=False,
+                                                    owl_id=borrow_record.book_id)
         return rows_affected
 
     def delete_borrow_record_by_borrow_record_id(self, borrow_record_id):
@@ -289,19 +893,52 @@ class BorrowRecordManager(models.Manager):
 
 # This model helps in maintaining relation between BookCopy and LibraryUser models
 class BorrowRecord(models.Model):
-    borrow_record_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    borrow_record_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     borrow_date = models.DateTimeField()
     return_date = models.DateTimeField()
     is_returned = models.BooleanField(default=False)
-
-    book_copy = models.ForeignKey('BookCopy', on_delete=models.PROTECT)
+    # end of the cool-down period after this borrow, set by the services when the record is
+    # created or renewed. Null for records written otherwise
+    next_eligible_borrow_date = models.DateTimeField(null=True, blank=True)
+
+    # all foreign keys are the leading column of an index below (book_copy of
+    # unique_together, book of borrow_record_book_user_unique), so they get no index of
+    # their own
+    book_copy = models.ForeignKey('BookCopy', on_delete=models.PROTECT, db_index=False)
+    # the book of book_copy, a user has at most one borrow record per book. Set by a
+    # trigger (see migration 0020) on every write, whatever value the client wrote
+    book = models.ForeignKey('Book', on_delete=models.PROTECT, db_index=False,
+                             editable=False)
     # extended django user (LibraryUser) is referenced by get_user_model()
-    library_user = models.ForeignKey(get_user_model(), on_delete=models.PROTECT)
+    library_user = models.ForeignKey(get_user_model(), on_delete=models.PROTECT,
+                                     db_index=False)
+    updated_at = updated_at_field()
 
     objects = BorrowRecordManager()
 
     class Meta:
+        # implied by borrow_record_book_user_unique, kept as the index of book_copy
         unique_together = ('book_copy', 'library_user')
+        constraints = [
+            # the services look up the borrow record of a book and a user
+            models.UniqueConstraint(fields=['book', 'library_user'],
+                                    name='borrow_record_book_user_unique'),
+            # a book copy can be lent out to at most one user at a time
+            models.UniqueConstraint(fields=['book_copy'], condition=Q(is_returned=False),
+                                    name='borrow_record_unreturned_book_copy_unique'),
+        ]
+        # Indexes are added with AddIndexConcurrently in non-atomic migrations, so that
+        # building them does not lock the table against writes
+        indexes = [
+            # borrow records of a user, newest first, see get_all_borrow_records_by_user_id
+            models.Index(fields=['library_user', '-borrow_date', '-borrow_record_id'],
+                         name='borrowrecord_user_borrowed_idx'),
+            # books a user may borrow again, see get_all_eligible_borrow_records_by_user_id
+            models.Index(fields=['library_user', 'next_eligible_borrow_date'],
+                         name='borrowrecord_user_eligible_idx',
+                         condition=Q(is_returned=True)),
+            models.Index(fields=['updated_at'], name='borrowrecord_updated_at_idx'),
+        ]
 
     def __str__(self) -> str:
         return f'{self.borrow_record_id}'
@@ -0,0 +1,103 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import (Author, Book, BookCopy, BorrowRecord, bump_catalog_version,
+                     catalog_changed, notify_catalog_changed)
+
+
+# the fields of a saved BorrowRecord or BookCopy the receivers below depend on
+PREVIOUS_VALUE_FIELDS = {
+    BorrowRecord: ['book_copy_id', 'library_user_id'],
+    BookCopy: ['book_id', 'is_lent'],
+}
+
+
+# Remembers the values the row of an instance had before it is saved, so that a record
+# moved to another copy or user, or a copy moved to another book, also updates the copy,
+# user or book it was moved away from. Only saves of existing rows cost a query
+@receiver(pre_save, sender=BorrowRecord)
+@receiver(pre_save, sender=BookCopy)
+def remember_previous_values(sender, instance, **kwargs):
+    instance._previous_values = None
+    if instance._state.adding is False:
+        instance._previous_values = (sender.objects.filter(pk=instance.pk)
+                                                   .values(*PREVIOUS_VALUE_FIELDS[sender])
+                                                   .first())
+
+
+# the values of field before and after the save of instance, without None
+def _previous_and_current_values(instance, field):
+    values = [getattr(instance, field)]
+    previous_values = getattr(instance, '_previous_values', None)
+    if previous_values is not None and previous_values[field] not in values:
+        values.append(previous_values[field])
+    return [value for value in values if value is not None]
+
+
+# keeps BookCopy.is_lent and Book.available_copies in sync for writes made through model
+# instances (create, save, delete, admin), queryset updates are handled by the
+# BorrowRecordManager methods
+@receiver(post_save, sender=BorrowRecord)
+@receiver(post_delete, sender=BorrowRecord)
+def update_book_copy_lent_status(sender, instance, **kwargs):
+    for book_copy_id in _previous_and_current_values(instance, 'book_copy_id'):
+        BookCopy.objects.update_lent_status_from_borrow_records(book_copy_id=book_copy_id)
+
+
+# records version of ETags, see LibraryUser.records_version
+@receiver(post_save, sender=BorrowRecord)
+@receiver(post_delete, sender=BorrowRecord)
+def bump_records_version(sender, instance, **kwargs):
+    for library_user_id in _previous_and_current_values(instance, 'library_user_id'):
+        BorrowRecord.objects.bump_records_version(library_user_id=library_user_id)
+
+
+# a free copy counts for its book, moving it to another book or lending it out through
+# save() moves the count as well
+@receiver(post_save, sender=BookCopy)
+def count_saved_book_copy(sender, instance, **kwargs):
+    changes = {}
+    previous_values = getattr(instance, '_previous_values', None)
+    if previous_values is not None and previous_values['is_lent'] is False:
+        changes[previous_values['book_id']] = -1
+    if instance.is_lent is False:
+        changes[instance.book_id] = changes.get(instance.book_id, 0)+1
+    Book.objects.update_available_copies_of_books({owl_id: change for owl_id, change
+                                                   in changes.items() if change != 0})
+
+
+@receiver(post_delete, sender=BookCopy)
+def count_deleted_book_copy(sender, instance, **kwargs):
+    if instance.is_lent is False:
+        Book.objects.update_available_copies(owl_id=instance.book_id, change=-1)
+
+
+# keeps Book.search_vector in sync for books and authors saved as model instances, queryset
+# updates are handled by the BookManager and AuthorManager update methods
+@receiver(post_save, sender=Book)
+def update_book_search_vector(sender, instance, **kwargs):
+    Book.objects.update_search_vectors(owl_id=instance.owl_id)
+
+
+@receiver(post_save, sender=Author)
+def update_author_books_search_vectors(sender, instance, created, **kwargs):
+    if created is False:
+        Book.objects.update_search_vectors(author_id=instance.author_id)
+
+
+# writes made through model instances (create, save, delete, admin) and queryset deletes,
+# the manager methods which update querysets notify on their own
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=BookCopy)
+@receiver(post_delete, sender=BookCopy)
+def notify_catalog_write(sender, **kwargs):
+    notify_catalog_changed(sender=sender)
+
+
+# catalog version of ETags, see base_app.models.get_catalog_version
+@receiver(catalog_changed)
+def bump_catalog_version_on_change(sender, **kwargs):
+    bump_catalog_version()
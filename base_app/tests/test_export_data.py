@@ -0,0 +1,89 @@
+import csv
+import gzip
+import io
+import json
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from base_app.models import Author, Book, BookCopy, BorrowRecord, LibraryUser
+
+
+def _read_jsonl(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+# the command reads from a snapshot of its own transaction
+class ExportDataTest(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.author = Author.objects.create(name='James Gosling', is_popular=True)
+        self.book = Book.objects.create(title='The Java Language Specification',
+                                        author=self.author)
+        self.book_copy = BookCopy.objects.create(
+                         book=self.book, book_copy_type=BookCopy.BOOK_COPY_TYPE.HARDCOVER)
+        self.user = LibraryUser.objects.create(username='NK', password='pass')
+        BorrowRecord.objects.create(borrow_date=timezone.now(),
+                                    return_date=timezone.now()+timedelta(days=14),
+                                    book_copy=self.book_copy, library_user=self.user)
+
+    def _export(self, *args, **options):
+        stdout = io.StringIO()
+        call_command('export_data', self.directory.name, *args, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def _files(self, pattern):
+        return sorted(Path(self.directory.name).glob(pattern))
+
+    def test_full_export_writes_every_model(self):
+        output = self._export()
+        self.assertIn('borrowrecord-', output)
+        books = _read_jsonl(self._files('book-*-full.jsonl.gz')[0])
+        self.assertEqual(len(books), 1)
+        self.assertEqual(books[0]['owl_id'], str(self.book.owl_id))
+        self.assertEqual(books[0]['author_id'], str(self.author.author_id))
+        self.assertEqual(books[0]['available_copies'], 0)
+        self.assertNotIn('search_vector', books[0])
+        borrow_records = _read_jsonl(self._files('borrowrecord-*-full.jsonl.gz')[0])
+        self.assertEqual(borrow_records[0]['library_user_id'], self.user.pk)
+        self.assertEqual(borrow_records[0]['next_eligible_borrow_date'], None)
+        state = json.loads((Path(self.directory.name) / 'export_state.json').read_text())
+        self.assertEqual(sorted(state), ['author', 'book', 'bookcopy', 'borrowrecord'])
+        self.assertEqual(self._files('*.tmp'), [])
+
+    def test_incremental_export_writes_changed_rows_only(self):
+        self._export(models=['book', 'borrowrecord'])
+        Book.objects.update_book_title(owl_id=self.book.owl_id, new_book_title='The JLS')
+        Book.objects.create(title='The Java Virtual Machine Specification', author=self.author)
+        self._export(incremental=True, models=['book', 'borrowrecord', 'author'])
+        books = _read_jsonl(self._files('book-*-incremental.jsonl.gz')[0])
+        self.assertEqual(sorted(book['title'] for book in books),
+                         ['The JLS', 'The Java Virtual Machine Specification'])
+        self.assertEqual(_read_jsonl(self._files('borrowrecord-*-incremental.jsonl.gz')[0]),
+                         [])
+        # never exported before
+        self.assertEqual(len(self._files('author-*-full.jsonl.gz')), 1)
+
+    def test_csv_export(self):
+        self._export(format='csv', models=['bookcopy'])
+        with gzip.open(self._files('bookcopy-*-full.csv.gz')[0], 'rt', newline='') as file:
+            rows = list(csv.reader(file))
+        self.assertEqual(rows[0], ['book_copy_id', 'book_id', 'is_lent', 'book_copy_type',
+                                   'updated_at'])
+        self.assertEqual(rows[1][:4], [str(self.book_copy.pk), str(self.book.owl_id), 'True',
+                                       'hc'])
+        self.assertEqual(len(rows), 2)
+
+
+class ExportDataTransactionTest(TestCase):
+    def test_export_refuses_to_run_in_a_transaction(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaisesMessage(CommandError, 'outside of a transaction'):
+                call_command('export_data', directory, stdout=io.StringIO())
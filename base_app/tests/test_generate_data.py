@@ -0,0 +1,73 @@
+import io
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count, F, Q
+from django.test import TestCase
+
+from base_app.models import Author, Book, BookCopy, BorrowRecord, LibraryUser
+from base_app.management.commands.generate_data import UNSEEDED_COLUMNS
+
+
+def _rows(model):
+    columns = [field.attname for field in model._meta.concrete_fields
+               if field.attname not in UNSEEDED_COLUMNS]
+    return list(model.objects.order_by('pk').values_list(*columns))
+
+
+def _delete_all():
+    for model in [BorrowRecord, BookCopy, Book, Author, LibraryUser]:
+        model.objects.all().delete()
+
+
+class GenerateDataTest(TestCase):
+    def _generate(self, **options):
+        stdout = io.StringIO()
+        call_command('generate_data', stdout=stdout, verbosity=0, **options)
+        return stdout.getvalue().split('checksum ')[1].strip()
+
+    def test_same_seed_generates_same_data(self):
+        checksum = self._generate(books=200, seed=7)
+        rows = {model: _rows(model)
+                for model in [LibraryUser, Author, Book, BookCopy, BorrowRecord]}
+        _delete_all()
+        self.assertEqual(self._generate(books=200, seed=7), checksum)
+        for model, model_rows in rows.items():
+            self.assertEqual(_rows(model), model_rows, model.__name__)
+        _delete_all()
+        self.assertNotEqual(self._generate(books=200, seed=8), checksum)
+
+    def test_generated_data_is_consistent(self):
+        self._generate(books=500, users=150)
+        self.assertEqual(Book.objects.count(), 500)
+        self.assertEqual(LibraryUser.objects.count(), 150)
+        self.assertEqual(set(BookCopy.objects.values_list('book_copy_type', flat=True)),
+                         set(BookCopy.BOOK_COPY_TYPE.values))
+        self.assertGreater(Author.objects.annotate(books=Count('book'))
+                                         .filter(books__gt=1).count(), 0)
+        for author in Author.objects.all():
+            self.assertEqual(author.is_popular, author.name[0] in 'jJ')
+        # available_copies and is_lent agree with the unreturned borrow records
+        self.assertFalse(Book.objects.annotate(
+                         unlent_copies=Count('bookcopy', filter=Q(bookcopy__is_lent=False)))
+                         .exclude(available_copies=F('unlent_copies')).exists())
+        self.assertFalse(BookCopy.objects.annotate(
+                         unreturned=Count('borrowrecord',
+                                          filter=Q(borrowrecord__is_returned=False)))
+                         .exclude(Q(is_lent=True, unreturned=1) |
+                                  Q(is_lent=False, unreturned=0)).exists())
+        self.assertGreater(BookCopy.objects.filter(is_lent=True).count(), 0)
+        # a user borrowed at most one copy of a book
+        self.assertFalse(BorrowRecord.objects.values('library_user', 'book_copy__book')
+                                             .annotate(records=Count('pk'))
+                                             .filter(records__gt=1).exists())
+        book = Book.objects.select_related('author').first()
+        self.assertIn(book, Book.objects.search_books(book.title))
+        # users registered afterwards get the next id
+        self.assertEqual(LibraryUser.objects.create(username='NK').id, 151)
+
+    def test_refuses_non_empty_database(self):
+        Author.objects.create(name='James Gosling', is_popular=True)
+        with self.assertRaisesMessage(CommandError, 'Author has rows'):
+            self._generate(books=10)
+        self.assertEqual(Book.objects.count(), 0)
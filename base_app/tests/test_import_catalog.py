@@ -0,0 +1,123 @@
+import gzip
+import io
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from base_app.management.commands.import_catalog import CatalogRow, import_chunk
+from base_app.models import Author, Book, BookCopy, get_catalog_version
+
+CATALOG_CSV = '''title,author,is_popular,pb,hc,hm
+Clean Code,Robert C. Martin,false,1,2,
+The Java Language Specification,James Gosling,true,,,1
+"Effortless: Make It Easier to Do What Matters Most",Greg Mckeown,,,,
+'''
+
+
+class ImportCatalogTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def _write(self, name, content):
+        path = Path(self.directory.name) / name
+        if name.endswith('.gz'):
+            with gzip.open(path, 'wt', encoding='utf-8') as file:
+                file.write(content)
+        else:
+            path.write_text(content, encoding='utf-8')
+        return str(path)
+
+    def _import(self, *args, **options):
+        stdout = io.StringIO()
+        call_command('import_catalog', *args, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_import_csv(self):
+        catalog_version = get_catalog_version()
+        output = self._import(self._write('catalog.csv', CATALOG_CSV))
+        self.assertIn('imported 3 books and 4 copies from 3 rows', output)
+        self.assertEqual(Author.objects.get(name='James Gosling').is_popular, True)
+        self.assertEqual(Author.objects.get(name='Greg Mckeown').is_popular, False)
+        book = Book.objects.get(title='Clean Code')
+        self.assertEqual(book.available_copies, 3)
+        self.assertEqual(sorted(BookCopy.objects.filter(book=book)
+                                                .values_list('book_copy_type', flat=True)),
+                         ['hc', 'hc', 'pb'])
+        self.assertEqual(list(Book.objects.search_books('clean mart')), [book])
+        self.assertEqual(Book.objects.get(title__startswith='Effortless').available_copies, 0)
+        self.assertGreater(get_catalog_version(), catalog_version)
+
+    def test_import_twice_skips_existing_books_and_updates_popularity(self):
+        path = self._write('catalog.csv', CATALOG_CSV)
+        self._import(path)
+        Author.objects.filter(name='Greg Mckeown').update(is_popular=True)
+        output = self._import(path, chunk_size=2)
+        self.assertIn('imported 0 books and 0 copies from 3 rows (3 books existed already)',
+                      output)
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(BookCopy.objects.count(), 4)
+        # a row without is_popular keeps the popularity of the author
+        self.assertEqual(Author.objects.get(name='Greg Mckeown').is_popular, True)
+        Author.objects.filter(name='James Gosling').update(is_popular=False)
+        self._import(path)
+        self.assertEqual(Author.objects.get(name='James Gosling').is_popular, True)
+
+    def test_import_gzipped_jsonl_with_copy(self):
+        rows = [{'title': 'A Tour of C++', 'author': 'Bjarne Stroustrup',
+                 'copies': {'hc': 1, 'hm': 1}},
+                {'title': 'The C++ Programming Language', 'author': 'Bjarne Stroustrup',
+                 'is_popular': False, 'copies': {}}]
+        path = self._write('catalog.jsonl.gz', ''.join(json.dumps(row)+'\n' for row in rows))
+        self._import(path, copy=True)
+        self.assertEqual(Author.objects.count(), 1)
+        book = Book.objects.get(title='A Tour of C++')
+        self.assertEqual(book.available_copies, 2)
+        self.assertEqual(book.owl_id.version, 7)
+        self.assertEqual(BookCopy.objects.filter(book=book, is_lent=False).count(), 2)
+        self.assertEqual(list(Book.objects.search_books('stroustrup tour')), [book])
+
+    def test_import_continues_after_progress(self):
+        path = self._write('catalog.csv', CATALOG_CSV)
+        progress_file = str(Path(self.directory.name) / 'catalog.progress')
+        Path(progress_file).write_text(json.dumps({'input': path, 'rows': 2}))
+        output = self._import(path, progress_file=progress_file)
+        self.assertIn('continuing after 2 imported rows', output)
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)),
+                         ['Effortless: Make It Easier to Do What Matters Most'])
+        self.assertEqual(json.loads(Path(progress_file).read_text()),
+                         {'input': path, 'rows': 3})
+        with self.assertRaisesMessage(CommandError, 'is the progress of'):
+            self._import(self._write('other.csv', CATALOG_CSV), progress_file=progress_file)
+
+    def test_queries_do_not_grow_with_chunk_size(self):
+        def count_queries(number_of_books):
+            rows = [CatalogRow(line=index, title=f'Book {number_of_books} {index}',
+                               author_name=f'Author {index % 3}', is_popular=None,
+                               copy_types=['hc', 'pb'])
+                    for index in range(number_of_books)]
+            with CaptureQueriesContext(connection) as queries:
+                import_chunk(rows)
+            return len(queries)
+        self.assertEqual(count_queries(5), count_queries(50))
+
+    def test_invalid_rows_are_rejected_with_their_line(self):
+        for content, message in [('title,author\nClean Code,\n', 'line 2: title and author'),
+                                 ('title,author,hc\nClean Code,Robert C. Martin,-1\n',
+                                  'line 2: number of hc copies'),
+                                 ('title,author,is_popular\nClean Code,R. Martin,maybe\n',
+                                  'line 2: is_popular')]:
+            with self.subTest(content=content):
+                with self.assertRaisesMessage(CommandError, message):
+                    self._import(self._write('catalog.csv', content))
+        with self.assertRaisesMessage(CommandError, "unknown book copy type 'xx'"):
+            self._import(self._write('catalog.jsonl',
+                                     '{"title": "a", "author": "b", "copies": {"xx": 1}}\n'))
+        with self.assertRaisesMessage(CommandError, 'use --format'):
+            self._import(self._write('catalog.txt', CATALOG_CSV))
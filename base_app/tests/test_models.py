@@ -1,12 +1,107 @@
 import uuid
 from datetime import timedelta
+from unittest import mock
 
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
-from django.db import DatabaseError, models
-from django.test import TestCase
+from django.db import DatabaseError, connection, models
+from django.test import TestCase, TransactionTestCase
 from django.utils import timezone
 
-from base_app.models import Author, Book, BookCopy, BorrowRecord, LibraryUser
+from base_app.models import (Author, Book, BookCopy, BorrowRecord, LibraryUser,
+                             get_book_borrow_duration_in_days, get_catalog_version,
+                             get_cool_down_period_end_date, get_cool_down_period_in_days,
+                             get_cool_down_period_of_normal_author_in_days,
+                             get_cool_down_period_of_popular_author_in_days,
+                             is_author_name_popular, uuid7)
+
+
+class Uuid7Test(TestCase):
+    def test_uuid7_has_version_variant_and_current_time(self):
+        value = uuid7()
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+        # the first 48 bits are the unix time in milliseconds
+        self.assertLessEqual(abs((value.int >> 80) - timezone.now().timestamp()*1000), 1000)
+
+    def test_uuid7_of_later_milliseconds_sort_after_earlier_ones(self):
+        now = 1700000000000000000
+        with mock.patch('base_app.models.time.time_ns', return_value=now):
+            earlier_values = [uuid7() for _ in range(100)]
+        # one millisecond later
+        with mock.patch('base_app.models.time.time_ns', return_value=now+1000000):
+            later_values = [uuid7() for _ in range(100)]
+        self.assertEqual(len(set(earlier_values)), 100)
+        self.assertLess(max(earlier_values), min(later_values))
+
+    def test_uuid7_of_given_time_and_random_bits(self):
+        value = uuid7(1700000000000, (1 << 80)-1)
+        self.assertEqual(value, uuid7(1700000000000, (1 << 80)-1))
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+        self.assertEqual(value.int >> 80, 1700000000000)
+
+    def test_new_rows_get_uuid7_keys(self):
+        author = Author.objects.create(name='James Gosling', is_popular=True)
+        book = Book.objects.create(title='The Java Language Specification', author=author)
+        book_copy = BookCopy.objects.create(book=book,
+                                            book_copy_type=BookCopy.BOOK_COPY_TYPE.HANDMADE)
+        self.assertEqual(book.owl_id.version, 7)
+        self.assertEqual(book_copy.book_copy_id.version, 7)
+        self.assertEqual(BorrowRecord().borrow_record_id.version, 7)
+
+
+# updated_at is set by a trigger to the start time of the writing transaction
+class UpdatedAtTest(TransactionTestCase):
+    def test_updated_at_follows_inserts_and_changing_updates(self):
+        author = Author.objects.create(name='James Gosling', is_popular=True)
+        book = Book.objects.create(title='The Java Language Specification', author=author)
+        created_at = Book.objects.get(pk=book.pk).updated_at
+        # the value written by the client does not matter
+        Book.objects.filter(pk=book.pk).update(updated_at=created_at-timedelta(days=1))
+        updated_at = Book.objects.get(pk=book.pk).updated_at
+        self.assertGreater(updated_at, created_at)
+        Book.objects.filter(pk=book.pk).update(title='The Java Language Specification')
+        self.assertEqual(Book.objects.get(pk=book.pk).updated_at, updated_at)
+        BookCopy.objects.create(book=book, book_copy_type=BookCopy.BOOK_COPY_TYPE.HANDMADE)
+        # available_copies was moved by a queryset update
+        self.assertGreater(Book.objects.get(pk=book.pk).updated_at, updated_at)
+
+
+class BorrowingRulesTest(TestCase):
+    def setUp(self):
+        self.return_days = 14  # return_book_within_days
+        self.normal_cd = 90  # normal_author_book_cool_down_period_in_days
+        self.popular_cd = 180  # popular_author_book_cool_down_period_in_days
+
+    def test_is_author_name_popular_returns_valid_result(self):
+        self.assertEqual(is_author_name_popular('Jack Black'), True)
+        self.assertEqual(is_author_name_popular('jonas brothers'), True)
+        self.assertEqual(is_author_name_popular('Black Panther'), False)
+        self.assertEqual(is_author_name_popular(''), False)
+
+    def test_is_author_name_popular_raises_exception_for_invalid_arguments(self):
+        self.assertRaises(ValidationError, is_author_name_popular, 1)
+
+    def test_get_book_borrow_duration_in_days(self):
+        self.assertEqual(get_book_borrow_duration_in_days(), self.return_days)
+
+    def test_get_cool_down_period_of_popular_author_in_days(self):
+        self.assertEqual(get_cool_down_period_of_popular_author_in_days(), self.popular_cd)
+
+    def test_get_cool_down_period_of_normal_author_in_days(self):
+        self.assertEqual(get_cool_down_period_of_normal_author_in_days(), self.normal_cd)
+
+    def test_get_cool_down_period_in_days(self):
+        self.assertEqual(get_cool_down_period_in_days(author_name='James Gosling'),
+                         self.popular_cd)
+        self.assertEqual(get_cool_down_period_in_days(author_name='Guido van Rossum'),
+                         self.normal_cd)
+
+    def test_get_cool_down_period_end_date(self):
+        borrow_date = timezone.now()
+        returned_date = get_cool_down_period_end_date(previous_borrow_date=borrow_date,
+                                                      author_name='Guido van Rossum')
+        self.assertEqual(returned_date, borrow_date+timedelta(days=self.normal_cd))
 
 
 class AuthorManagerTest(TestCase):
@@ -27,6 +122,17 @@ class AuthorManagerTest(TestCase):
         author2 = Author(name='Robert C. Martin', is_popular=True)
         self.assertRaises(DatabaseError, Author.objects.insert_author, author=author2)
 
+    def test_upsert_authors_without_popularity_follows_popularity_rule_for_new_ones(self):
+        Author.objects.upsert_authors([Author(name='James Gosling', is_popular=None),
+                                       Author(name='Jane Austen', is_popular=None),
+                                       Author(name='Robert C. Martin', is_popular=None)])
+        self.assertEqual(Author.objects.get(name='James Gosling').is_popular, True)
+        self.assertEqual(Author.objects.get(name='Jane Austen').is_popular, True)
+        self.assertEqual(Author.objects.get(name='Robert C. Martin').is_popular, False)
+        Author.objects.update_author_popularity('Jane Austen', False)
+        Author.objects.upsert_authors([Author(name='Jane Austen', is_popular=None)])
+        self.assertEqual(Author.objects.get(name='Jane Austen').is_popular, False)
+
     def test_get_author_count(self):
         self.assertEqual(Author.objects.get_author_count(), 1)
 
@@ -52,6 +158,14 @@ class AuthorManagerTest(TestCase):
         for author in authors:
             self.assertTrue(search_name in author.name.lower())
 
+    def test_get_all_authors_with_similar_name_tolerates_typos_and_ranks_matches(self):
+        Author.objects.create(name='James Gosling Jr', is_popular=True)
+        Author.objects.create(name='Robert C. Martin', is_popular=False)
+        authors = list(Author.objects.get_all_authors_with_similar_name('gosleng'))
+        self.assertEqual([author.name for author in authors][:1], ['James Gosling'])
+        self.assertEqual(len(authors), 2)
+        self.assertTrue(authors[0].similarity >= authors[1].similarity)
+
     def test_get_author_by_owl_id_returns_valid_author(self):
         author = Author.objects.create(name='William S. Vincent', is_popular=False)
         book = Book.objects.create(author=author, title='Refactoring Workbook')
@@ -157,6 +271,43 @@ class BookManagerTest(TestCase):
         for book in books:
             self.assertTrue(search_string in book.title.lower())
 
+    def test_get_all_books_by_similar_author_name(self):
+        author = Author.objects.create(name='William S. Vincent', is_popular=False)
+        Book.objects.create(author=author, title='Django for Professionals')
+        Book.objects.create(author=self.author, title='An Introduction to Python')
+        books = list(Book.objects.get_all_books_by_similar_author_name('Vincnet'))
+        self.assertEqual([book.title for book in books], ['Django for Professionals'])
+        books = list(Book.objects.get_all_books_by_similar_author_name('rossum'))
+        self.assertEqual([book.title for book in books], ['An Introduction to Python'])
+
+    def test_search_books_matches_title_and_author_prefixes(self):
+        author = Author.objects.create(name='William S. Vincent', is_popular=False)
+        Book.objects.create(author=author, title='Django for Professionals')
+        Book.objects.create(author=author, title='Django for APIs')
+        Book.objects.create(author=self.author, title='Python Django Recipes')
+        Book.objects.create(author=self.author, title='An Introduction to Python')
+        books = list(Book.objects.search_books('djan vinc'))
+        self.assertEqual([book.title for book in books],
+                         ['Django for APIs', 'Django for Professionals'])
+        books = list(Book.objects.search_books('python'))
+        self.assertEqual(len(books), 2)
+        self.assertGreaterEqual(books[0].rank, books[1].rank)
+        self.assertEqual(list(Book.objects.search_books(' & :* !')), [])
+
+    def test_search_books_follows_title_author_and_author_name_updates(self):
+        book = Book.objects.insert_book(book=Book(title='Python Tricks', author=self.author))
+        author = Author.objects.create(name='Dan Bader', is_popular=False)
+        Book.objects.update_book_title(book.owl_id, 'Python Tricks: The Book')
+        self.assertEqual(list(Book.objects.search_books('tricks book rossum')), [book])
+        Book.objects.update_book_author(book.owl_id, new_book_author=author)
+        self.assertEqual(list(Book.objects.search_books('rossum')), [])
+        self.assertEqual(list(Book.objects.search_books('bader')), [book])
+        Author.objects.update_author_name('Dan Bader', 'Daniel Bader')
+        self.assertEqual(list(Book.objects.search_books('daniel tricks')), [book])
+        author.name = 'D. Bader'
+        author.save()
+        self.assertEqual(list(Book.objects.search_books('daniel')), [])
+
     def test_get_all_books_by_author_id_list(self):
         author_1 = Author.objects.create(name='William S. Vincent', is_popular=False)
         author_2 = Author.objects.create(name='William C. Wake', is_popular=False)
@@ -274,6 +425,37 @@ class BookCopyManagerTest(TestCase):
                           BookCopy.objects.get_book_copy_with_matching_owl_id,
                           owl_id=search_owl_id)
 
+    def test_insert_and_delete_book_copy_count_available_copies(self):
+        book_copy = BookCopy(book=self.book, book_copy_type=BookCopy.BOOK_COPY_TYPE.PAPERBACK)
+        book_copy_id = BookCopy.objects.insert_book_copy(book_copy=book_copy).book_copy_id
+        book_copy = BookCopy(book=self.book, book_copy_type=BookCopy.BOOK_COPY_TYPE.HARDCOVER)
+        BookCopy.objects.insert_book_copy(book_copy=book_copy)
+        self.assertEqual(Book.objects.get(owl_id=self.book.owl_id).available_copies, 2)
+        BookCopy.objects.delete_book_copy(book_copy_id=book_copy_id)
+        self.assertEqual(Book.objects.get(owl_id=self.book.owl_id).available_copies, 1)
+
+    def test_get_free_book_copy_with_matching_owl_id_for_update(self):
+        book_copy = BookCopy(book=self.book, book_copy_type=BookCopy.BOOK_COPY_TYPE.PAPERBACK)
+        book_copy_id = BookCopy.objects.insert_book_copy(book_copy=book_copy).book_copy_id
+        free_book_copy = BookCopy.objects.get_free_book_copy_with_matching_owl_id_for_update(
+                            owl_id=self.book.owl_id)
+        self.assertEqual(free_book_copy.book_copy_id, book_copy_id)
+        BookCopy.objects.update_lent_status(book_copy_id=book_copy_id, is_lent=True)
+        free_book_copy = BookCopy.objects.get_free_book_copy_with_matching_owl_id_for_update(
+                            owl_id=self.book.owl_id)
+        self.assertEqual(free_book_copy, None)
+
+    def test_update_lent_status_moves_available_copies_once(self):
+        book_copy = BookCopy(book=self.book, book_copy_type=BookCopy.BOOK_COPY_TYPE.PAPERBACK)
+        book_copy_id = BookCopy.objects.insert_book_copy(book_copy=book_copy).book_copy_id
+        self.assertEqual(BookCopy.objects.update_lent_status(book_copy_id=book_copy_id,
+                                                             is_lent=True), 1)
+        self.assertEqual(BookCopy.objects.update_lent_status(book_copy_id=book_copy_id,
+                                                             is_lent=True), 0)
+        self.assertEqual(Book.objects.get(owl_id=self.book.owl_id).available_copies, 0)
+        BookCopy.objects.update_lent_status(book_copy_id=book_copy_id, is_lent=False)
+        self.assertEqual(Book.objects.get(owl_id=self.book.owl_id).available_copies, 1)
+
     def test_update_book_copy_type_successful_updation(self):
         book_copy = BookCopy(book=self.book, book_copy_type=BookCopy.BOOK_COPY_TYPE.PAPERBACK)
         book_copy_id = BookCopy.objects.insert_book_copy(book_copy=book_copy).book_copy_id
@@ -316,6 +498,16 @@ class BookCopyModelTest(TestCase):
         self.assertEqual(self.bookCopy._meta.get_field('book').remote_field.on_delete,
                          models.PROTECT)
 
+    def test_moving_book_copy_to_another_book_moves_available_copies(self):
+        other_book = Book.objects.create(title='The Law of Success', author=self.author)
+        self.bookCopy.book = other_book
+        self.bookCopy.save()
+        self.assertEqual(Book.objects.get(owl_id=self.book.owl_id).available_copies, 0)
+        self.assertEqual(Book.objects.get(owl_id=other_book.owl_id).available_copies, 1)
+        self.bookCopy.is_lent = True
+        self.bookCopy.save()
+        self.assertEqual(Book.objects.get(owl_id=other_book.owl_id).available_copies, 0)
+
 
 class BorrowRecordManagerTest(TestCase):
     @classmethod
@@ -417,7 +609,9 @@ class BorrowRecordManagerTest(TestCase):
         # which is possible if second user borrows book after first user has returned it
         owl_id = self.book_copy.book.owl_id
         borrow_record = self.borrow_record_instance
+        borrow_record.is_returned = True
         BorrowRecord.objects.insert_borrow_record(borrow_record=borrow_record)
+        borrow_record.is_returned = False
         library_user_2 = LibraryUser.objects.create(username='Ravi')
         borrow_record.library_user = library_user_2
         BorrowRecord.objects.insert_borrow_record(borrow_record=borrow_record)
@@ -442,6 +636,49 @@ class BorrowRecordManagerTest(TestCase):
                             username=username))
         self.assertEqual(len(borrow_records), 2)
 
+    def test_borrow_record_gets_book_of_its_copy(self):
+        borrow_record = BorrowRecord.objects.insert_borrow_record(
+                        borrow_record=self.borrow_record_instance)
+        self.assertEqual(BorrowRecord.objects.get(pk=borrow_record.pk).book_id,
+                         self.book_copy.book_id)
+        book_2 = Book.objects.insert_book(book=Book(title='The Design and Evolution of C++',
+                                                    author=self.book_copy.book.author))
+        BookCopy.objects.filter(pk=self.book_copy.pk).update(book=book_2)
+        self.assertEqual(BorrowRecord.objects.get(pk=borrow_record.pk).book_id, book_2.pk)
+
+    def test_insert_borrow_record_raises_exception_for_second_record_of_book_and_user(self):
+        BorrowRecord.objects.insert_borrow_record(borrow_record=self.borrow_record_instance)
+        book_copy_2 = BookCopy.objects.insert_book_copy(book_copy=BookCopy(
+                      book=self.book_copy.book,
+                      book_copy_type=BookCopy.BOOK_COPY_TYPE.HANDMADE))
+        self.assertRaises(DatabaseError, BorrowRecord.objects.insert_borrow_record,
+                          borrow_record=BorrowRecord(
+                              borrow_date=timezone.now(),
+                              return_date=timezone.now()+timedelta(days=14),
+                              book_copy=book_copy_2, library_user=self.library_user))
+
+    def test_get_all_borrow_records_by_user_id_returns_newest_first_from_index(self):
+        BorrowRecord.objects.insert_borrow_record(borrow_record=self.borrow_record_instance)
+        book_2 = Book.objects.insert_book(book=Book(title='The Design and Evolution of C++',
+                                                    author=self.book_copy.book.author))
+        book_copy_2 = BookCopy.objects.insert_book_copy(book_copy=BookCopy(
+                      book=book_2, book_copy_type=BookCopy.BOOK_COPY_TYPE.HANDMADE))
+        BorrowRecord.objects.insert_borrow_record(borrow_record=BorrowRecord(
+            borrow_date=timezone.now()+timedelta(days=1),
+            return_date=timezone.now()+timedelta(days=15),
+            book_copy=book_copy_2, library_user=self.library_user))
+        borrow_records = BorrowRecord.objects.get_all_borrow_records_by_user_id(
+                         user_id=self.library_user.pk)
+        self.assertEqual([borrow_record.book_copy_id for borrow_record in borrow_records],
+                         [book_copy_2.pk, self.book_copy.pk])
+        with connection.cursor() as cursor:
+            # the table is tiny, keep the planner from preferring a scan and a sort
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+            plan = borrow_records.explain()
+        self.assertIn('borrowrecord_user_borrowed_idx', plan)
+        self.assertNotIn('Sort', plan)
+
     def test_get_all_borrow_records_by_return_status_returns_valid_result(self):
         borrow_record = self.borrow_record_instance
         BorrowRecord.objects.insert_borrow_record(borrow_record=borrow_record)
@@ -474,6 +711,86 @@ class BorrowRecordManagerTest(TestCase):
         self.assertEqual(BorrowRecord.objects.get_borrow_record_by_owl_id(
                             borrow_record_id=borrow_record_id).is_returned, new_return_status)
 
+    def test_borrow_record_writes_maintain_book_availability(self):
+        book = self.book_copy.book
+
+        def assert_lent(is_lent):
+            book_copy = BookCopy.objects.get(book_copy_id=self.book_copy.book_copy_id)
+            self.assertEqual(book_copy.is_lent, is_lent)
+            available_copies = Book.objects.get(owl_id=book.owl_id).available_copies
+            self.assertEqual(available_copies, 0 if is_lent is True else 1)
+
+        assert_lent(False)
+        borrow_record_id = BorrowRecord.objects.insert_borrow_record(
+                            borrow_record=self.borrow_record_instance).borrow_record_id
+        assert_lent(True)
+        BorrowRecord.objects.update_return_status(borrow_record_id=borrow_record_id,
+                                                  return_status=True)
+        assert_lent(False)
+        BorrowRecord.objects.update_dates_and_status(
+            borrow_record_id=borrow_record_id, borrow_date=timezone.now(),
+            return_date=timezone.now()+timedelta(days=14), return_status=False)
+        assert_lent(True)
+        BorrowRecord.objects.delete_borrow_record_by_borrow_record_id(
+            borrow_record_id=borrow_record_id)
+        assert_lent(False)
+
+    def test_borrow_record_writes_bump_records_and_catalog_versions(self):
+        versions = []
+
+        def assert_versions_bumped():
+            library_user = LibraryUser.objects.get(pk=self.library_user.pk)
+            versions.append((library_user.records_version, get_catalog_version()))
+            if len(versions) > 1:
+                self.assertGreater(versions[-1][0], versions[-2][0])
+                self.assertGreater(versions[-1][1], versions[-2][1])
+
+        assert_versions_bumped()
+        # every write lends out or returns the copy, i.e. changes availability as well
+        borrow_record_id = BorrowRecord.objects.insert_borrow_record(
+                            borrow_record=self.borrow_record_instance).borrow_record_id
+        assert_versions_bumped()
+        BorrowRecord.objects.update_return_status(borrow_record_id=borrow_record_id,
+                                                  return_status=True)
+        assert_versions_bumped()
+        BorrowRecord.objects.renew_borrow_record(
+            borrow_record_id=borrow_record_id, book_copy_id=self.book_copy.book_copy_id,
+            borrow_date=timezone.now(), return_date=timezone.now()+timedelta(days=14))
+        assert_versions_bumped()
+
+    def test_insert_borrow_record_raises_exception_for_copy_already_lent_out(self):
+        borrow_record = self.borrow_record_instance
+        BorrowRecord.objects.insert_borrow_record(borrow_record=borrow_record)
+        borrow_record.library_user = LibraryUser.objects.create(username='Ravi')
+        self.assertRaises(DatabaseError, BorrowRecord.objects.insert_borrow_record,
+                          borrow_record=borrow_record)
+
+    def test_renew_borrow_record_returns_updated_record(self):
+        borrow_record_id = BorrowRecord.objects.insert_borrow_record(
+                            borrow_record=self.borrow_record_instance).borrow_record_id
+        BorrowRecord.objects.update_return_status(borrow_record_id=borrow_record_id,
+                                                  return_status=True)
+        new_borrow_date = timezone.now()
+        new_return_date = new_borrow_date+timedelta(days=14)
+        renewed_record = BorrowRecord.objects.renew_borrow_record(
+                            borrow_record_id=borrow_record_id,
+                            book_copy_id=self.book_copy.book_copy_id,
+                            borrow_date=new_borrow_date, return_date=new_return_date)
+        self.assertEqual(renewed_record.borrow_record_id, borrow_record_id)
+        self.assertEqual(renewed_record.borrow_date, new_borrow_date)
+        self.assertEqual(renewed_record.return_date, new_return_date)
+        self.assertEqual(renewed_record.is_returned, False)
+        self.assertEqual(renewed_record.book_copy_id, self.book_copy.book_copy_id)
+        self.assertEqual(Book.objects.get(owl_id=self.book_copy.book_id).available_copies, 0)
+
+    def test_renew_borrow_record_returns_none_for_missing_record(self):
+        new_borrow_date = timezone.now()
+        self.assertEqual(BorrowRecord.objects.renew_borrow_record(
+                            borrow_record_id=uuid.uuid4(),
+                            book_copy_id=self.book_copy.book_copy_id,
+                            borrow_date=new_borrow_date,
+                            return_date=new_borrow_date+timedelta(days=14)), None)
+
     def test_update_dates_and_status_successful_updation(self):
         borrow_record = self.borrow_record_instance
         borrow_record_id = BorrowRecord.objects.insert_borrow_record(
@@ -485,6 +802,29 @@ class BorrowRecordManagerTest(TestCase):
                         return_date=new_return_date, return_status=False)
         self.assertEqual(rows_affected, 1)
 
+    def test_update_dates_and_status_moves_next_eligible_borrow_date(self):
+        borrow_record = self.borrow_record_instance
+        borrow_record.next_eligible_borrow_date = borrow_record.borrow_date+timedelta(days=90)
+        borrow_record_id = BorrowRecord.objects.insert_borrow_record(
+                            borrow_record=borrow_record).borrow_record_id
+        new_borrow_date = borrow_record.borrow_date-timedelta(days=100)
+        BorrowRecord.objects.update_dates_and_status(
+            borrow_record_id=borrow_record_id, borrow_date=new_borrow_date,
+            return_date=new_borrow_date+timedelta(days=14), return_status=True)
+        updated_record = BorrowRecord.objects.get(borrow_record_id=borrow_record_id)
+        self.assertEqual(updated_record.next_eligible_borrow_date,
+                         new_borrow_date+timedelta(days=90))
+
+        eligible_records = BorrowRecord.objects.get_all_eligible_borrow_records_by_user_id(
+                           user_id=self.library_user.pk, date=timezone.now())
+        self.assertEqual(list(eligible_records), [updated_record])
+        eligible_records = BorrowRecord.objects.get_all_eligible_borrow_records_by_user_id(
+                           user_id=self.library_user.pk,
+                           date=timezone.now()-timedelta(days=20))
+        self.assertEqual(list(eligible_records), [])
+        # read from borrowrecord_user_eligible_idx, without joining LibraryUser
+        self.assertNotIn('JOIN', str(eligible_records.query))
+
     def test_update_dates_and_status_raises_exception_for_invalid_dates(self):
         borrow_record = self.borrow_record_instance
         borrow_record_id = BorrowRecord.objects.insert_borrow_record(
@@ -544,3 +884,24 @@ class BorrowRecordModelTest(TestCase):
         library_user_on_delete_value = self.borrow_record._meta.get_field(
                                         'library_user').remote_field.on_delete
         self.assertEqual(library_user_on_delete_value, models.PROTECT)
+
+    def test_moving_borrow_record_to_another_copy_frees_the_previous_copy(self):
+        other_book_copy = BookCopy.objects.insert_book_copy(book_copy=BookCopy(
+                          book=self.book, book_copy_type=BookCopy.BOOK_COPY_TYPE.PAPERBACK))
+        self.assertEqual(BookCopy.objects.get(pk=self.book_copy.pk).is_lent, True)
+        borrow_record = BorrowRecord.objects.get(pk=self.borrow_record.pk)
+        borrow_record.book_copy = other_book_copy
+        borrow_record.save()
+        self.assertEqual(BookCopy.objects.get(pk=self.book_copy.pk).is_lent, False)
+        self.assertEqual(BookCopy.objects.get(pk=other_book_copy.pk).is_lent, True)
+        self.assertEqual(Book.objects.get(owl_id=self.book.owl_id).available_copies, 1)
+
+    def test_moving_borrow_record_to_another_user_bumps_both_records_versions(self):
+        other_user = LibraryUser.objects.create(username='Jane Doe', password='pass')
+        records_version = LibraryUser.objects.get(pk=self.library_user.pk).records_version
+        borrow_record = BorrowRecord.objects.get(pk=self.borrow_record.pk)
+        borrow_record.library_user = other_user
+        borrow_record.save()
+        self.assertEqual(LibraryUser.objects.get(pk=self.library_user.pk).records_version,
+                         records_version+1)
+        self.assertEqual(LibraryUser.objects.get(pk=other_user.pk).records_version, 1)
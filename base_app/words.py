@@ -0,0 +1,12 @@
+# consonant + vowel (+ consonant) syllables, roughly 2000 of them, so generated words are
+# about as diverse as real names and a search does not match half of the table. Used for
+# generated data (generate_data) and the benchmarks, it needs no django setup
+SYLLABLES = [onset + vowel + coda for onset in ['b', 'br', 'c', 'ch', 'd', 'f', 'g', 'h', 'j',
+                                                'k', 'kl', 'l', 'm', 'n', 'p', 'r', 's', 'st',
+                                                't', 'tr', 'v', 'w', 'z']
+             for vowel in ['a', 'e', 'i', 'o', 'u', 'ei', 'ou']
+             for coda in ['', 'n', 'r', 'l', 's', 'ck', 'm', 'nd', 'x', 'sk', 'tz', 'ff']]
+
+
+def random_word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
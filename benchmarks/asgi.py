@@ -0,0 +1,175 @@
+"""How many slow clients one worker holds at once, WSGI (sync views) vs ASGI (async views).
+
+Fills a throwaway database with N books, then sends C concurrent GET requests from slow
+clients, each of which takes --client-seconds to send its request and read the response (half
+each, like a phone on a bad network). The WSGI worker is a pool of --threads threads calling
+WSGIHandler with the sync views, as a threaded WSGI server would, so a thread is busy for as
+long as its client is slow. The ASGI worker is one event loop running ASGIHandler with the
+async views (API_SERVER=asgi), where a slow client only holds a coroutine. Reported are the
+wall time, the number of clients held at once and the latency seen by the clients.
+
+No server or sockets are involved, both handlers are called in process, so the numbers are
+about the worker model and not about a particular server.
+
+Usage (from the project root):
+    python -m benchmarks.asgi --books 200 --clients 8 64 256 --threads 8
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import benchmark_database, format_summary, setup_django, summarize
+
+setup_django()
+
+from django.core.handlers.asgi import ASGIHandler  # noqa: E402
+from django.core.handlers.wsgi import WSGIHandler  # noqa: E402
+from django.test.client import FakePayload  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from django.urls import include, path  # noqa: E402
+
+import rest_api.async_views as async_views  # noqa: E402
+import rest_api.views as views  # noqa: E402
+from base_app.models import Author, Book  # noqa: E402
+from base_app.words import random_word  # noqa: E402
+from rest_api.urls import get_urlpatterns  # noqa: E402
+
+
+def _fill_database(number_of_books, rng):
+    authors = Author.objects.bulk_create(
+              [Author(name=f'{random_word(rng)} {random_word(rng)}', is_popular=False)
+               for _ in range(max(1, number_of_books // 10))])
+    Book.objects.bulk_create([Book(title=f'{random_word(rng)} {random_word(rng)}',
+                                   author=rng.choice(authors))
+                              for _ in range(number_of_books)])
+
+
+def _urlconf(read_views):
+    urlconf = types.ModuleType(f'benchmark_urls_{read_views.__name__}')
+    urlconf.urlpatterns = [path('', include(get_urlpatterns(read_views)))]
+    return urlconf
+
+
+# counts clients that are being served, and the most served at once
+class HeldClients:
+    def __init__(self):
+        self.held = 0
+        self.max_held = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.held += 1
+            self.max_held = max(self.max_held, self.held)
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self.held -= 1
+
+
+def _run_wsgi(url, number_of_clients, client_seconds, threads):
+    application = WSGIHandler()
+    held_clients = HeldClients()
+    path_info, _, query_string = url.partition('?')
+
+    # latencies count from the submission, a client waits while all threads are busy
+    def client(start):
+        with held_clients:
+            # a sync worker reads the request and writes the response itself
+            time.sleep(client_seconds / 2)
+            environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path_info,
+                       'QUERY_STRING': query_string, 'SCRIPT_NAME': '',
+                       'SERVER_NAME': 'testserver', 'SERVER_PORT': '80',
+                       'SERVER_PROTOCOL': 'HTTP/1.1', 'REMOTE_ADDR': '127.0.0.1',
+                       'wsgi.url_scheme': 'http', 'wsgi.input': FakePayload(b''),
+                       'wsgi.errors': None}
+            statuses = []
+            response = application(environ, lambda status, headers: statuses.append(status))
+            body = b''.join(response)
+            # as a WSGI server does, closing the response sends request_finished
+            response.close()
+            assert statuses[0].startswith('200'), statuses[0]
+            assert len(body) > 0
+            time.sleep(client_seconds / 2)
+        return (time.perf_counter()-start) * 1000
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(client, time.perf_counter())
+                   for _ in range(number_of_clients)]
+        return [future.result() for future in futures], held_clients.max_held
+
+
+def _run_asgi(url, number_of_clients, client_seconds):
+    application = ASGIHandler()
+    held_clients = HeldClients()
+    path_info, _, query_string = url.partition('?')
+
+    async def client():
+        start = time.perf_counter()
+        scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                 'method': 'GET', 'scheme': 'http', 'path': path_info, 'raw_path': b'',
+                 'query_string': query_string.encode(), 'root_path': '',
+                 'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 0),
+                 'server': ('testserver', 80)}
+        messages = []
+
+        async def receive():
+            await asyncio.sleep(client_seconds / 2)
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body'):
+                await asyncio.sleep(client_seconds / 2)
+
+        with held_clients:
+            await application(scope, receive, send)
+        assert messages[0]['status'] == 200, messages[0]
+        return (time.perf_counter()-start) * 1000
+
+    async def run_clients():
+        return await asyncio.gather(*[client() for _ in range(number_of_clients)])
+
+    return asyncio.run(run_clients()), held_clients.max_held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=200)
+    parser.add_argument('--clients', type=int, nargs='+', default=[8, 64, 256])
+    parser.add_argument('--client-seconds', type=float, default=0.5)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--url', default='/books/available/?fields=owl_id,title')
+    parser.add_argument('--keepdb', action='store_true')
+    args = parser.parse_args()
+
+    with benchmark_database(keepdb=args.keepdb):
+        if Book.objects.count() != args.books:
+            Book.objects.all().delete()
+            Author.objects.all().delete()
+            _fill_database(args.books, random.Random(0))
+        print(f'{args.books} books, GET {args.url}, {args.client_seconds}s per client')
+        for number_of_clients in sorted(args.clients):
+            print(f'{number_of_clients} concurrent clients')
+            runs = [(f'  WSGI, {args.threads} threads', views,
+                     lambda: _run_wsgi(args.url, number_of_clients, args.client_seconds,
+                                       args.threads)),
+                    ('  ASGI, 1 event loop', async_views,
+                     lambda: _run_asgi(args.url, number_of_clients, args.client_seconds))]
+            for label, read_views, run in runs:
+                with override_settings(ROOT_URLCONF=_urlconf(read_views),
+                                       ALLOWED_HOSTS=['testserver']):
+                    start = time.perf_counter()
+                    latencies, max_held = run()
+                    wall_time = time.perf_counter()-start
+                print(f'{format_summary(label, summarize(latencies))}  '
+                      f'wall {wall_time:>6.2f}s  held at once {max_held:>4}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Author search benchmark for /books/author/<name>.
+
+Compares the trigram indexed single join search with the previous two step
+icontains search (authors first, then books by author id) on a large Author
+table. The previous search is measured with the trigram indexes dropped inside
+a rolled back transaction, which is what the table looked like before.
+
+Usage (from the project root):
+    python -m benchmarks.author_search --authors 1000000 --repeat 20
+"""
+import argparse
+import random
+
+from benchmarks.utils import (benchmark_database, format_summary, setup_django, summarize,
+                              time_calls)
+
+setup_django()
+
+from django.db import connection, transaction  # noqa: E402
+
+import rest_api.services as services  # noqa: E402
+from base_app.models import Author, Book  # noqa: E402
+from base_app.words import random_word  # noqa: E402
+
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda',
+               'David', 'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph',
+               'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen', 'Guido', 'Bjarne', 'Dennis',
+               'Grace', 'Ada', 'Alan', 'Edsger', 'Donald', 'Barbara', 'Ken']
+BATCH_SIZE = 10000
+
+
+def _populate(number_of_authors, seed):
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < number_of_authors:
+        names.add(f'{rng.choice(FIRST_NAMES)} {random_word(rng).capitalize()}')
+    names = sorted(names)
+    rng.shuffle(names)
+
+    for start in range(0, len(names), BATCH_SIZE):
+        authors = Author.objects.bulk_create(
+                  [Author(name=name, is_popular=name[0] == 'J')
+                   for name in names[start:start+BATCH_SIZE]])
+        Book.objects.bulk_create([Book(title=f'Collected works of {author.name}',
+                                       author=author) for author in authors])
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return names
+
+
+def _misspell(rng, word):
+    index = rng.randrange(1, len(word)-1)
+    return word[:index] + rng.choice('aeiou') + word[index+1:]
+
+
+def _legacy_search(name):
+    authors = Author.objects.filter(name__icontains=name)
+    author_ids = authors.values_list('author_id', flat=True)
+    return list(Book.objects.filter(author_id__in=author_ids).select_related('author'))
+
+
+def _trigram_search(name):
+    return list(services.get_all_books_by_similar_author_name(name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--authors', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        print(f'inserting {args.authors} authors and books ...')
+        names = _populate(args.authors, args.seed)
+        rng = random.Random(args.seed)
+        surnames = [names[rng.randrange(len(names))].split(' ')[1] for _ in range(5)]
+        queries = {
+            'exact surname': surnames,
+            'surname with a typo': [_misspell(rng, surname) for surname in surnames],
+            'surname prefix': [surname[:5] for surname in surnames],
+        }
+
+        for kind, terms in queries.items():
+            matches = sum(len(_trigram_search(term)) for term in terms) / len(terms)
+            samples = []
+            for term in terms:
+                samples += time_calls(lambda: _trigram_search(term), args.repeat)
+            print(format_summary(f'trigram join, {kind} (~{matches:.0f} rows)',
+                                 summarize(samples)))
+
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute('DROP INDEX author_name_trgm_idx')
+                    cursor.execute('DROP INDEX author_upper_name_trgm_idx')
+                matches = sum(len(_legacy_search(term)) for term in terms) / len(terms)
+                samples = []
+                for term in terms:
+                    samples += time_calls(lambda: _legacy_search(term), max(1, args.repeat//4))
+                transaction.set_rollback(True)
+            print(format_summary(f'legacy icontains, {kind} (~{matches:.0f} rows)',
+                                 summarize(samples)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Full text catalog search benchmark for /books/search/?q=.
+
+Fills a throwaway database with N books (default 1M) whose titles are drawn from a skewed
+vocabulary, so some words are in a large share of the titles and most words are rare, then
+times services.search_books for queries of different selectivity. The previous title search
+(title__icontains) is measured as a baseline for the single word queries.
+
+Usage (from the project root):
+    python -m benchmarks.book_search --books 1000000 --repeat 50
+"""
+import argparse
+import itertools
+import random
+
+from benchmarks.utils import (benchmark_database, format_summary, setup_django, summarize,
+                              time_calls)
+
+setup_django()
+
+from django.db import connection  # noqa: E402
+
+import rest_api.services as services  # noqa: E402
+from base_app.models import Author, Book  # noqa: E402
+from base_app.words import random_word  # noqa: E402
+
+BATCH_SIZE = 10000
+BOOKS_PER_AUTHOR = 10
+VOCABULARY_SIZE = 50000
+
+
+def _populate(number_of_books, seed):
+    rng = random.Random(seed)
+    vocabulary = sorted({random_word(rng) for _ in range(VOCABULARY_SIZE)})
+    rng.shuffle(vocabulary)
+    # zipf like word frequencies, the first words of the vocabulary are the common ones
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary)+1)))
+
+    number_of_authors = max(1, number_of_books // BOOKS_PER_AUTHOR)
+    author_names = set()
+    while len(author_names) < number_of_authors:
+        author_names.add(f'{random_word(rng).capitalize()} {random_word(rng).capitalize()}')
+    authors = [Author(name=name, is_popular=name[0] == 'J') for name in sorted(author_names)]
+    Author.objects.bulk_create(authors, batch_size=BATCH_SIZE)
+
+    books_with_author = []
+    for start in range(0, number_of_books, BATCH_SIZE):
+        books = []
+        for index in range(start, min(start+BATCH_SIZE, number_of_books)):
+            words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(2, 5))
+            # the book index keeps (title, author) unique
+            title = ' '.join(words).capitalize() + f' {index}'
+            author = authors[index % number_of_authors]
+            books.append(Book(title=title, author=author))
+            books_with_author.append((title, author.name))
+        Book.objects.bulk_create(books)
+    # bulk_create bypasses the signals, so vectors are built once for the whole table
+    Book.objects.update_search_vectors()
+    with connection.cursor() as cursor:
+        cursor.execute('VACUUM ANALYZE')
+    return vocabulary, books_with_author
+
+
+def _search(search_text):
+    return list(services.search_books(search_text))
+
+
+def _legacy_search(search_text):
+    return list(Book.objects.get_all_books_by_similar_title(search_text)
+                            .select_related('author')[:100])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        print(f'inserting {args.books} books ...')
+        vocabulary, books_with_author = _populate(args.books, args.seed)
+        rng = random.Random(args.seed)
+        rare_words = rng.sample(vocabulary[len(vocabulary)//2:], 10)
+        # first title word (usually a common one) and the author's surname
+        title_and_author = [f'{title.split()[0]} {author_name.split()[1]}'
+                            for title, author_name in rng.sample(books_with_author, 10)]
+        queries = {
+            'rare word': (rare_words, True),
+            'rare word prefix': ([word[:-1] for word in rare_words], True),
+            'title word and author': (title_and_author, False),
+            'common word': (vocabulary[:10], True),
+        }
+
+        for kind, (terms, with_baseline) in queries.items():
+            matches = sum(len(_search(term)) for term in terms) / len(terms)
+            samples = []
+            for term in terms:
+                samples += time_calls(lambda: _search(term), args.repeat)
+            print(format_summary(f'full text, {kind} (~{matches:.0f} rows)',
+                                 summarize(samples)))
+            if with_baseline is False:
+                continue
+            samples = []
+            for term in terms:
+                samples += time_calls(lambda: _legacy_search(term), max(1, args.repeat//10))
+            print(format_summary(f'title icontains, {kind}', summarize(samples)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Throughput of borrow_book and return_book when many users want the same copies.
+
+Creates --books books with one copy each and --threads users in a throwaway database. Every
+user walks over all books starting at a different offset, borrowing each and returning it
+right away, so the threads keep colliding on the same copies. A borrow of a copy which
+another thread holds is rejected. Each round uses new users (a user borrows a book once per
+cool-down period). Reported are the attempts (borrowed and rejected) per second of every
+round.
+
+Usage (from the project root):
+    python -m benchmarks.borrow_contention --threads 8 --books 4 --rounds 10
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.utils import benchmark_database, setup_django
+
+setup_django()
+
+from django.db import connection  # noqa: E402
+
+import rest_api.services as services  # noqa: E402
+from base_app.models import Author, Book, BookCopy, LibraryUser  # noqa: E402
+
+
+def _populate(number_of_books):
+    books = []
+    for i in range(number_of_books):
+        author = Author.objects.create(name=f'Author {i}', is_popular=False)
+        book = Book.objects.create(title=f'Book {i}', author=author)
+        BookCopy.objects.create(book=book, book_copy_type=BookCopy.BOOK_COPY_TYPE.PAPERBACK)
+        books.append(book)
+    return books
+
+
+# runs target(index) on every thread at once, each thread uses its own db connection
+def _run_concurrently(number_of_threads, target):
+    barrier = threading.Barrier(number_of_threads)
+
+    def run(index):
+        try:
+            barrier.wait()
+            target(index)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(number_of_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+# returns the numbers of borrowed and rejected attempts and the seconds they took
+def _round(books, users):
+    successes = []
+    rejections = []
+
+    def borrow_and_return(index):
+        user_id = users[index].pk
+        for i in range(len(books)):
+            owl_id = books[(index+i) % len(books)].owl_id
+            try:
+                services.borrow_book(owl_id=owl_id, user_id=user_id)
+            except Exception:
+                rejections.append(index)
+                continue
+            successes.append(index)
+            services.return_book(owl_id=owl_id, user_id=user_id)
+
+    start = time.perf_counter()
+    _run_concurrently(len(users), borrow_and_return)
+    return len(successes), len(rejections), time.perf_counter()-start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--books', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        books = _populate(args.books)
+        rates = []
+        for round_number in range(args.rounds):
+            users = [LibraryUser.objects.create(username=f'user{round_number}-{i}',
+                                                password='pass')
+                     for i in range(args.threads)]
+            borrowed, rejected, seconds = _round(books, users)
+            rates.append((borrowed+rejected) / seconds)
+            print(f'round {round_number}: {args.threads} threads, {args.books} copies, '
+                  f'{borrowed} borrowed, {rejected} rejected, {rates[-1]:.1f} attempts/s')
+        print(f'borrow_book contention: {sorted(rates)[len(rates) // 2]:.1f} attempts/s '
+              f'(median of {args.rounds} rounds)')
+
+
+if __name__ == '__main__':
+    main()
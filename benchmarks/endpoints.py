@@ -0,0 +1,383 @@
+"""Latency, SQL queries and memory of every endpoint of rest_api/urls.py at growing scales.
+
+For every --books scale the benchmark database is flushed and filled by the generate_data
+command with --seed, so the same options measure the same data on every commit. Every
+endpoint is then requested --repeat times in process through django.test.Client (url
+routing, middleware, authentication, queries, serialization and rendering, but no network),
+authenticated with bearer tokens. The catalog response cache is cleared before every request
+unless --cached is given, so repeated requests measure the queries and not cache hits.
+Requests which write are made by fresh users on books with a free copy, and every borrowed
+book is returned again, so every iteration does the same work.
+
+Reported per endpoint and scale are the p50/p95/p99 latency, the number of SQL queries and
+the time spent executing them (fetching rows of server-side cursors is not counted), and
+the peak memory Python allocated during a request (tracemalloc,
+which slows requests down, so it is measured in --memory-repeat extra requests). Memory
+allocated by the database driver outside of Python is not included.
+
+The results are written to the json file --output, e.g. one per release. --baseline compares
+them with such a file and exits with status 1 when an endpoint got more than --threshold
+percent slower at p95 or makes more queries than before.
+
+Usage (from the project root):
+    python -m benchmarks.endpoints --books 1000 10000 100000 --output endpoints-1.4.json
+    python -m benchmarks.endpoints --books 1000 10000 100000 --baseline endpoints-1.4.json
+"""
+import argparse
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from benchmarks.utils import benchmark_database, setup_django, summarize
+
+setup_django()
+
+import django  # noqa: E402
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Count  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from base_app.models import Author, Book, BookCopy, BorrowRecord, LibraryUser  # noqa: E402
+from rest_api.authentication import create_token  # noqa: E402
+from rest_api.cache import catalog_cache  # noqa: E402
+from rest_api.urls import urlpatterns  # noqa: E402
+
+WARMUP = 2
+BATCH_SIZE = 10
+PAGE_SIZE = 100
+PASSWORD = 'benchmark-password'
+MODELS = [LibraryUser, Author, Book, BookCopy, BorrowRecord]
+
+# One request of an endpoint. route is its pattern in rest_api/urls.py, name tells requests
+# of the same route apart, request(fixtures, i) makes the request of the i-th iteration and
+# returns the response, which has to have expected_status
+Step = namedtuple('Step', ['route', 'name', 'request', 'expected_status'])
+
+
+# users, books and names the requests are made with, picked from the generated data the
+# same way for the same seed
+class Fixtures:
+    def __init__(self, iterations):
+        self.client = Client()
+        # the user with the most borrow records, the heaviest reader of /accounts/records/
+        top_reader = (BorrowRecord.objects.values('library_user')
+                      .annotate(records=Count('pk'))
+                      .order_by('-records', 'library_user')[0])
+        reader_id = top_reader['library_user']
+        self.reader = LibraryUser.objects.get(pk=reader_id)
+        reader_books = Book.objects.filter(bookcopy__borrowrecord__library_user=self.reader)
+        self.reader_owl_ids = [str(owl_id) for owl_id in (
+                               reader_books.order_by('owl_id').distinct()
+                                           .values_list('owl_id', flat=True))]
+        self.admin = LibraryUser.objects.create(username='benchmark-admin', password='!',
+                                                is_staff=True)
+        # the author with the most books, and a word of one of their titles
+        author = Author.objects.annotate(books=Count('book')).order_by('-books', 'name')[0]
+        self.author_name = author.name
+        self.search_text = (Book.objects.filter(author=author).order_by('owl_id')
+                                        .values_list('title', flat=True)[0].split()[0])
+        # fresh users borrow and return books with a free copy, one set of users for single
+        # and one for batch requests, so nobody borrows a book twice
+        self.free_owl_ids = [str(owl_id) for owl_id in (
+                             Book.objects.filter(available_copies__gt=0).order_by('owl_id')
+                                         .values_list('owl_id', flat=True)[:1000])]
+        password = make_password(PASSWORD)
+        self.users = LibraryUser.objects.bulk_create(
+                     [LibraryUser(username=f'benchmark{i}', password=password)
+                      for i in range(2 * iterations)])
+        self.iterations = iterations
+
+    def headers(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {create_token(user)}'}
+
+    def free_owl_id(self, i):
+        return self.free_owl_ids[i % len(self.free_owl_ids)]
+
+    def free_owl_ids_batch(self, i):
+        return [self.free_owl_id(i * BATCH_SIZE + j) for j in range(BATCH_SIZE)]
+
+    def batch_user(self, i):
+        return self.users[self.iterations+i]
+
+
+def _get(url, user=None):
+    def request(fixtures, i):
+        headers = {} if user is None else fixtures.headers(getattr(fixtures, user))
+        return fixtures.client.get(url(fixtures) if callable(url) else url, **headers)
+    return request
+
+
+def _borrow(fixtures, i):
+    return fixtures.client.post('/accounts/borrow/', {'owl_id': fixtures.free_owl_id(i)},
+                                content_type='application/json',
+                                **fixtures.headers(fixtures.users[i]))
+
+
+def _return(fixtures, i):
+    return fixtures.client.put('/accounts/return/', {'owl_id': fixtures.free_owl_id(i)},
+                               content_type='application/json',
+                               **fixtures.headers(fixtures.users[i]))
+
+
+def _borrow_batch(fixtures, i):
+    return fixtures.client.post('/accounts/borrow/batch/',
+                                {'owl_ids': fixtures.free_owl_ids_batch(i)},
+                                content_type='application/json',
+                                **fixtures.headers(fixtures.batch_user(i)))
+
+
+def _return_batch(fixtures, i):
+    return fixtures.client.put('/accounts/return/batch/',
+                               {'owl_ids': fixtures.free_owl_ids_batch(i)},
+                               content_type='application/json',
+                               **fixtures.headers(fixtures.batch_user(i)))
+
+
+def _register(fixtures, i):
+    return fixtures.client.post('/accounts/register/',
+                                {'username': f'registered{i}', 'password': PASSWORD},
+                                content_type='application/json')
+
+
+def _token(fixtures, i):
+    return fixtures.client.post('/accounts/token/',
+                                {'username': fixtures.users[i].username,
+                                 'password': PASSWORD},
+                                content_type='application/json')
+
+
+# Groups of steps, the steps of a group are made one after the other in every iteration, e.g.
+# a borrow and the return of the borrowed book
+def get_step_groups():
+    return [
+        [Step('', 'books', _get('/'), 200)],
+        [Step('', 'books page', _get(f'/?page_size={PAGE_SIZE}'), 200)],
+        [Step('', 'books fields', _get('/?fields=owl_id,title'), 200)],
+        [Step('books/available/', 'available books', _get('/books/available/'), 200)],
+        [Step('books/available/', 'available books stream',
+              _get('/books/available/?stream=ndjson'), 200)],
+        [Step('books/author/<name>', 'books by author',
+              _get(lambda fixtures: f'/books/author/{quote(fixtures.author_name)}'), 200)],
+        [Step('books/search/', 'search books',
+              _get(lambda fixtures: f'/books/search/?q={quote(fixtures.search_text)}'), 200)],
+        [Step('accounts/availability/', 'availability batch',
+              _get(lambda fixtures: '/accounts/availability/?owl_ids=' +
+                                    ','.join(fixtures.reader_owl_ids[:BATCH_SIZE]), 'reader'),
+              200)],
+        [Step('accounts/availability/<owl_id>', 'availability',
+              _get(lambda fixtures: f'/accounts/availability/{fixtures.reader_owl_ids[0]}',
+                   'reader'), 200)],
+        [Step('accounts/records/', 'borrow records', _get('/accounts/records/', 'reader'),
+              200)],
+        [Step('accounts/records/', 'borrow records stream',
+              _get('/accounts/records/?stream=ndjson', 'reader'), 200)],
+        [Step('cache/stats/', 'cache stats', _get('/cache/stats/', 'admin'), 200)],
+        [Step('accounts/register/', 'register', _register, 201),
+         Step('accounts/token/', 'token', _token, 200)],
+        [Step('accounts/borrow/', 'borrow', _borrow, 200),
+         Step('accounts/return/', 'return', _return, 200)],
+        [Step('accounts/borrow/batch/', 'borrow batch', _borrow_batch, 200),
+         Step('accounts/return/batch/', 'return batch', _return_batch, 200)],
+    ]
+
+
+def check_every_route_is_measured(step_groups):
+    routes = {str(pattern.pattern) for pattern in urlpatterns}
+    measured_routes = {step.route for steps in step_groups for step in steps}
+    if routes-measured_routes:
+        sys.exit(f'no benchmark step for {sorted(routes-measured_routes)}, add one to '
+                 'get_step_groups()')
+
+
+def _read(response):
+    if response.streaming is True:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+# counts the queries executed on the connection and their time in milliseconds, more
+# precisely than connection.queries, which rounds to milliseconds
+class QueryTimer:
+    def __init__(self):
+        self.queries = 0
+        self.time = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += (time.perf_counter()-start) * 1000
+            self.queries += 1
+
+
+# returns the latency in milliseconds, the number of queries and their time in milliseconds
+def _measure(step, fixtures, i, cached):
+    if cached is False:
+        catalog_cache.invalidate()
+    query_timer = QueryTimer()
+    with connection.execute_wrapper(query_timer):
+        start = time.perf_counter()
+        response = step.request(fixtures, i)
+        content = _read(response)
+        latency = (time.perf_counter()-start) * 1000
+    # batch endpoints answer 200 also when some of the books failed
+    if response.status_code != step.expected_status or b'"success":false' in content:
+        sys.exit(f'{step.name} answered {response.status_code}: {content[:500]}')
+    return latency, query_timer.queries, query_timer.time
+
+
+# returns the peak memory allocated during the request in bytes
+def _measure_memory(step, fixtures, i, cached):
+    if cached is False:
+        catalog_cache.invalidate()
+    tracemalloc.start()
+    try:
+        response = step.request(fixtures, i)
+        _read(response)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_step_group(steps, fixtures, repeat, memory_repeat, cached):
+    samples = {step.name: {'latency': [], 'queries': [], 'sql': [], 'memory': []}
+               for step in steps}
+    for i in range(WARMUP+repeat+memory_repeat):
+        for step in steps:
+            if i < WARMUP+repeat:
+                latency, queries, sql_time = _measure(step, fixtures, i, cached)
+                if i >= WARMUP:
+                    samples[step.name]['latency'].append(latency)
+                    samples[step.name]['queries'].append(queries)
+                    samples[step.name]['sql'].append(sql_time)
+            else:
+                samples[step.name]['memory'].append(_measure_memory(step, fixtures, i,
+                                                                    cached))
+    return [{'endpoint': step.name, 'route': step.route,
+             'latency_ms': summarize(samples[step.name]['latency']),
+             'queries': summarize(samples[step.name]['queries']),
+             'sql_ms': summarize(samples[step.name]['sql']),
+             'peak_memory_kb': max(samples[step.name]['memory'], default=0) / 1024}
+            for step in steps]
+
+
+def format_result(result):
+    latency = result['latency_ms']
+    return (f'  {result["endpoint"]:<24} p50 {latency["p50"]:>9.2f}ms  '
+            f'p95 {latency["p95"]:>9.2f}ms  p99 {latency["p99"]:>9.2f}ms  '
+            f'{result["queries"]["p50"]:>4.0f} queries  '
+            f'sql p50 {result["sql_ms"]["p50"]:>8.2f}ms  '
+            f'peak {result["peak_memory_kb"]:>9.0f}KB')
+
+
+def _get_metadata(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    with connection.cursor() as cursor:
+        cursor.execute('SHOW server_version')
+        postgres_version = cursor.fetchone()[0]
+    return {'created_at': datetime.now(timezone.utc).isoformat(), 'commit': commit,
+            'python': platform.python_version(), 'django': django.get_version(),
+            'postgres': postgres_version, 'seed': args.seed, 'repeat': args.repeat,
+            'memory_repeat': args.memory_repeat, 'cached': args.cached}
+
+
+# Returns descriptions of the results which are more than threshold percent slower at p95,
+# or make more queries, than the result of the same endpoint and scale in baseline
+def find_regressions(results, baseline, threshold):
+    baseline_results = {(result['books'], result['endpoint']): result
+                        for result in baseline['results']}
+    regressions = []
+    for result in results:
+        baseline_result = baseline_results.get((result['books'], result['endpoint']))
+        if baseline_result is None:
+            continue
+        name = f'{result["endpoint"]} at {result["books"]} books'
+        p95 = result['latency_ms']['p95']
+        baseline_p95 = baseline_result['latency_ms']['p95']
+        if p95 > baseline_p95 * (1+threshold / 100):
+            regressions.append(f'{name}: p95 {baseline_p95:.2f}ms -> {p95:.2f}ms')
+        queries = result['queries']['p50']
+        baseline_queries = baseline_result['queries']['p50']
+        if queries > baseline_queries:
+            regressions.append(f'{name}: {baseline_queries:.0f} -> {queries:.0f} queries')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='scales, generate_data writes about 7 rows per book')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--memory-repeat', type=int, default=3)
+    parser.add_argument('--cached', action='store_true',
+                        help='keep the catalog response cache between requests')
+    parser.add_argument('--endpoints', nargs='+',
+                        help='only measure the steps with these names (and their groups)')
+    parser.add_argument('--output', default='endpoints.json')
+    parser.add_argument('--baseline', help='results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=20)
+    args = parser.parse_args()
+
+    step_groups = get_step_groups()
+    check_every_route_is_measured(step_groups)
+    if args.endpoints is not None:
+        step_groups = [steps for steps in step_groups
+                       if any(step.name in args.endpoints for step in steps)]
+    iterations = WARMUP+args.repeat+args.memory_repeat
+
+    datasets = {}
+    results = []
+    with benchmark_database(), override_settings(ALLOWED_HOSTS=['testserver']):
+        metadata = _get_metadata(args)
+        for number_of_books in sorted(args.books):
+            call_command('flush', interactive=False, verbosity=0)
+            start = time.perf_counter()
+            call_command('generate_data', books=number_of_books, seed=args.seed,
+                         verbosity=0, stdout=io.StringIO())
+            datasets[number_of_books] = {model.__name__: model.objects.count()
+                                         for model in MODELS}
+            print(f'{number_of_books} books, ' +
+                  ', '.join(f'{count} {name}' for name, count
+                            in datasets[number_of_books].items()) +
+                  f' rows, generated in {time.perf_counter()-start:.1f}s')
+            fixtures = Fixtures(iterations)
+            for steps in step_groups:
+                for result in run_step_group(steps, fixtures, args.repeat,
+                                             args.memory_repeat, args.cached):
+                    print(format_result(result))
+                    results.append({'books': number_of_books, **result})
+
+    with open(args.output, 'w') as file:
+        json.dump({'metadata': metadata, 'datasets': datasets, 'results': results}, file,
+                  indent=2)
+    print(f'results written to {args.output}')
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = find_regressions(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f'regression {regression}')
+        if len(regressions) > 0:
+            sys.exit(1)
+        print(f'no regressions against {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
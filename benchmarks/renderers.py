@@ -0,0 +1,80 @@
+"""JSONRenderer vs FastJSONRenderer on large catalog and borrow record responses.
+
+Builds the data of N books and N borrow records in memory (as serialize_book_rows and
+serialize_borrow_record_rows return it, so with native UUIDs) and, for each renderer, times
+rendering it and measures the peak of python allocations (tracemalloc) while rendering.
+No database is needed. Without orjson installed both renderers are the same code.
+
+Usage (from the project root):
+    python -m benchmarks.renderers --rows 10000 100000 --repeat 5
+"""
+import argparse
+import random
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from benchmarks.utils import format_summary, setup_django, summarize, time_calls
+
+setup_django()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from base_app.words import random_word  # noqa: E402
+from rest_api.renderers import FastJSONRenderer, orjson  # noqa: E402
+from rest_api.serializers import (serialize_book_rows,  # noqa: E402
+                                  serialize_borrow_record_rows)
+
+
+def _make_data(number_of_rows, rng):
+    def uuid4():
+        return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+    book_rows = [(uuid4(), uuid4(), f'{random_word(rng)} {random_word(rng)}', i % 2 == 0,
+                  ' '.join(random_word(rng) for _ in range(4)))
+                 for i in range(number_of_rows)]
+    borrow_date = datetime(2023, 1, 1, tzinfo=dt_timezone.utc)
+    borrow_record_rows = [(uuid4(), uuid4(), owl_id, author_id, name, is_popular, title,
+                           'HARDCOVER', borrow_date+timedelta(seconds=i),
+                           borrow_date+timedelta(days=14, seconds=i), i % 2 == 0,
+                           borrow_date+timedelta(days=90, seconds=i), 1)
+                          for i, (owl_id, author_id, name, is_popular, title)
+                          in enumerate(book_rows)]
+    return {'books': serialize_book_rows(book_rows),
+            'borrow records': serialize_borrow_record_rows(borrow_record_rows)}
+
+
+def _peak_allocation(func):
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if orjson is None:
+        print('orjson is not installed, FastJSONRenderer falls back to JSONRenderer')
+    rng = random.Random(0)
+    for number_of_rows in sorted(args.rows):
+        for name, data in _make_data(number_of_rows, rng).items():
+            assert JSONRenderer().render(data) == FastJSONRenderer().render(data)
+            print(f'{name}, {number_of_rows} rows')
+            for renderer in [JSONRenderer(), FastJSONRenderer()]:
+                def render():
+                    return renderer.render(data)
+
+                label = f'  {type(renderer).__name__}'
+                peak = _peak_allocation(render)
+                print(f'{format_summary(label, summarize(time_calls(render, args.repeat)))}  '
+                      f'peak {peak / 2**20:>7.1f}MiB')
+
+
+if __name__ == '__main__':
+    main()
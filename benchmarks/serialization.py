@@ -0,0 +1,92 @@
+"""ModelSerializer vs the values_list() row serializers of the list endpoints.
+
+Fills a throwaway database with N books and N borrow records of one user and times, for
+each N, serializing already fetched objects/rows and the whole list response (query,
+serialization and json rendering) with BookSerializer/BorrowRecordSerializer and with
+serialize_book_rows/serialize_borrow_record_rows.
+
+Usage (from the project root):
+    python -m benchmarks.serialization --rows 10000 100000 --repeat 5
+"""
+import argparse
+
+from benchmarks.utils import (benchmark_database, format_summary, setup_django, summarize,
+                              time_calls)
+
+setup_django()
+
+from django.utils import timezone  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from base_app.models import Author, Book, BookCopy, BorrowRecord, LibraryUser  # noqa: E402
+from rest_api.serializers import (BookSerializer, BorrowRecordSerializer,  # noqa: E402
+                                  get_book_rows, get_borrow_record_rows, serialize_book_rows,
+                                  serialize_borrow_record_rows)
+
+BATCH_SIZE = 10000
+
+
+def _populate(number_of_rows, library_user):
+    existing_rows = Book.objects.count()
+    now = timezone.now()
+    for start in range(existing_rows, number_of_rows, BATCH_SIZE):
+        indexes = range(start, min(start+BATCH_SIZE, number_of_rows))
+        authors = Author.objects.bulk_create([Author(name=f'Author {i}', is_popular=i % 2 == 0)
+                                              for i in indexes])
+        books = Book.objects.bulk_create([Book(title=f'Book {i}', author=author)
+                                          for i, author in zip(indexes, authors)])
+        book_copies = BookCopy.objects.bulk_create([
+                      BookCopy(book=book, book_copy_type=BookCopy.BOOK_COPY_TYPE.PAPERBACK)
+                      for book in books])
+        BorrowRecord.objects.bulk_create([
+            BorrowRecord(borrow_date=now, return_date=now, is_returned=True,
+                         book_copy=book_copy, library_user=library_user)
+            for book_copy in book_copies])
+
+
+def _compare(name, number_of_rows, queryset, serializer_class, get_rows, serialize_rows,
+             repeat):
+    renderer = JSONRenderer()
+    instances = list(queryset)
+    rows = list(get_rows(queryset))
+    assert (renderer.render(serializer_class(instances, many=True).data) ==
+            renderer.render(serialize_rows(rows)))
+
+    cases = {
+        f'{serializer_class.__name__}, serialize only':
+            lambda: serializer_class(instances, many=True).data,
+        f'{serialize_rows.__name__}, serialize only':
+            lambda: serialize_rows(rows),
+        f'{serializer_class.__name__}, query+render':
+            lambda: renderer.render(serializer_class(queryset.all(), many=True).data),
+        f'{serialize_rows.__name__}, query+render':
+            lambda: renderer.render(serialize_rows(get_rows(queryset))),
+    }
+    print(f'{name}, {number_of_rows} rows')
+    for case, func in cases.items():
+        print(format_summary(f'  {case}', summarize(time_calls(func, repeat))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        library_user = LibraryUser.objects.create(username='benchmark', password='pass')
+        for number_of_rows in sorted(args.rows):
+            _populate(number_of_rows, library_user)
+            books = Book.objects.select_related('author').order_by('title')
+            _compare('books', number_of_rows, books, BookSerializer, get_book_rows,
+                     serialize_book_rows, args.repeat)
+            borrow_records = BorrowRecord.objects.filter(library_user=library_user) \
+                                                 .select_related('book_copy__book__author') \
+                                                 .order_by('borrow_record_id')
+            _compare('borrow records', number_of_rows, borrow_records, BorrowRecordSerializer,
+                     get_borrow_record_rows, serialize_borrow_record_rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
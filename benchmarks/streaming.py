@@ -0,0 +1,67 @@
+"""Peak memory of the full catalog response with and without ?stream.
+
+Fills a throwaway database with books and measures the peak of python allocations
+(tracemalloc) while GET / is built and rendered, once as a regular list response and once
+as a json and ndjson stream. The streamed peak should not grow with the number of books.
+
+Usage (from the project root):
+    python -m benchmarks.streaming --books 10000 100000
+"""
+import argparse
+import tracemalloc
+
+from benchmarks.utils import benchmark_database, setup_django
+
+setup_django()
+
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from base_app.models import Author, Book  # noqa: E402
+from rest_api import views  # noqa: E402
+from rest_api.cache import catalog_cache  # noqa: E402
+
+BATCH_SIZE = 10000
+
+
+def _populate(number_of_books):
+    existing_books = Book.objects.count()
+    for start in range(existing_books, number_of_books, BATCH_SIZE):
+        end = min(start+BATCH_SIZE, number_of_books)
+        authors = Author.objects.bulk_create([Author(name=f'Author {i}', is_popular=False)
+                                              for i in range(start, end)])
+        Book.objects.bulk_create([Book(title=f'Book {i}', author=author)
+                                  for i, author in zip(range(start, end), authors)])
+
+
+def _measure(url):
+    catalog_cache.invalidate()
+    request = APIRequestFactory().get(url, HTTP_ACCEPT='application/json',
+                                      SERVER_NAME='localhost')
+    tracemalloc.start()
+    response = views.get_all_books_api(request)
+    if response.streaming is True:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.render().content)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    with benchmark_database():
+        for number_of_books in sorted(args.books):
+            _populate(number_of_books)
+            for url in ['/', '/?stream=1', '/?stream=ndjson']:
+                size, peak = _measure(url)
+                print(f'{number_of_books:>8} books  {url:<16} {size / 2**20:>8.1f}MiB body  '
+                      f'peak {peak / 2**20:>8.1f}MiB')
+
+
+if __name__ == '__main__':
+    main()
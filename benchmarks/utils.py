@@ -0,0 +1,62 @@
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import django
+
+# benchmarks are run as `python -m benchmarks.<name>` from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'owl_library.settings')
+    django.setup()
+
+
+# creates (and afterwards drops) a migrated throwaway database the same way the test runner
+# does, so benchmarks never touch the development database. It is named benchmark_<name>
+# so a benchmark and the test suite can run at the same time
+@contextmanager
+def benchmark_database(keepdb=False):
+    from django.db import connection
+    from django.test.utils import setup_databases, teardown_databases
+    connection.settings_dict['TEST']['NAME'] = f'benchmark_{connection.settings_dict["NAME"]}'
+    old_config = setup_databases(verbosity=0, interactive=False, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        if keepdb is False:
+            teardown_databases(old_config, verbosity=0)
+
+
+# returns wall clock duration of every call in milliseconds
+def time_calls(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter()-start) * 1000)
+    return samples
+
+
+def percentile(samples, percent):
+    ordered = sorted(samples)
+    index = min(len(ordered)-1, max(0, round(percent / 100 * (len(ordered)-1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+        'mean': statistics.fmean(samples),
+    }
+
+
+def format_summary(name, summary, unit='ms'):
+    return (f'{name:<50} p50 {summary["p50"]:>9.3f}{unit}  p95 {summary["p95"]:>9.3f}{unit}  '
+            f'p99 {summary["p99"]:>9.3f}{unit}')
@@ -0,0 +1,114 @@
+"""Insert throughput and index size of uuid4 vs uuid7 (time-ordered) primary keys.
+
+Creates one table per key generator in a throwaway database, shaped like BorrowRecord (uuid
+primary key, two dates, a flag, a copy and a user id), and fills both with N rows in batches
+sent with COPY. Keys are generated before each batch is timed, so the numbers are about the
+database. Reported are the rows per second of every tenth of the table, which shows how
+random keys slow down once the primary key index no longer fits in shared_buffers, and the
+sizes of table and primary key index at the end.
+
+Random keys become slower than ordered ones only when the index is much larger than
+shared_buffers, so run it with tens of millions of rows (the uuid4 index is about 400MB at
+10M rows), or lower shared_buffers of the benchmark server.
+
+Usage (from the project root):
+    python -m benchmarks.uuid_keys --rows 20000000
+"""
+import argparse
+import io
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.utils import benchmark_database, setup_django
+
+setup_django()
+
+from django.db import connection  # noqa: E402
+
+from base_app.models import uuid7  # noqa: E402
+
+BATCH_SIZE = 50000
+REPORTS = 10
+
+
+def _create_table(table):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+        cursor.execute(f'CREATE TABLE {table} (id uuid PRIMARY KEY, '
+                       'borrow_date timestamptz NOT NULL, return_date timestamptz NOT NULL, '
+                       'is_returned boolean NOT NULL, book_copy_id uuid NOT NULL, '
+                       'library_user_id bigint NOT NULL)')
+
+
+def _batch(generate_key, size, rng):
+    borrow_date = datetime.now(timezone.utc)
+    return_date = (borrow_date+timedelta(days=14)).isoformat()
+    borrow_date = borrow_date.isoformat()
+    rows = io.StringIO()
+    for _ in range(size):
+        rows.write(f'{generate_key()}\t{borrow_date}\t{return_date}\tf\t{uuid.uuid4()}\t'
+                   f'{rng.randrange(1, 100000)}\n')
+    rows.seek(0)
+    return rows
+
+
+# returns the rows per second of every tenth of the table
+def _fill_table(table, generate_key, number_of_rows, rng):
+    report_size = max(BATCH_SIZE, number_of_rows // REPORTS)
+    rates = []
+    inserted_rows = 0
+    seconds = 0
+    while inserted_rows < number_of_rows:
+        size = min(BATCH_SIZE, number_of_rows-inserted_rows)
+        rows = _batch(generate_key, size, rng)
+        start = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f'COPY {table} FROM STDIN', rows)
+        seconds += time.perf_counter()-start
+        inserted_rows += size
+        if inserted_rows % report_size < BATCH_SIZE or inserted_rows == number_of_rows:
+            rates.append((inserted_rows, size / (time.perf_counter()-start)))
+    return number_of_rows / seconds, rates
+
+
+def _sizes(table):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT pg_relation_size('{table}'), "
+                       f"pg_relation_size('{table}_pkey')")
+        return cursor.fetchone()
+
+
+def _megabytes(size):
+    return f'{size / 1024 / 1024:>9.1f}MB'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    # the database runs in autocommit mode, every batch is a transaction of its own
+    with benchmark_database():
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW shared_buffers')
+            print(f'{args.rows} rows, shared_buffers {cursor.fetchone()[0]}')
+        for name, generate_key in [('uuid4', uuid.uuid4), ('uuid7', uuid7)]:
+            table = f'benchmark_{name}_keys'
+            _create_table(table)
+            rows_per_second, rates = _fill_table(table, generate_key, args.rows,
+                                                 random.Random(args.seed))
+            table_size, index_size = _sizes(table)
+            print(f'{name}: {rows_per_second:>10.0f} rows/s  table {_megabytes(table_size)}  '
+                  f'primary key index {_megabytes(index_size)}')
+            print('  rows/s of the batch after ' +
+                  ', '.join(f'{inserted_rows}: {rate:.0f}' for inserted_rows, rate in rates))
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE {table}')
+
+
+if __name__ == '__main__':
+    main()
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'owl_library.settings')
+# serve the read endpoints with async views, see API_SERVER in settings
+os.environ.setdefault('API_SERVER', 'asgi')
 
 application = get_asgi_application()
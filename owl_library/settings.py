@@ -44,9 +44,11 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'base_app',
+    'rest_api',
 ]
 
 MIDDLEWARE = [
@@ -95,6 +97,17 @@ except (FileNotFoundError, KeyError):
     OWL_LIBRARY_DATABASE_PASS = os.environ.get('DATABASE_PASS')
     OWL_LIBRARY_HOST = os.environ.get('DATABASE_HOST')
 
+# development (default) or production, see REST_FRAMEWORK below
+API_PROFILE = os.environ.get('API_PROFILE', 'development')
+
+# wsgi (default) or asgi, set by owl_library/asgi.py. With asgi the read endpoints are served
+# by the async views of rest_api/async_views.py
+API_SERVER = os.environ.get('API_SERVER', 'wsgi')
+
+# most requests an ASGI worker runs against the database at once, each with a connection of
+# its own. Keep workers * ASYNC_DATABASE_CONNECTIONS below max_connections of postgres
+ASYNC_DATABASE_CONNECTIONS = int(os.environ.get('ASYNC_DATABASE_CONNECTIONS', 16))
+
 
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
@@ -106,6 +119,11 @@ DATABASES = {
         'PASSWORD': OWL_LIBRARY_DATABASE_PASS,
         'HOST': OWL_LIBRARY_HOST,
         'PORT': 5432,
+        'OPTIONS': {
+            # author search treats names with a trigram word similarity of at least 0.4
+            # as a match (pg_trgm default is 0.6), this lets single typos through
+            'options': '-c pg_trgm.word_similarity_threshold=0.4',
+        },
     }
 }
 
@@ -153,12 +171,74 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'base_app.LibraryUser'
 
+# cache of serialized catalog responses, see rest_api/cache.py. Timeouts are in seconds.
+# Cached responses are keyed by the catalog version in postgres, so a write in any process
+# invalidates them in every process, also without a shared tier. Set SHARED_CACHE to an
+# alias of CACHES (e.g. a redis or memcached backend) to share the cached responses
+CATALOG_CACHE = {
+    'LOCAL_MAX_ENTRIES': 1024,
+    'LOCAL_TIMEOUT': 60,
+    'SHARED_CACHE': None,
+    'SHARED_TIMEOUT': 300,
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # shared by all processes through postgres, the table is created by migration
+    # 0019_idempotency_cache_table of base_app
+    'idempotency': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'base_app_idempotency_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# responses kept to answer borrow and return requests retried with the same Idempotency-Key
+# header, see rest_api/idempotency.py. SHARED_CACHE names the cache in CACHES they are kept
+# in, it has to be shared by all processes (a retry may reach another worker). None keeps
+# them in the memory of each process, which only dedupes retries with a single process
+IDEMPOTENCY = {
+    'MAX_ENTRIES': 10000,
+    'TIMEOUT': 24*60*60,
+    'SHARED_CACHE': 'idempotency',
+    'IN_PROGRESS_TIMEOUT': 60,
+}
+
+# seconds a token issued by /accounts/token/ stays valid, see rest_api/authentication.py
+AUTH_TOKEN_MAX_AGE = 24*60*60
+
 REST_FRAMEWORK = {
+    # signed tokens from /accounts/token/ are checked without a database query, sessions
+    # serve the browsable api
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_api.authentication.SignedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
         'rest_framework.permissions.IsAuthenticatedOrReadOnly'
     ],
+    # FastJSONRenderer/FastJSONParser use orjson if it is installed (pip install orjson) and
+    # behave like JSONRenderer/JSONParser otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
+
+# API_PROFILE=production serves and accepts json only: no browsable api, no form parsers and
+# no matching of the Accept header against renderers
+if API_PROFILE == 'production':
+    REST_FRAMEWORK.update({
+        'DEFAULT_RENDERER_CLASSES': ['rest_api.renderers.FastJSONRenderer'],
+        'DEFAULT_PARSER_CLASSES': ['rest_api.parsers.FastJSONParser'],
+        'DEFAULT_CONTENT_NEGOTIATION_CLASS':
+            'rest_api.negotiation.FirstRendererContentNegotiation',
+    })
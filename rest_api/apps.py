@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class RestApiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'rest_api'
+
+    def ready(self):
+        # connect catalog cache invalidation, also in processes which never load the views
+        from . import cache  # noqa: F401
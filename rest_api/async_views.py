@@ -0,0 +1,226 @@
+import asyncio
+import functools
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework.exceptions import (APIException, AuthenticationFailed, MethodNotAllowed,
+                                       NotAuthenticated)
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+import rest_api.services as services
+from base_app.models import aget_catalog_version
+
+from . import views
+from .cache import catalog_cache
+from .pagination import BookKeysetPagination
+from .renderers import FastJSONRenderer
+from .streaming import STREAM_QUERY_PARAM
+from .views import _get_book_row_functions, _get_borrow_record_row_functions
+
+# Async versions of the read endpoints of views.py, served instead of them with
+# API_SERVER=asgi (see urls.py). They answer json only. Cursor pages and streams are left to
+# the sync views, run in a thread.
+
+
+def _json_response(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), status=status,
+                        content_type=FastJSONRenderer.media_type)
+
+
+# same status codes and bodies as APIView.handle_exception, None for other exceptions
+def _exception_response(request, exc):
+    if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+        auth_header = None
+        if len(request.authenticators) > 0:
+            auth_header = request.authenticators[0].authenticate_header(request)
+        if auth_header is not None:
+            exc.auth_header = auth_header
+        else:
+            exc.status_code = 403
+    response = exception_handler(exc, {'request': request})
+    if response is None:
+        return None
+    json_response = _json_response(response.data, status=response.status_code)
+    for header in ['WWW-Authenticate', 'Retry-After']:
+        if header in response:
+            json_response[header] = response[header]
+    return json_response
+
+
+# Django runs every ASGI request in its own thread sensitive context, so each request being
+# served opens its own database connection and, left to request_finished, keeps it until the
+# response has been sent to the client. Requests therefore take one of
+# ASYNC_DATABASE_CONNECTIONS slots (per event loop) while they run and release their
+# connection before the response is sent, so that slow clients do not hold connections and a
+# worker stays below the max_connections of postgres however many clients it holds
+_database_slots = weakref.WeakKeyDictionary()
+
+
+def _get_database_slots():
+    loop = asyncio.get_running_loop()
+    if loop not in _database_slots:
+        _database_slots[loop] = asyncio.Semaphore(settings.ASYNC_DATABASE_CONNECTIONS)
+    return _database_slots[loop]
+
+
+# what request_finished does, except for connections in a transaction (i.e. in tests)
+def _release_database_connections():
+    for connection in connections.all(initialized_only=True):
+        if connection.in_atomic_block is False:
+            connection.close_if_unusable_or_obsolete()
+
+
+# async counterpart of @api_view (with @permission_classes([IsAuthenticated]) when
+# authenticated is True). The view gets a DRF Request, authenticated with the
+# DEFAULT_AUTHENTICATION_CLASSES in a thread since authenticators query the database
+def async_api_view(http_method_names, authenticated=False):
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            request = Request(request, authenticators=[
+                      authenticator() for authenticator
+                      in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+            try:
+                if request.method not in http_method_names:
+                    raise MethodNotAllowed(request.method)
+                async with _get_database_slots():
+                    try:
+                        if authenticated is True:
+                            user = await sync_to_async(lambda: request.user)()
+                            if user.is_authenticated is False:
+                                raise NotAuthenticated()
+                        return await view(request, *args, **kwargs)
+                    finally:
+                        await sync_to_async(_release_database_connections)()
+            except Exception as exc:
+                response = _exception_response(request, exc)
+                if response is None:
+                    raise
+                return response
+        return wrapper
+    return decorator
+
+
+def _is_paginated_or_streamed(request):
+    return (BookKeysetPagination().is_requested(request) or
+            STREAM_QUERY_PARAM in request.query_params)
+
+
+# Runs a view of views.py in a thread and renders its response there. Django 4.1 iterates
+# streaming responses on the event loop, where the server-side cursor of a stream cannot be
+# read, so a stream is read to the end in the thread as well
+async def _call_sync_view(view, request, *args, **kwargs):
+    def get_response():
+        response = view(request._request, *args, **kwargs)
+        if response.streaming is False:
+            return response.render() if hasattr(response, 'render') else response
+        try:
+            return HttpResponse(b''.join(response), status=response.status_code,
+                                content_type=response['Content-Type'])
+        finally:
+            response.close()
+    return await sync_to_async(get_response)()
+
+
+# the ETags are those of catalog_etag and records_etag for json, so clients can switch
+# between the sync and async views
+def _conditional_response(request, etag):
+    response = get_conditional_response(request._request, etag=etag)
+    if response is not None:
+        response['ETag'] = etag
+    return response
+
+
+async def _book_list_response(request, books):
+    # the body is cached under the version of the ETag, see get_request_catalog_version
+    catalog_version = await aget_catalog_version()
+    etag = f'"catalog-{catalog_version}-json"'
+    response = _conditional_response(request, etag)
+    if response is not None:
+        return response
+    versioned_key, data = await catalog_cache.aget(request.build_absolute_uri(),
+                                                   catalog_version)
+    cache_status = 'HIT'
+    if data is None:
+        get_rows, serialize_rows = _get_book_row_functions(request)
+        data = serialize_rows([row async for row in get_rows(books)])
+        await catalog_cache.aset(versioned_key, data)
+        cache_status = 'MISS'
+    response = _json_response(data)
+    response['ETag'] = etag
+    response['X-Cache'] = cache_status
+    return response
+
+
+@async_api_view(['GET'])
+async def get_all_books_api(request):
+    if _is_paginated_or_streamed(request):
+        return await _call_sync_view(views.get_all_books_api, request)
+    return await _book_list_response(request, services.get_all_books())
+
+
+@async_api_view(['GET'])
+async def get_all_available_books_api(request):
+    if _is_paginated_or_streamed(request):
+        return await _call_sync_view(views.get_all_available_books_api, request)
+    return await _book_list_response(request, services.get_all_available_books())
+
+
+@async_api_view(['GET'])
+async def get_all_books_by_author_name_api(request, name):
+    books = services.get_all_books_by_similar_author_name(name)
+    return await _book_list_response(request, books)
+
+
+@async_api_view(['GET'])
+async def search_books_api(request):
+    search_text = request.query_params.get('q', '')
+    books = services.search_books(search_text)
+    return await _book_list_response(request, books)
+
+
+@async_api_view(['GET'], authenticated=True)
+async def get_book_availability_api(request, owl_id):
+    user_id = request.user.pk
+    try:
+        info = await services.aget_next_borrow_date(owl_id=owl_id, user_id=user_id)
+        return _json_response(info)
+    except Exception as e:
+        raise APIException(detail=e)
+
+
+# ?owl_ids=<owl_id>,<owl_id>,...
+@async_api_view(['GET'], authenticated=True)
+async def get_books_availability_api(request):
+    user_id = request.user.pk
+    owl_ids = [owl_id for owl_id in request.query_params.get('owl_ids', '').split(',')
+               if owl_id != '']
+    try:
+        info = await services.aget_next_borrow_dates(owl_ids=owl_ids, user_id=user_id)
+        return _json_response(info)
+    except Exception as e:
+        raise APIException(detail=e)
+
+
+@async_api_view(['GET'], authenticated=True)
+async def get_my_borrow_records_api(request):
+    if STREAM_QUERY_PARAM in request.query_params:
+        return await _call_sync_view(views.get_my_borrow_records_api, request)
+    user = request.user
+    # a token user (rest_api/authentication.py) loads records_version on first access
+    records_version = await sync_to_async(lambda: user.records_version)()
+    etag = f'"records-{user.pk}-{records_version}-{await aget_catalog_version()}-json"'
+    response = _conditional_response(request, etag)
+    if response is not None:
+        return response
+    get_rows, serialize_rows = _get_borrow_record_row_functions(request)
+    borrow_records = services.get_my_borrow_records(user_id=user.pk)
+    response = _json_response(serialize_rows([row async for row in get_rows(borrow_records)]))
+    response['ETag'] = etag
+    return response
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core import signing
+from django.db import router
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from base_app.models import LibraryUser
+
+TOKEN_KEYWORD = 'Bearer'
+TOKEN_SALT = 'rest_api.authentication.SignedTokenAuthentication'
+DEFAULT_AUTH_TOKEN_MAX_AGE = 24*60*60
+
+
+def get_token_max_age():
+    return getattr(settings, 'AUTH_TOKEN_MAX_AGE', DEFAULT_AUTH_TOKEN_MAX_AGE)
+
+
+# the token carries the user id and the time it was issued, signed with SECRET_KEY
+def create_token(user):
+    return signing.dumps({'user_id': user.pk}, salt=TOKEN_SALT, compress=False)
+
+
+# Returns the LibraryUser of a valid token without querying the database: only its pk is
+# loaded, other fields are deferred and read from the database on first access. Raises
+# AuthenticationFailed for tampered and expired tokens
+def get_token_user(token):
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT, max_age=get_token_max_age())
+    except signing.SignatureExpired:
+        raise AuthenticationFailed('Token has expired')
+    except signing.BadSignature:
+        raise AuthenticationFailed('Invalid token')
+    return LibraryUser.from_db(router.db_for_read(LibraryUser), ['id'], [payload['user_id']])
+
+
+# Stateless authentication with "Authorization: Bearer <token>" headers, tokens are issued
+# by /accounts/token/. Unlike SessionAuthentication no session or user row is read, the
+# services get the user id from the token. A token stays valid until it expires
+# (AUTH_TOKEN_MAX_AGE seconds), even if the user changes password or is deactivated
+class SignedTokenAuthentication(BaseAuthentication):
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if len(auth) == 0 or auth[0].lower() != TOKEN_KEYWORD.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid token header, expected "Bearer <token>"')
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed('Invalid token')
+        return (get_token_user(token), token)
+
+    def authenticate_header(self, request):
+        return f'{TOKEN_KEYWORD} realm="api"'
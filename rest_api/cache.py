@@ -0,0 +1,222 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.views.decorators.http import condition
+from rest_framework.response import Response
+
+from base_app.models import catalog_changed, get_catalog_version
+
+DEFAULT_CATALOG_CACHE_SETTINGS = {
+    'LOCAL_MAX_ENTRIES': 1024,
+    'LOCAL_TIMEOUT': 60,
+    'SHARED_CACHE': None,
+    'SHARED_TIMEOUT': 300,
+}
+
+
+# in-process tier, least recently used entries are evicted once max_entries is reached and
+# every entry expires timeout seconds after it was stored
+class LocalCache:
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    # to be called with self._lock held
+    def _set(self, key, value):
+        self._entries[key] = (time.monotonic()+self.timeout, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def set(self, key, value):
+        with self._lock:
+            self._set(key, value)
+
+    # sets key only if it has no live entry, returns whether it did
+    def add(self, key, value):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return False
+            self._set(key, value)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Two tier cache of serialized catalog responses. Lookups go to the local tier first, then
+# to the shared tier (any django cache backend configured in CACHES, e.g. redis or
+# memcached) if one is configured. Keys contain the catalog version of the request
+# (get_request_catalog_version), the postgres sequence which the ETags are built from as well,
+# so a cached body is always of the version of the ETag it is sent with. A write in any
+# process bumps the sequence, which invalidates the cached responses of every process.
+class CatalogCache:
+    def __init__(self, local_max_entries, local_timeout, shared_cache=None,
+                 shared_timeout=None):
+        self.local = LocalCache(max_entries=local_max_entries, timeout=local_timeout)
+        self.shared_cache = shared_cache
+        self.shared_timeout = shared_timeout
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @classmethod
+    def from_settings(cls):
+        config = {**DEFAULT_CATALOG_CACHE_SETTINGS, **getattr(settings, 'CATALOG_CACHE', {})}
+        shared_cache = None
+        if config['SHARED_CACHE'] is not None:
+            shared_cache = caches[config['SHARED_CACHE']]
+        return cls(local_max_entries=config['LOCAL_MAX_ENTRIES'],
+                   local_timeout=config['LOCAL_TIMEOUT'], shared_cache=shared_cache,
+                   shared_timeout=config['SHARED_TIMEOUT'])
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0,
+                           'invalidations': 0}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['hits'] = stats['local_hits'] + stats['shared_hits']
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups > 0 else 0.0
+        stats['local_entries'] = len(self.local)
+        return stats
+
+    def _make_key(self, key, version):
+        return f'catalog_cache:{version}:{key}'
+
+    # returns the cached value of key at the catalog version (None on a miss) and the
+    # versioned key to set the value under. The version is read before the value is
+    # computed, so a value computed from data that changed meanwhile is stored under an
+    # outdated version and never read
+    def get(self, key, version):
+        versioned_key = self._make_key(key, version)
+        value = self.local.get(versioned_key)
+        if value is not None:
+            self._count('local_hits')
+            return versioned_key, value
+        if self.shared_cache is not None:
+            value = self.shared_cache.get(versioned_key)
+            if value is not None:
+                self.local.set(versioned_key, value)
+                self._count('shared_hits')
+                return versioned_key, value
+        self._count('misses')
+        return versioned_key, None
+
+    def set(self, versioned_key, value):
+        self.local.set(versioned_key, value)
+        if self.shared_cache is not None:
+            self.shared_cache.set(versioned_key, value, timeout=self.shared_timeout)
+
+    # for async views, a shared tier is a blocking network call and is queried in a thread
+    async def aget(self, key, version):
+        if self.shared_cache is None:
+            return self.get(key, version)
+        return await sync_to_async(self.get)(key, version)
+
+    async def aset(self, versioned_key, value):
+        if self.shared_cache is None:
+            return self.set(versioned_key, value)
+        return await sync_to_async(self.set)(versioned_key, value)
+
+    # entries of older versions are never read again once the catalog version was bumped,
+    # this only frees the local tier early. Shared entries are evicted by their timeout
+    def invalidate(self):
+        self.local.clear()
+        self._count('invalidations')
+
+
+catalog_cache = CatalogCache.from_settings()
+
+
+def invalidate_catalog_cache(sender, **kwargs):
+    catalog_cache.invalidate()
+
+
+catalog_changed.connect(invalidate_catalog_cache, dispatch_uid='invalidate_catalog_cache')
+
+
+# The catalog version a request is answered for, read once per request, so that its ETag
+# and the cached body it is answered with are of the same version
+def get_request_catalog_version(request):
+    version = getattr(request, 'catalog_version', None)
+    if version is None:
+        version = get_catalog_version()
+        request.catalog_version = version
+    return version
+
+
+# caches the data of successful responses of a catalog view by absolute url (query string
+# included), to be placed below @api_view. Responses carry an X-Cache: HIT/MISS header
+def cache_catalog_response(view):
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.build_absolute_uri()
+        versioned_key, data = catalog_cache.get(key, get_request_catalog_version(request))
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        response = view(request, *args, **kwargs)
+        # streamed responses are generated while they are sent, there is nothing to cache
+        if response.status_code == 200 and response.streaming is False:
+            catalog_cache.set(versioned_key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+    return wrapper
+
+
+# ETags follow the catalog version, and for borrow records also the records version of the
+# user (records nest books, so they follow the catalog version as well). The renderer
+# format is part of the ETag because json and the browsable api are served on the same url
+def _catalog_etag(request, *args, **kwargs):
+    return (f'"catalog-{get_request_catalog_version(request)}-'
+            f'{request.accepted_renderer.format}"')
+
+
+def _records_etag(request, *args, **kwargs):
+    user = request.user
+    catalog_version = get_request_catalog_version(request)
+    return (f'"records-{user.pk}-{user.records_version}-{catalog_version}-'
+            f'{request.accepted_renderer.format}"')
+
+
+# conditional GET for catalog and borrow record views, to be placed below @api_view and
+# @permission_classes. A request whose If-None-Match matches is answered with 304 Not
+# Modified after the version lookup, the view (list query and serializers) never runs
+catalog_etag = condition(etag_func=_catalog_etag)
+records_etag = condition(etag_func=_records_etag)
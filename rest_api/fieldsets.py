@@ -0,0 +1,119 @@
+import operator
+
+from rest_framework.exceptions import ValidationError
+
+FIELDS_QUERY_PARAM = 'fields'
+EXPAND_QUERY_PARAM = 'expand'
+
+
+# a related object in a shape, rendered as the value of lookup (the foreign key, so the id
+# of the related row) unless it is expanded into an object of the related shape
+class Relation:
+    def __init__(self, lookup, shape):
+        self.lookup = lookup
+        self.shape = shape
+
+
+# Sparse fieldset of a shape. A shape maps the keys of a json object, in order, to a
+# lookup, a (lookup, to_representation) pair or a Relation. Only the lookups of selected
+# fields go into the values_list() query, so other columns are not read and relations that
+# are not expanded are not joined. extra_lookups are fetched without being rendered.
+class Fieldset:
+    def __init__(self, shape, fields=None, expand=frozenset(), extra_lookups=()):
+        self.lookups = []
+        self._serialize_row = self._compile(shape, fields, expand, '', '')
+        for lookup in extra_lookups:
+            self._add_lookup(lookup)
+
+    def _add_lookup(self, lookup):
+        if lookup not in self.lookups:
+            self.lookups.append(lookup)
+        return self.lookups.index(lookup)
+
+    # returns a function turning a row into the json object of shape
+    def _compile(self, shape, fields, expand, lookup_prefix, path_prefix):
+        getters = []
+        for key, field in shape.items():
+            if fields is not None and key not in fields:
+                continue
+            to_representation = None
+            if isinstance(field, Relation):
+                path = f'{path_prefix}{key}'
+                if path in expand:
+                    getters.append((key, self._compile(field.shape, None, expand,
+                                                       f'{lookup_prefix}{field.lookup}__',
+                                                       f'{path}.')))
+                    continue
+                lookup = field.lookup
+            elif isinstance(field, tuple):
+                lookup, to_representation = field
+            else:
+                lookup = field
+            get = operator.itemgetter(self._add_lookup(f'{lookup_prefix}{lookup}'))
+            if to_representation is not None:
+                get = _compose(to_representation, get)
+            getters.append((key, get))
+
+        def serialize_row(row):
+            return {key: get(row) for key, get in getters}
+        return serialize_row
+
+    # named=True lets BookKeysetPagination read title and owl_id of a row
+    def get_rows(self, queryset):
+        return queryset.values_list(*self.lookups, named=True)
+
+    def serialize_rows(self, rows):
+        serialize_row = self._serialize_row
+        return [serialize_row(row) for row in rows]
+
+
+def _compose(outer, inner):
+    return lambda row: outer(inner(row))
+
+
+def _get_names(request, query_param):
+    value = request.query_params.get(query_param)
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip() != '']
+
+
+# every relation path of shape, e.g. 'book_copy' and 'book_copy.book'
+def _get_relation_paths(shape, path_prefix=''):
+    paths = []
+    for key, field in shape.items():
+        if isinstance(field, Relation):
+            path = f'{path_prefix}{key}'
+            paths += [path] + _get_relation_paths(field.shape, f'{path}.')
+    return paths
+
+
+def _validate_names(names, valid_names, query_param):
+    unknown_names = [name for name in names if name not in valid_names]
+    if len(unknown_names) > 0:
+        message = (f'Unknown {", ".join(unknown_names)}. '
+                   f'Must be among {", ".join(valid_names)}')
+        raise ValidationError({query_param: message})
+
+
+# Returns the Fieldset asked for with ?fields=<key>,... (top level keys of shape, all of
+# them when missing) and ?expand=<path>,... (relation paths such as book_copy.book.author,
+# expanding a path expands its parents), None if the client sent neither so that the
+# caller can use the full default representation. Relations not in expand are rendered as
+# ids.
+def get_fieldset(request, shape, extra_lookups=()):
+    fields = _get_names(request, FIELDS_QUERY_PARAM)
+    expand = _get_names(request, EXPAND_QUERY_PARAM)
+    if fields is None and expand is None:
+        return None
+    if fields is not None:
+        if len(fields) == 0:
+            raise ValidationError({FIELDS_QUERY_PARAM: 'Must name at least one field'})
+        _validate_names(fields, list(shape), FIELDS_QUERY_PARAM)
+    expanded_paths = set()
+    if expand is not None:
+        _validate_names(expand, _get_relation_paths(shape), EXPAND_QUERY_PARAM)
+        for path in expand:
+            parts = path.split('.')
+            expanded_paths.update('.'.join(parts[:i]) for i in range(1, len(parts)+1))
+    return Fieldset(shape, fields=fields, expand=expanded_paths, extra_lookups=extra_lookups)
@@ -0,0 +1,152 @@
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from .cache import LocalCache
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+DEFAULT_IDEMPOTENCY_SETTINGS = {
+    'MAX_ENTRIES': 10000,
+    'TIMEOUT': 24*60*60,
+    'SHARED_CACHE': None,
+    'IN_PROGRESS_TIMEOUT': 60,
+}
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'Idempotency-Key was already used for a different request'
+    default_code = 'idempotency_key_reused'
+
+
+class IdempotentRequestInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is still being processed'
+    default_code = 'idempotent_request_in_progress'
+
+
+# Responses of requests sent with an Idempotency-Key, stored as (fingerprint, status code,
+# data) entries. The status code is None while the first request is being processed. Entries
+# live in a django cache backend shared by all processes (SHARED_CACHE, the 'idempotency'
+# DatabaseCache in settings), so that a retry reaching another process is deduplicated too.
+# Without one they live in a bounded LRU/TTL LocalCache of the process.
+class IdempotencyStore:
+    def __init__(self, max_entries, timeout, shared_cache=None, in_progress_timeout=None):
+        self.local = LocalCache(max_entries=max_entries, timeout=timeout)
+        self.timeout = timeout
+        self.shared_cache = shared_cache
+        self.in_progress_timeout = in_progress_timeout
+
+    @classmethod
+    def from_settings(cls):
+        config = {**DEFAULT_IDEMPOTENCY_SETTINGS, **getattr(settings, 'IDEMPOTENCY', {})}
+        shared_cache = None
+        if config['SHARED_CACHE'] is not None:
+            shared_cache = caches[config['SHARED_CACHE']]
+        return cls(max_entries=config['MAX_ENTRIES'], timeout=config['TIMEOUT'],
+                   shared_cache=shared_cache,
+                   in_progress_timeout=config['IN_PROGRESS_TIMEOUT'])
+
+    def get(self, key):
+        if self.shared_cache is None:
+            return self.local.get(key)
+        return self.shared_cache.get(key)
+
+    # claims key for a request, returns False if another request holds or answered it. In
+    # the shared cache the claim expires after in_progress_timeout in case its process dies
+    def begin(self, key, fingerprint):
+        entry = (fingerprint, None, None)
+        if self.shared_cache is None:
+            return self.local.add(key, entry)
+        return self.shared_cache.add(key, entry, timeout=self.in_progress_timeout)
+
+    def finish(self, key, fingerprint, status_code, data):
+        entry = (fingerprint, status_code, data)
+        if self.shared_cache is None:
+            self.local.set(key, entry)
+        else:
+            self.shared_cache.set(key, entry, timeout=self.timeout)
+
+    # releases the claim of a request that failed, so that it can be retried
+    def abandon(self, key):
+        if self.shared_cache is None:
+            self.local.delete(key)
+        else:
+            self.shared_cache.delete(key)
+
+
+idempotency_store = IdempotencyStore.from_settings()
+
+
+def _get_idempotency_key(request):
+    key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+    if key is None:
+        return None
+    if len(key) == 0 or len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        message = f'Must be 1 to {MAX_IDEMPOTENCY_KEY_LENGTH} characters long'
+        raise ValidationError({IDEMPOTENCY_KEY_HEADER: message})
+    return key
+
+
+# keys are scoped to the user and the endpoint, and hashed so that any header value is a
+# valid cache key
+def _make_store_key(request, key):
+    scope = f'{request.user.pk}:{request.method}:{request.path}:{key}'
+    return f'idempotency:{hashlib.sha256(scope.encode()).hexdigest()}'
+
+
+def _fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# Answers a request repeated with the same Idempotency-Key header with the stored response
+# of the first one, without running the view, to be placed below @api_view and
+# @permission_classes. Replayed responses carry an Idempotent-Replayed: true header. The key
+# sent with a different payload is rejected with 422, and a retry arriving while the first
+# request is still running with 409. Failed requests (exceptions, 5xx) are not stored, so
+# they can be retried. Requests without the header are not affected.
+def idempotent(view):
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = _get_idempotency_key(request)
+        if key is None:
+            return view(request, *args, **kwargs)
+        store_key = _make_store_key(request, key)
+        fingerprint = _fingerprint(request)
+        if idempotency_store.begin(store_key, fingerprint) is False:
+            entry = idempotency_store.get(store_key)
+            if entry is None:
+                # the first request failed or its entry expired since begin()
+                raise IdempotentRequestInProgress()
+            stored_fingerprint, status_code, data = entry
+            if stored_fingerprint != fingerprint:
+                raise IdempotencyKeyReused()
+            if status_code is None:
+                raise IdempotentRequestInProgress()
+            response = Response(data, status=status_code)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            idempotency_store.abandon(store_key)
+            raise
+        if response.status_code < 500 and response.streaming is False:
+            idempotency_store.finish(store_key, fingerprint, response.status_code,
+                                     response.data)
+        else:
+            idempotency_store.abandon(store_key)
+        return response
+    return wrapper
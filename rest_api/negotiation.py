@@ -0,0 +1,9 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+# Content negotiation of the json only production profile. Every response is rendered with
+# the first configured renderer without matching the Accept header against media types,
+# request parsers are still picked by Content-Type
+class FirstRendererContentNegotiation(DefaultContentNegotiation):
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
@@ -0,0 +1,120 @@
+import base64
+import binascii
+import json
+import uuid
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+# Keyset (seek) pagination over a stable (title, owl_id) ordering. Unlike OFFSET based
+# pagination each page is a single range scan on the (title, owl_id) index, so the
+# cost of a page does not grow with the depth of the page.
+class BookKeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 100
+    max_page_size = 1000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.base_url = None
+        self.page_size_requested = None
+        self.next_position = None
+        self.previous_position = None
+
+    # pagination is opt-in, clients that send neither cursor nor page_size get a plain list
+    def is_requested(self, request):
+        return (self.cursor_query_param in request.query_params or
+                self.page_size_query_param in request.query_params)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, position, reverse):
+        title, owl_id = position
+        payload = json.dumps({'t': title, 'o': str(owl_id), 'r': int(reverse)})
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position = (str(payload['t']), uuid.UUID(payload['o']))
+            reverse = bool(payload['r'])
+        except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def _seek(self, queryset, position, reverse):
+        title, owl_id = position
+        # `title >= x` keeps the predicate sargable so postgres seeks straight into the
+        # index, the OR then only disambiguates rows that share the cursor title
+        if reverse is False:
+            return queryset.filter(Q(title__gte=title),
+                                   Q(title__gt=title) | Q(owl_id__gt=owl_id))
+        return queryset.filter(Q(title__lte=title),
+                               Q(title__lt=title) | Q(owl_id__lt=owl_id))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size_requested = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = False if cursor is None else cursor[1]
+
+        if cursor is not None:
+            queryset = self._seek(queryset, cursor[0], reverse)
+        if reverse is False:
+            queryset = queryset.order_by('title', 'owl_id')
+        else:
+            queryset = queryset.order_by('-title', '-owl_id')
+
+        # fetch one extra row to find out if there is anything beyond this page
+        results = list(queryset[:self.page_size_requested + 1])
+        has_more = len(results) > self.page_size_requested
+        results = results[:self.page_size_requested]
+        if reverse is True:
+            results.reverse()
+
+        if reverse is False:
+            has_next, has_previous = has_more, cursor is not None
+        else:
+            has_next, has_previous = True, has_more
+
+        self.next_position = None
+        self.previous_position = None
+        if has_next is True and len(results) > 0:
+            self.next_position = (results[-1].title, results[-1].owl_id)
+        if has_previous is True and len(results) > 0:
+            self.previous_position = (results[0].title, results[0].owl_id)
+        return results
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        cursor = self.encode_cursor(self.next_position, reverse=False)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        cursor = self.encode_cursor(self.previous_position, reverse=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
@@ -0,0 +1,26 @@
+from rest_framework import renderers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# JSONRenderer with orjson doing the encoding when it is installed. orjson encodes UUIDs and
+# datetimes (and dicts, lists and strings) in C, values it does not know go through the
+# encoder of JSONRenderer, so the output is the same bytes apart from datetimes, which keep
+# their microseconds like DateTimeField renders them. Indented output (the browsable api,
+# or ?indent= in the Accept header) and non default UNICODE_JSON/COMPACT_JSON settings are
+# left to JSONRenderer
+class FastJSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or self.ensure_ascii is True or self.compact is False or
+                self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        ret = orjson.dumps(data, default=self.encoder_class().default,
+                           option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        # like JSONRenderer, escape the two line separators javascript does not allow in
+        # string literals
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
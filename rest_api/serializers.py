@@ -1,12 +1,15 @@
+from django.contrib.auth import authenticate
 from rest_framework import serializers
 
 from base_app.models import Author, Book, LibraryUser, BookCopy, BorrowRecord
 
+from .fieldsets import Relation
+
 
 class AuthorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Author
-        fields = '__all__'
+        fields = ('author_id', 'name', 'is_popular')
 
 
 class BookSerializer(serializers.ModelSerializer):
@@ -14,7 +17,7 @@ class BookSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Book
-        fields = '__all__'
+        fields = ('owl_id', 'author', 'title')
 
 
 class LibraryUserSerializer(serializers.ModelSerializer):
@@ -31,12 +34,28 @@ class LibraryUserSerializer(serializers.ModelSerializer):
         return library_user
 
 
+# username and password of the user a token (rest_api/authentication.py) is issued for
+class TokenObtainSerializer(serializers.Serializer):
+    username = serializers.CharField()
+    password = serializers.CharField(style={'input_type': 'password'}, trim_whitespace=False,
+                                     write_only=True)
+
+    def validate(self, attrs):
+        user = authenticate(request=self.context.get('request'), username=attrs['username'],
+                            password=attrs['password'])
+        if user is None:
+            raise serializers.ValidationError('Unable to log in with provided credentials',
+                                              code='authorization')
+        attrs['user'] = user
+        return attrs
+
+
 class BookCopySerializer(serializers.ModelSerializer):
     book = BookSerializer(many=False)
 
     class Meta:
         model = BookCopy
-        fields = '__all__'
+        fields = ('book_copy_id', 'book', 'book_copy_type')
 
 
 class BorrowRecordSerializer(serializers.ModelSerializer):
@@ -44,4 +63,77 @@ class BorrowRecordSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = BorrowRecord
-        fields = '__all__'
+        fields = ('borrow_record_id', 'book_copy', 'borrow_date', 'return_date', 'is_returned',
+                  'next_eligible_borrow_date', 'library_user')
+
+
+# Fast read-only path for list endpoints. Rows are read with values_list() and turned into
+# dicts that render exactly like the output of BookSerializer and BorrowRecordSerializer
+# (same keys, order and json), without instantiating models or running per-field serializer
+# code. UUIDs are left to the renderer, which encodes them like UUIDField does.
+# named=True lets BookKeysetPagination read title and owl_id of a row.
+BOOK_ROW_FIELDS = ('owl_id', 'author__author_id', 'author__name', 'author__is_popular',
+                   'title')
+BORROW_RECORD_ROW_FIELDS = ('borrow_record_id', 'book_copy__book_copy_id',
+                            'book_copy__book__owl_id', 'book_copy__book__author__author_id',
+                            'book_copy__book__author__name',
+                            'book_copy__book__author__is_popular', 'book_copy__book__title',
+                            'book_copy__book_copy_type', 'borrow_date', 'return_date',
+                            'is_returned', 'next_eligible_borrow_date', 'library_user_id')
+
+# renders datetimes exactly like the DateTimeField of BorrowRecordSerializer
+_datetime_field = serializers.DateTimeField()
+
+
+# shapes of the objects above for sparse fieldsets (?fields= and ?expand=), see
+# rest_api/fieldsets.py
+AUTHOR_SHAPE = {'author_id': 'author_id', 'name': 'name', 'is_popular': 'is_popular'}
+BOOK_SHAPE = {'owl_id': 'owl_id', 'author': Relation('author', AUTHOR_SHAPE), 'title': 'title'}
+BOOK_COPY_SHAPE = {'book_copy_id': 'book_copy_id', 'book': Relation('book', BOOK_SHAPE),
+                   'book_copy_type': 'book_copy_type'}
+BORROW_RECORD_SHAPE = {
+    'borrow_record_id': 'borrow_record_id',
+    'book_copy': Relation('book_copy', BOOK_COPY_SHAPE),
+    'borrow_date': ('borrow_date', _datetime_field.to_representation),
+    'return_date': ('return_date', _datetime_field.to_representation),
+    'is_returned': 'is_returned',
+    'next_eligible_borrow_date': ('next_eligible_borrow_date',
+                                  _datetime_field.to_representation),
+    'library_user': 'library_user',
+}
+
+
+def get_book_rows(books):
+    return books.values_list(*BOOK_ROW_FIELDS, named=True)
+
+
+def get_borrow_record_rows(borrow_records):
+    return borrow_records.values_list(*BORROW_RECORD_ROW_FIELDS, named=True)
+
+
+def serialize_book_rows(rows):
+    return [{'owl_id': owl_id,
+             'author': {'author_id': author_id, 'name': name, 'is_popular': is_popular},
+             'title': title}
+            for owl_id, author_id, name, is_popular, title in rows]
+
+
+def serialize_borrow_record_rows(rows):
+    to_datetime_representation = _datetime_field.to_representation
+    return [{'borrow_record_id': borrow_record_id,
+             'book_copy': {'book_copy_id': book_copy_id,
+                           'book': {'owl_id': owl_id,
+                                    'author': {'author_id': author_id, 'name': name,
+                                               'is_popular': is_popular},
+                                    'title': title},
+                           'book_copy_type': book_copy_type},
+             'borrow_date': to_datetime_representation(borrow_date),
+             'return_date': to_datetime_representation(return_date),
+             'is_returned': is_returned,
+             'next_eligible_borrow_date': to_datetime_representation(
+                                          next_eligible_borrow_date),
+             'library_user': library_user_id}
+            for (borrow_record_id, book_copy_id, owl_id, author_id, name, is_popular, title,
+                 book_copy_type, borrow_date, return_date, is_returned,
+                 next_eligible_borrow_date, library_user_id)
+            in rows]
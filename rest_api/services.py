@@ -1,116 +1,87 @@
+import uuid
 from datetime import timedelta
 
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db import transaction
 from django.utils import timezone
 
-from base_app.models import Author, Book, BookCopy, BorrowRecord, LibraryUser
+from base_app.models import (Author, Book, BookCopy, BorrowRecord, LibraryUser,
+                             get_book_borrow_duration_in_days, get_cool_down_period_end_date,
+                             is_author_name_popular)
 
 
-def _is_author_popular(name):
-    if type(name) != str:
-        raise ValidationError('Only string arguments are allowed')
-    if len(name) == 0:
-        return False
-    # identity author with name starting with letter 'j' or 'J' as popular
-    return name[0] == 'j' or name[0] == 'J'
-
-
-def _get_distinct_book_copy_ids_of_borrowed_books():
-    borrowed_books = BorrowRecord.objects.get_all_borrow_records_by_return_status(
-                        is_returned=False)
-    distinct_book_copy_ids_of_borrowed_books = borrowed_books.values_list(
-                                                'book_copy_id', flat=True).distinct()
-    return distinct_book_copy_ids_of_borrowed_books
-
-
-def _get_book_borrow_duration_in_days():
-    return 14
-
-
-def _get_number_of_days_in_month():
-    # taking average number of days in a month as 30
-    return 30
-
-
-def _create_new_borrow_record(owl_id, username):
-    book_copy = BookCopy.objects.get_book_copy_with_matching_owl_id(owl_id=owl_id)
-    library_user = LibraryUser.objects.get(username=username)
+def _create_new_borrow_record(book_copy, user_id):
     current_date = timezone.now()
     borrow_date = current_date
-    return_date = current_date+timedelta(days=_get_book_borrow_duration_in_days())
+    return_date = current_date+timedelta(days=get_book_borrow_duration_in_days())
+    next_eligible_borrow_date = get_cool_down_period_end_date(borrow_date,
+                                                              book_copy.book.author.name)
     borrow_record_instance = BorrowRecord(
                                 borrow_date=borrow_date, return_date=return_date,
-                                is_returned=False, book_copy=book_copy,
-                                library_user=library_user)
-    borrow_record = BorrowRecord.objects.insert_borrow_record(
-                    borrow_record=borrow_record_instance)
+                                is_returned=False,
+                                next_eligible_borrow_date=next_eligible_borrow_date,
+                                book_copy=book_copy, library_user_id=user_id)
+    borrow_record = BorrowRecord.objects.insert_borrow_record_of_locked_book_copy(
+                    borrow_record=borrow_record_instance, owl_id=book_copy.book_id)
     return borrow_record
 
 
-def _get_cool_down_period_of_popular_author_in_days():
-    cool_down_period_in_months = 6
-    return _get_number_of_days_in_month() * cool_down_period_in_months
-
-
-def _get_cool_down_period_of_normal_author_in_days():
-    cool_down_period_in_months = 3
-    return _get_number_of_days_in_month() * cool_down_period_in_months
-
-
-def _get_cool_down_period_in_days(owl_id):
-    author_name = Author.objects.get_author_by_owl_id(owl_id=owl_id).name
-    if _is_author_popular(author_name) is True:
-        return _get_cool_down_period_of_popular_author_in_days()
-    else:
-        return _get_cool_down_period_of_normal_author_in_days()
-
+# the cool-down period end date stored on the borrow record when it was created or renewed,
+# derived from the author for records written otherwise
+def _get_next_eligible_borrow_date(borrow_record, author_name):
+    if borrow_record.next_eligible_borrow_date is not None:
+        return borrow_record.next_eligible_borrow_date
+    return get_cool_down_period_end_date(borrow_record.borrow_date, author_name)
 
-def _get_cool_down_period_end_date(previous_borrow_date, owl_id):
-    cool_down_period_in_days = _get_cool_down_period_in_days(owl_id)
-    cool_down_period_end_date = previous_borrow_date+timedelta(days=cool_down_period_in_days)
-    return cool_down_period_end_date
 
-
-def _can_borrow_book_again(previous_borrow_date, owl_id):
-    cool_down_period_end_date = _get_cool_down_period_end_date(previous_borrow_date, owl_id)
-    current_borrow_date = timezone.now()
-    is_cool_down_period_ended = cool_down_period_end_date < current_borrow_date
-    return is_cool_down_period_ended
-
-
-def _borrow_book_again(borrow_record_id):
+def _borrow_book_again(borrow_record_id, book_copy_id, owl_id, author_name):
     current_date = timezone.now()
     new_borrow_date = current_date
-    new_return_date = current_date+timedelta(days=_get_book_borrow_duration_in_days())
-    new_return_status = False
-    rows_affected = BorrowRecord.objects.update_dates_and_status(
-                    borrow_record_id=borrow_record_id, borrow_date=new_borrow_date,
-                    return_date=new_return_date, return_status=new_return_status)
-    if rows_affected != 1:
+    new_return_date = current_date+timedelta(days=get_book_borrow_duration_in_days())
+    next_eligible_borrow_date = get_cool_down_period_end_date(new_borrow_date, author_name)
+    updated_borrow_record = BorrowRecord.objects.renew_borrow_record_of_locked_book_copy(
+                            borrow_record_id=borrow_record_id, book_copy_id=book_copy_id,
+                            owl_id=owl_id, borrow_date=new_borrow_date,
+                            return_date=new_return_date,
+                            next_eligible_borrow_date=next_eligible_borrow_date)
+    if updated_borrow_record is None:
         raise ValidationError('Something went wrong, please try again')
-    updated_borrow_record = BorrowRecord.objects.get_borrow_record_by_owl_id(
-                            borrow_record_id=borrow_record_id)
     return updated_borrow_record
 
 
 # returns None if borrow record does not exist, i.e. book wasn't borrowed previously
-def _get_previous_borrow_record(owl_id, username):
+def _get_previous_borrow_record(owl_id, user_id):
     try:
-        borrow_record = BorrowRecord.objects.get_borrow_record_by_owl_id_and_username(
-                        owl_id=owl_id, username=username)
+        borrow_record = BorrowRecord.objects.get_borrow_record_by_owl_id_and_user_id(
+                        owl_id=owl_id, user_id=user_id)
         return borrow_record
-    except Exception:
+    except ObjectDoesNotExist:
         return None
 
 
-def _try_update_borrow_record(owl_id, borrow_date, borrow_record_id):
-    if _can_borrow_book_again(borrow_date, owl_id) is True:
-        updated_borrow_record = _borrow_book_again(borrow_record_id)
+# book_copy comes with its book and author (see _allocate_book_copy)
+def _try_update_borrow_record(book_copy, borrow_record):
+    author_name = book_copy.book.author.name
+    next_eligible_borrow_date = _get_next_eligible_borrow_date(borrow_record, author_name)
+    if next_eligible_borrow_date < timezone.now():
+        updated_borrow_record = _borrow_book_again(borrow_record.borrow_record_id,
+                                                   book_copy.book_copy_id, book_copy.book_id,
+                                                   author_name)
         return updated_borrow_record
     else:
         raise ValidationError('Cannot borrow book again too frequently')
 
 
+# batch availability, borrow and return handle at most this many books at once
+def _get_batch_limit():
+    return 100
+
+
+# catalog search returns at most this many of the best matching books
+def _get_book_search_result_limit():
+    return 100
+
+
 def _validate_book_owl_id(owl_id):
     try:
         Book.objects.get_book_by_owl_id(owl_id=owl_id)
@@ -118,8 +89,19 @@ def _validate_book_owl_id(owl_id):
         raise e
 
 
+# must be called inside a transaction, the returned copy stays locked until it ends
+def _allocate_book_copy(owl_id):
+    book_copy = BookCopy.objects.get_free_book_copy_with_matching_owl_id_for_update(
+                owl_id=owl_id)
+    if book_copy is None:
+        # raises for an unknown owl_id, otherwise every copy is lent out
+        _validate_book_owl_id(owl_id=owl_id)
+        raise ValidationError('All copies of this book are borrowed, please try again later')
+    return book_copy
+
+
 def add_author(author_name):
-    is_popular = _is_author_popular(author_name)
+    is_popular = is_author_name_popular(author_name)
     author_instance = Author(name=author_name, is_popular=is_popular)
     try:
         return Author.objects.insert_author(author=author_instance)
@@ -145,71 +127,282 @@ def add_book_copy(book_title, book_type):
         raise e
 
 
+# querysets returned to the api layer are joined with every relation that its serializer
+# nests, this keeps list endpoints at a constant number of queries irrespective of rows
+def _join_book_serializer_relations(books):
+    return books.select_related('author')
+
+
+def _join_borrow_record_serializer_relations(borrow_records):
+    return borrow_records.select_related('book_copy__book__author')
+
+
 def get_all_books():
-    return Book.objects.get_all_books()
+    books = Book.objects.get_all_books()
+    return _join_book_serializer_relations(books)
 
 
 def get_all_available_books():
-    distinct_book_copy_ids_of_borrowed_books = _get_distinct_book_copy_ids_of_borrowed_books()
-    books = Book.objects.exclude(
-            bookcopy__book_copy_id__in=distinct_book_copy_ids_of_borrowed_books)
-    return books
+    books = Book.objects.get_all_available_books()
+    return _join_book_serializer_relations(books)
 
 
 def get_all_books_by_similar_author_name(name):
-    authors_with_similar_name = Author.objects.get_all_authors_with_similar_name(name)
-    author_ids_with_similar_name = authors_with_similar_name.values_list(
-                                    'author_id', flat=True)
-    books = Book.objects.get_all_books_by_author_id_list(
-            author_id_list=author_ids_with_similar_name)
-    return books
-
-
-def borrow_book(owl_id, username):
-    borrow_record = _get_previous_borrow_record(owl_id, username)
+    books = Book.objects.get_all_books_by_similar_author_name(author_name=name)
+    return _join_book_serializer_relations(books)
+
+
+def search_books(search_text):
+    books = Book.objects.search_books(search_text=search_text)
+    return _join_book_serializer_relations(books)[:_get_book_search_result_limit()]
+
+
+# Borrowing runs as one transaction. The LibraryUser row is locked first so requests of
+# the same user (previous record and cool-down checks included) are serialized, then any
+# Locks the LibraryUser row against concurrent borrows and returns of the same user and
+# bumps its records version (ETags) with one UPDATE. The transaction of the caller rolls the
+# bump back if the borrow or return fails
+def _lock_library_user(user_id):
+    if BorrowRecord.objects.bump_records_version(library_user_id=user_id) == 0:
+        raise LibraryUser.DoesNotExist('LibraryUser matching query does not exist.')
+
+
+# free copy of the book is allocated with SELECT ... FOR UPDATE SKIP LOCKED so borrowers
+# of the same title do not wait on each other for the copy. The partial unique constraint
+# on unreturned BorrowRecords backs this up for writes that do not go through these
+# functions. The copy is locked and known to be free, so the record is written and the copy
+# and the counter of its book are updated directly, without the re-derivation of the signals
+@transaction.atomic
+def borrow_book(owl_id, user_id):
+    _lock_library_user(user_id)
+    borrow_record = _get_previous_borrow_record(owl_id, user_id)
+    if borrow_record is not None and borrow_record.is_returned is False:
+        raise ValidationError('You have not returned this book yet, kindly return it first')
+
+    book_copy = _allocate_book_copy(owl_id)
     if borrow_record is None:
-        new_borrow_record = _create_new_borrow_record(owl_id, username)
+        new_borrow_record = _create_new_borrow_record(book_copy, user_id)
         return new_borrow_record
     else:
-        updated_borrow_record = _try_update_borrow_record(
-                                owl_id, borrow_record.borrow_date,
-                                borrow_record.borrow_record_id)
+        updated_borrow_record = _try_update_borrow_record(book_copy, borrow_record)
+        # reuse the copy fetched above so serializing the record needs no more queries
+        updated_borrow_record.book_copy = book_copy
         return updated_borrow_record
 
 
-# returns True is book returned successfully else False
-def return_book(owl_id, username):
+# borrow_book for many books in one transaction and a constant number of queries. Returns
+# {owl_id: result}, result is {'success': True, 'borrow_record': borrow_record} or
+# {'success': False, 'detail': reason}, the books that can be borrowed are borrowed even if
+# others cannot. New borrow records are inserted and renewed ones updated in bulk
+@transaction.atomic
+def borrow_books(owl_ids, user_id):
+    owl_ids = _validate_owl_ids(owl_ids)
+    library_user = LibraryUser.objects.select_for_update().get(pk=user_id)
+    borrow_records = BorrowRecord.objects.get_all_borrow_records_by_owl_ids_and_user_id(
+                     owl_ids=owl_ids, user_id=user_id).select_related('book_copy')
+    borrow_records = {borrow_record.book_copy.book_id: borrow_record
+                      for borrow_record in borrow_records}
+
+    errors = {}
+    for owl_id, borrow_record in borrow_records.items():
+        if borrow_record.is_returned is False:
+            errors[owl_id] = 'You have not returned this book yet, kindly return it first'
+    book_copies = BookCopy.objects.get_free_book_copies_with_matching_owl_ids_for_update(
+                  owl_ids=[owl_id for owl_id in owl_ids if owl_id not in errors])
+    missing_owl_ids = [owl_id for owl_id in owl_ids
+                       if owl_id not in errors and owl_id not in book_copies]
+    if len(missing_owl_ids) > 0:
+        existing_owl_ids = Book.objects.get_author_names_by_owl_ids(owl_ids=missing_owl_ids)
+        for owl_id in missing_owl_ids:
+            if owl_id in existing_owl_ids:
+                errors[owl_id] = 'All copies of this book are borrowed, please try again later'
+            else:
+                errors[owl_id] = 'Book does not exist'
+
+    current_date = timezone.now()
+    return_date = current_date+timedelta(days=get_book_borrow_duration_in_days())
+    new_borrow_records = []
+    renewed_borrow_records = []
+    previous_book_copy_ids = []
+    for owl_id, book_copy in book_copies.items():
+        author_name = book_copy.book.author.name
+        next_eligible_borrow_date = get_cool_down_period_end_date(current_date, author_name)
+        borrow_record = borrow_records.get(owl_id)
+        if borrow_record is None:
+            borrow_record = BorrowRecord(borrow_date=current_date, return_date=return_date,
+                                         is_returned=False,
+                                         next_eligible_borrow_date=next_eligible_borrow_date,
+                                         book_copy=book_copy, library_user=library_user)
+            new_borrow_records.append(borrow_record)
+        elif _get_next_eligible_borrow_date(borrow_record, author_name) < current_date:
+            previous_book_copy_ids.append(borrow_record.book_copy_id)
+            borrow_record.book_copy = book_copy
+            borrow_record.borrow_date = current_date
+            borrow_record.return_date = return_date
+            borrow_record.next_eligible_borrow_date = next_eligible_borrow_date
+            borrow_record.library_user = library_user
+            renewed_borrow_records.append(borrow_record)
+        else:
+            errors[owl_id] = 'Cannot borrow book again too frequently'
+
+    if len(new_borrow_records) > 0:
+        BorrowRecord.objects.insert_borrow_records(borrow_records=new_borrow_records)
+    if len(renewed_borrow_records) > 0:
+        BorrowRecord.objects.renew_borrow_records(
+            borrow_records=renewed_borrow_records,
+            previous_book_copy_ids=previous_book_copy_ids)
+
+    results = {}
+    for borrow_record in new_borrow_records+renewed_borrow_records:
+        results[borrow_record.book_copy.book_id] = {'success': True,
+                                                    'borrow_record': borrow_record}
+    for owl_id, error in errors.items():
+        results[owl_id] = {'success': False, 'detail': error}
+    return {str(owl_id): results[owl_id] for owl_id in owl_ids}
+
+
+# returns True if the book was borrowed by the user (and is returned now or was before).
+# Like borrow_book, the LibraryUser row is locked first so both take locks in one order
+@transaction.atomic
+def return_book(owl_id, user_id):
     try:
-        borrow_record = BorrowRecord.objects.get_borrow_record_by_owl_id_and_username(
-                        owl_id=owl_id, username=username)
-        rows_affected = BorrowRecord.objects.update_return_status(
-                        borrow_record_id=borrow_record.borrow_record_id,
-                        return_status=True)
-        return rows_affected == 1
+        _lock_library_user(user_id)
+        borrow_record = BorrowRecord.objects.get_borrow_record_by_owl_id_and_user_id(
+                        owl_id=owl_id, user_id=user_id)
+        if borrow_record.is_returned is False:
+            BorrowRecord.objects.return_borrow_record(borrow_record)
+        return True
     except Exception as e:
         raise e
 
 
-def get_next_borrow_date(owl_id, username):
+# return_book for many books in one transaction and a constant number of queries. Returns
+# {owl_id: {'success': bool, 'detail': message}}
+@transaction.atomic
+def return_books(owl_ids, user_id):
+    owl_ids = _validate_owl_ids(owl_ids)
+    LibraryUser.objects.select_for_update().get(pk=user_id)
+    borrow_records = BorrowRecord.objects.get_all_borrow_records_by_owl_ids_and_user_id(
+                     owl_ids=owl_ids, user_id=user_id).select_related('book_copy')
+    borrow_records = {borrow_record.book_copy.book_id: borrow_record
+                      for borrow_record in borrow_records}
+    BorrowRecord.objects.update_return_statuses(
+        borrow_record_ids=[borrow_record.borrow_record_id
+                           for borrow_record in borrow_records.values()
+                           if borrow_record.is_returned is False],
+        return_status=True)
+
+    results = {}
+    for owl_id in owl_ids:
+        borrow_record = borrow_records.get(owl_id)
+        if borrow_record is None:
+            result = {'success': False, 'detail': 'You have not borrowed this book'}
+        elif borrow_record.is_returned is True:
+            result = {'success': False, 'detail': 'You have already returned this book'}
+        else:
+            result = {'success': True, 'detail': 'Book returned successfully'}
+        results[str(owl_id)] = result
+    return results
+
+
+def _get_cool_down_message(cool_down_period_end_date, current_borrow_date):
+    if cool_down_period_end_date < current_borrow_date:
+        return 'Book is now available, you can borrow it immediately'
+    else:
+        date = cool_down_period_end_date.date()
+        formatted_date = f'{date.day}/{date.month}/{date.year}'
+        return f'You can borrow this book again on {formatted_date}'
+
+
+def get_next_borrow_date(owl_id, user_id):
     _validate_book_owl_id(owl_id=owl_id)
 
-    borrow_record = _get_previous_borrow_record(owl_id=owl_id, username=username)
+    borrow_record = _get_previous_borrow_record(owl_id=owl_id, user_id=user_id)
     if borrow_record is None:
         return 'You can borrow this book immediately'
     elif borrow_record.is_returned is False:
         return 'You have not returned this book yet, kindly return it first'
 
-    previous_borrow_date = borrow_record.borrow_date
-    current_borrow_date = timezone.now()
-    cool_down_period_end_date = _get_cool_down_period_end_date(previous_borrow_date, owl_id)
+    cool_down_period_end_date = borrow_record.next_eligible_borrow_date
+    if cool_down_period_end_date is None:
+        author_name = Author.objects.get_author_by_owl_id(owl_id=owl_id).name
+        cool_down_period_end_date = _get_next_eligible_borrow_date(borrow_record, author_name)
+    return _get_cool_down_message(cool_down_period_end_date, timezone.now())
+
+
+# returns the distinct owl_ids as UUIDs, in the given order
+def _validate_owl_ids(owl_ids):
+    if isinstance(owl_ids, (list, tuple)) is False:
+        raise ValidationError('owl_ids must be a list')
+    if len(owl_ids) == 0:
+        raise ValidationError('At least one owl_id is required')
+    if len(owl_ids) > _get_batch_limit():
+        raise ValidationError(f'At most {_get_batch_limit()} owl_ids are allowed')
+    try:
+        return list(dict.fromkeys(uuid.UUID(str(owl_id)) for owl_id in owl_ids))
+    except ValueError:
+        raise ValidationError('Invalid owl_id')
 
-    if cool_down_period_end_date < current_borrow_date:
-        return 'Book is now available, you can borrow it immediately'
-    else:
-        date = cool_down_period_end_date.date()
-        formatted_date = f'{date.day}/{date.month}/{date.year}'
-        return f'You can borrow this book again on {formatted_date}'
+
+def _get_availability_message(borrow_record, author_name, current_borrow_date):
+    if borrow_record is None:
+        return 'You can borrow this book immediately'
+    elif borrow_record.is_returned is False:
+        return 'You have not returned this book yet, kindly return it first'
+    return _get_cool_down_message(_get_next_eligible_borrow_date(borrow_record, author_name),
+                                  current_borrow_date)
 
 
-def get_my_borrow_records(username):
-    return BorrowRecord.objects.get_all_borrow_records_by_username(username=username)
+# author_names and borrow_records (with book_copy) are keyed by owl_id
+def _get_availability_messages(owl_ids, author_names, borrow_records):
+    current_borrow_date = timezone.now()
+    messages = {}
+    for owl_id in owl_ids:
+        if owl_id not in author_names:
+            message = 'Book does not exist'
+        else:
+            message = _get_availability_message(borrow_records.get(owl_id),
+                                                author_names[owl_id], current_borrow_date)
+        messages[str(owl_id)] = message
+    return messages
+
+
+# get_next_borrow_date for many books at once, returns {owl_id: message} in two queries
+# whatever the number of books
+def get_next_borrow_dates(owl_ids, user_id):
+    owl_ids = _validate_owl_ids(owl_ids)
+    author_names = Book.objects.get_author_names_by_owl_ids(owl_ids=owl_ids)
+    borrow_records = BorrowRecord.objects.get_all_borrow_records_by_owl_ids_and_user_id(
+                     owl_ids=owl_ids, user_id=user_id).select_related('book_copy')
+    # a user has one borrow record per book, borrowing the book again renews it
+    borrow_records = {borrow_record.book_copy.book_id: borrow_record
+                      for borrow_record in borrow_records}
+    return _get_availability_messages(owl_ids, author_names, borrow_records)
+
+
+# async versions of get_next_borrow_date(s) for the ASGI views (rest_api/async_views.py),
+# reading through the async queryset interface. Both run two queries
+async def aget_next_borrow_date(owl_id, user_id):
+    if owl_id is None:
+        raise ValidationError('Invalid owl_id')
+    book = await Book.objects.get_all_books().select_related('author').aget(owl_id=owl_id)
+    borrow_record = await BorrowRecord.objects.get_all_borrow_records_by_owl_ids_and_user_id(
+                    owl_ids=[owl_id], user_id=user_id).afirst()
+    return _get_availability_message(borrow_record, book.author.name, timezone.now())
+
+
+async def aget_next_borrow_dates(owl_ids, user_id):
+    owl_ids = _validate_owl_ids(owl_ids)
+    author_names = {owl_id: author_name async for owl_id, author_name
+                    in Book.objects.get_author_name_rows_by_owl_ids(owl_ids=owl_ids)}
+    borrow_records = BorrowRecord.objects.get_all_borrow_records_by_owl_ids_and_user_id(
+                     owl_ids=owl_ids, user_id=user_id).select_related('book_copy')
+    borrow_records = {borrow_record.book_copy.book_id: borrow_record
+                      async for borrow_record in borrow_records}
+    return _get_availability_messages(owl_ids, author_names, borrow_records)
+
+
+def get_my_borrow_records(user_id):
+    borrow_records = BorrowRecord.objects.get_all_borrow_records_by_user_id(
+                     user_id=user_id)
+    return _join_borrow_record_serializer_relations(borrow_records)
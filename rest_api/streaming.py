@@ -0,0 +1,70 @@
+import itertools
+
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+
+from rest_api.renderers import FastJSONRenderer
+
+STREAM_QUERY_PARAM = 'stream'
+STREAM_CHUNK_SIZE = 2000
+# ?stream=1 and ?stream=json stream a json array, ?stream=ndjson one json object per line
+STREAM_FORMATS = {
+    '1': 'json',
+    'json': 'json',
+    'ndjson': 'ndjson',
+}
+STREAM_CONTENT_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+# returns the requested stream format, None if the client did not ask for a stream
+def get_stream_format(request):
+    value = request.query_params.get(STREAM_QUERY_PARAM)
+    if value is None:
+        return None
+    if value not in STREAM_FORMATS:
+        message = f'Must be one of {", ".join(STREAM_FORMATS)}'
+        raise ValidationError({STREAM_QUERY_PARAM: message})
+    return STREAM_FORMATS[value]
+
+
+# rows are read through a server-side cursor and serialized chunk_size at a time while the
+# response is being sent, so memory use does not grow with the number of rows
+def _serialize_chunks(rows, serialize_rows, chunk_size):
+    rows = rows.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if len(chunk) == 0:
+            return
+        yield serialize_rows(chunk)
+
+
+# the rendered chunks are stitched into one array, byte for byte what the renderer makes of
+# the whole list
+def _render_json_array(data_chunks):
+    renderer = FastJSONRenderer()
+    separator = b''
+    yield b'['
+    for data in data_chunks:
+        yield separator + renderer.render(data)[1:-1]
+        separator = b','
+    yield b']'
+
+
+def _render_ndjson(data_chunks):
+    renderer = FastJSONRenderer()
+    for data in data_chunks:
+        yield b''.join(renderer.render(item) + b'\n' for item in data)
+
+
+# rows is a queryset and serialize_rows turns a list of its rows into data, e.g.
+# get_book_rows(books) and serialize_book_rows from rest_api/serializers.py
+def stream_response(rows, serialize_rows, stream_format, chunk_size=STREAM_CHUNK_SIZE):
+    data_chunks = _serialize_chunks(rows, serialize_rows, chunk_size)
+    if stream_format == 'ndjson':
+        content = _render_ndjson(data_chunks)
+    else:
+        content = _render_json_array(data_chunks)
+    return StreamingHttpResponse(content, content_type=STREAM_CONTENT_TYPES[stream_format])
@@ -0,0 +1,131 @@
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.test import AsyncRequestFactory
+from django.utils import timezone
+from rest_framework.test import APITestCase, force_authenticate
+
+import rest_api.async_views as async_views
+from base_app.models import (Author, Book, BookCopy, BorrowRecord, LibraryUser,
+                             bump_catalog_version)
+from rest_api.cache import catalog_cache
+
+
+def _json(response):
+    return json.loads(response.content)
+
+
+class AsyncViewsTest(APITestCase):
+    def setUp(self):
+        catalog_cache.invalidate()
+        self.factory = AsyncRequestFactory()
+        d1 = timezone.now()
+        d2 = timezone.now()+timedelta(days=14)
+        author = Author.objects.create(name='Guido van Rossum', is_popular=False)
+        self.normal_book = Book.objects.create(title='An Introduction to Python',
+                                               author=author)
+        copy = BookCopy.objects.create(book=self.normal_book,
+                                       book_copy_type=BookCopy.BOOK_COPY_TYPE.HARDCOVER)
+        self.user = LibraryUser.objects.create(username='NK', password='pass')
+        BorrowRecord.objects.create(borrow_date=d1, return_date=d2, book_copy=copy,
+                                    library_user=self.user)
+        author = Author.objects.create(name='James Gosling', is_popular=True)
+        self.popular_book = Book.objects.create(title='The Java Language Specification',
+                                                author=author)
+        BookCopy.objects.create(book=self.popular_book,
+                                book_copy_type=BookCopy.BOOK_COPY_TYPE.HANDMADE)
+
+    def tearDown(self):
+        catalog_cache.invalidate()
+
+    # in django 4.1 headers are passed to AsyncRequestFactory by name, e.g. If-None-Match
+    def _get(self, url, user=None, **headers):
+        request = self.factory.get(url, **headers)
+        if user is not None:
+            force_authenticate(request, user=user)
+        return request
+
+    async def test_book_lists_match_sync_views(self):
+        for url, view, args in [('/', async_views.get_all_books_api, ()),
+                                ('/books/available/', async_views.get_all_available_books_api,
+                                 ()),
+                                ('/books/author/rossum',
+                                 async_views.get_all_books_by_author_name_api, ('rossum',)),
+                                ('/books/search/?q=java', async_views.search_books_api, ()),
+                                ('/?fields=title&expand=author', async_views.get_all_books_api,
+                                 ())]:
+            with self.subTest(url=url):
+                response = await view(self._get(url), *args)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                expected_response = await self.async_client.get(url)
+                self.assertEqual(response.content, expected_response.content)
+                self.assertEqual(response['ETag'], expected_response['ETag'])
+
+    async def test_book_lists_answer_conditional_requests(self):
+        response = await async_views.get_all_books_api(self._get('/'))
+        self.assertEqual(response['X-Cache'], 'MISS')
+        response = await async_views.get_all_books_api(
+                   self._get('/', **{'If-None-Match': response['ETag']}))
+        self.assertEqual(response.status_code, 304)
+        response = await async_views.get_all_books_api(self._get('/'))
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    async def test_cached_body_follows_version_of_etag(self):
+        etag = (await async_views.get_all_books_api(self._get('/')))['ETag']
+        # a write of another worker, which does not send catalog_changed in this process
+        await (Book.objects.filter(owl_id=self.normal_book.owl_id)
+                           .aupdate(title='Python Tricks'))
+        await sync_to_async(bump_catalog_version)()
+        response = await async_views.get_all_books_api(self._get('/'))
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn('Python Tricks', response.content.decode())
+        self.assertNotEqual(response['ETag'], etag)
+
+    async def test_pages_and_streams_are_served_by_sync_views(self):
+        response = await async_views.get_all_books_api(self._get('/?page_size=1'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(_json(response)['results']), 1)
+        response = await async_views.get_all_books_api(self._get('/?stream=ndjson'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.content.splitlines()), 2)
+
+    async def test_availability(self):
+        response = await async_views.get_book_availability_api(
+                   self._get('/', user=self.user), str(self.popular_book.owl_id))
+        self.assertEqual(_json(response), 'You can borrow this book immediately')
+        owl_ids = [str(self.normal_book.owl_id), str(self.popular_book.owl_id)]
+        response = await async_views.get_books_availability_api(
+                   self._get(f'/accounts/availability/?owl_ids={",".join(owl_ids)}',
+                             user=self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_json(response), {
+            owl_ids[0]: 'You have not returned this book yet, kindly return it first',
+            owl_ids[1]: 'You can borrow this book immediately'})
+
+    async def test_availability_of_unknown_book_fails_like_sync_view(self):
+        response = await async_views.get_book_availability_api(
+                   self._get('/', user=self.user), 'not-an-owl-id')
+        self.assertEqual(response.status_code, 500)
+
+    async def test_borrow_records(self):
+        request = self._get('/accounts/records/?fields=is_returned', user=self.user)
+        response = await async_views.get_my_borrow_records_api(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_json(response), [{'is_returned': False}])
+
+    async def test_authentication_is_required(self):
+        response = await async_views.get_my_borrow_records_api(self._get('/accounts/records/'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        self.assertEqual(_json(response),
+                         {'detail': 'Authentication credentials were not provided.'})
+
+    async def test_other_methods_are_not_allowed(self):
+        response = await async_views.get_all_books_api(self.factory.post('/'))
+        self.assertEqual(response.status_code, 405)
+
+    async def test_invalid_fields_are_rejected(self):
+        response = await async_views.get_all_books_api(self._get('/?fields=isbn'))
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,93 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APITestCase
+
+from base_app.models import Author, Book, BookCopy, BorrowRecord, LibraryUser
+from rest_api.authentication import create_token, get_token_user
+
+
+class SignedTokenTest(TestCase):
+    def setUp(self):
+        self.user = LibraryUser.objects.create(username='NK', password='pass')
+
+    def test_token_user_is_loaded_without_queries(self):
+        token = create_token(self.user)
+        with self.assertNumQueries(0):
+            user = get_token_user(token)
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertEqual(user.is_authenticated, True)
+        # other fields are deferred
+        with self.assertNumQueries(1):
+            self.assertEqual(user.username, 'NK')
+
+    def test_tampered_token_is_rejected(self):
+        token = create_token(self.user)
+        other_token = create_token(LibraryUser.objects.create(username='JD', password='pass'))
+        forged_token = other_token.split(':')[0]+token[token.index(':'):]
+        with self.assertRaisesMessage(AuthenticationFailed, 'Invalid token'):
+            get_token_user(forged_token)
+        with self.assertRaisesMessage(AuthenticationFailed, 'Invalid token'):
+            get_token_user('not a token')
+
+    def test_expired_token_is_rejected(self):
+        token = create_token(self.user)
+        with self.settings(AUTH_TOKEN_MAX_AGE=60):
+            with mock.patch('django.core.signing.time.time',
+                            return_value=timezone.now().timestamp()+61):
+                with self.assertRaisesMessage(AuthenticationFailed, 'Token has expired'):
+                    get_token_user(token)
+
+
+class SignedTokenAuthenticationTest(APITestCase):
+    def setUp(self):
+        self.user = LibraryUser.objects.create_user(username='NK', password='pass')
+        author = Author.objects.create(name='Guido van Rossum', is_popular=False)
+        self.book = Book.objects.create(title='An Introduction to Python', author=author)
+        copy = BookCopy.objects.create(book=self.book,
+                                       book_copy_type=BookCopy.BOOK_COPY_TYPE.HARDCOVER)
+        BorrowRecord.objects.create(borrow_date=timezone.now(),
+                                    return_date=timezone.now()+timedelta(days=14),
+                                    book_copy=copy, library_user=self.user, is_returned=True)
+
+    def _obtain_token(self):
+        response = self.client.post('/accounts/token/', {'username': 'NK', 'password': 'pass'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['expires_in'], 24*60*60)
+        return response.data['token']
+
+    def test_token_authenticates_without_session_and_user_queries(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self._obtain_token()}')
+        # records_version for the ETag, catalog version and the records
+        with self.assertNumQueries(3):
+            response = self.client.get('/accounts/records/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        with self.assertNumQueries(2):
+            response = self.client.get('/accounts/availability/?owl_ids='
+                                       f'{self.book.owl_id}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_token_authenticates_writes_without_csrf_token(self):
+        self.client = self.client_class(enforce_csrf_checks=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self._obtain_token()}')
+        BorrowRecord.objects.update(next_eligible_borrow_date=timezone.now())
+        response = self.client.post('/accounts/borrow/', {'owl_id': f'{self.book.owl_id}'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_wrong_password_gets_no_token(self):
+        response = self.client.post('/accounts/token/', {'username': 'NK', 'password': 'no'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        response = self.client.get('/accounts/records/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+
+    def test_missing_credentials_are_rejected(self):
+        response = self.client.get('/accounts/records/')
+        self.assertEqual(response.status_code, 401)
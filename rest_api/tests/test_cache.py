@@ -0,0 +1,176 @@
+from unittest import mock
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+from rest_framework.test import APITestCase
+
+import rest_api.services as services
+from base_app.models import (Author, Book, BookCopy, BorrowRecord, LibraryUser,
+                             bump_catalog_version, get_catalog_version)
+from rest_api.cache import CatalogCache, LocalCache, catalog_cache
+
+
+class LocalCacheTest(SimpleTestCase):
+    def test_evicts_least_recently_used_entry(self):
+        cache = LocalCache(max_entries=2, timeout=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
+    @mock.patch('rest_api.cache.time.monotonic')
+    def test_expires_entries_after_timeout(self, mocked_monotonic):
+        cache = LocalCache(max_entries=2, timeout=60)
+        mocked_monotonic.return_value = 100
+        cache.set('a', 1)
+        mocked_monotonic.return_value = 159
+        self.assertEqual(cache.get('a'), 1)
+        mocked_monotonic.return_value = 160
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+
+class CatalogCacheTest(SimpleTestCase):
+    def test_counts_hits_and_misses_and_invalidates(self):
+        cache = CatalogCache(local_max_entries=8, local_timeout=60)
+        key, value = cache.get('/', 1)
+        self.assertIsNone(value)
+        cache.set(key, ['book'])
+        self.assertEqual(cache.get('/', 1)[1], ['book'])
+        cache.invalidate()
+        self.assertIsNone(cache.get('/', 1)[1])
+        stats = cache.stats()
+        self.assertEqual((stats['local_hits'], stats['misses'], stats['invalidations']),
+                         (1, 2, 1))
+
+    def test_value_computed_before_version_bump_is_never_read(self):
+        cache = CatalogCache(local_max_entries=8, local_timeout=60)
+        key, _ = cache.get('/', 1)
+        cache.set(key, ['stale book'])
+        self.assertIsNone(cache.get('/', 2)[1])
+
+    def test_shared_tier_shares_entries_between_processes(self):
+        shared_cache = LocMemCache('catalog-cache-test', {})
+        shared_cache.clear()
+        process_1 = CatalogCache(local_max_entries=8, local_timeout=60,
+                                 shared_cache=shared_cache, shared_timeout=60)
+        process_2 = CatalogCache(local_max_entries=8, local_timeout=60,
+                                 shared_cache=shared_cache, shared_timeout=60)
+        key, _ = process_1.get('/', 1)
+        process_1.set(key, ['book'])
+        self.assertEqual(process_2.get('/', 1)[1], ['book'])
+        self.assertEqual(process_2.get('/', 1)[1], ['book'])
+        self.assertEqual((process_2.stats()['shared_hits'], process_2.stats()['local_hits']),
+                         (1, 1))
+        self.assertIsNone(process_2.get('/', 2)[1])
+
+
+class CatalogResponseCacheTest(APITestCase):
+    def setUp(self):
+        author = Author.objects.create(name='Guido van Rossum', is_popular=False)
+        self.book = Book.objects.create(title='An Introduction to Python', author=author)
+        BookCopy.objects.create(book=self.book,
+                                book_copy_type=BookCopy.BOOK_COPY_TYPE.HARDCOVER)
+        self.user = LibraryUser.objects.create(username='NK', password='pass')
+        catalog_cache.reset_stats()
+
+    def test_second_request_is_served_from_cache(self):
+        response = self.client.get('/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        # the catalog version lookup of the ETag
+        with self.assertNumQueries(1):
+            response = self.client.get('/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data[0]['title'], 'An Introduction to Python')
+        self.assertEqual(self.client.get('/?page_size=1')['X-Cache'], 'MISS')
+        self.assertEqual(catalog_cache.stats()['misses'], 2)
+
+    def test_manager_writes_invalidate_cached_responses(self):
+        self.client.get('/')
+        Book.objects.update_book_title(self.book.owl_id, 'Python Tricks')
+        response = self.client.get('/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data[0]['title'], 'Python Tricks')
+
+    def test_cached_body_follows_version_of_etag(self):
+        etag = self.client.get('/')['ETag']
+        # a write of another worker: the catalog version is bumped, but catalog_changed is
+        # not sent in this process
+        Book.objects.filter(owl_id=self.book.owl_id).update(title='Python Tricks')
+        bump_catalog_version()
+        response = self.client.get('/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data[0]['title'], 'Python Tricks')
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get('/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_write_in_one_process_invalidates_local_tier_of_other_processes(self):
+        # a worker without a shared tier, which never receives catalog_changed of this one
+        other_process = CatalogCache(local_max_entries=8, local_timeout=60)
+        key, _ = other_process.get('/', get_catalog_version())
+        other_process.set(key, ['An Introduction to Python'])
+        Book.objects.update_book_title(self.book.owl_id, 'Python Tricks')
+        self.assertIsNone(other_process.get('/', get_catalog_version())[1])
+
+    def test_borrowing_invalidates_available_books(self):
+        self.assertEqual(len(self.client.get('/books/available/').data), 1)
+        services.borrow_book(owl_id=self.book.owl_id, user_id=self.user.pk)
+        response = self.client.get('/books/available/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data, [])
+
+    def test_cache_stats_api_requires_admin(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get('/cache/stats/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.get('/')
+        response = self.client.get('/cache/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['misses'], 1)
+
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        author = Author.objects.create(name='Guido van Rossum', is_popular=False)
+        self.book = Book.objects.create(title='An Introduction to Python', author=author)
+        BookCopy.objects.create(book=self.book,
+                                book_copy_type=BookCopy.BOOK_COPY_TYPE.HARDCOVER)
+        self.user = LibraryUser.objects.create(username='NK', password='pass')
+
+    def test_catalog_is_not_modified_until_catalog_changes(self):
+        etag = self.client.get('/')['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        Book.objects.update_book_title(self.book.owl_id, 'Python Tricks')
+        response = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_differs_between_renderers(self):
+        json_etag = self.client.get('/', HTTP_ACCEPT='application/json')['ETag']
+        html_etag = self.client.get('/', HTTP_ACCEPT='text/html')['ETag']
+        self.assertNotEqual(json_etag, html_etag)
+
+    def test_records_are_not_modified_until_records_of_user_change(self):
+        self.client.force_authenticate(user=self.user)
+        etag = self.client.get('/accounts/records/')['ETag']
+        response = self.client.get('/accounts/records/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        other_user = LibraryUser.objects.create(username='JD', password='pass')
+        BorrowRecord.objects.bump_records_version(library_user_id=other_user.pk)
+        response = self.client.get('/accounts/records/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        BorrowRecord.objects.bump_records_version(library_user_id=self.user.pk)
+        # authentication loads the user on every request, force_authenticate does not
+        self.user.refresh_from_db()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/accounts/records/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,65 @@
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from base_app.models import Author, Book, BookCopy, BorrowRecord, LibraryUser
+from rest_api.fieldsets import Fieldset, get_fieldset
+from rest_api.serializers import (BOOK_SHAPE, BORROW_RECORD_SHAPE, get_book_rows,
+                                  get_borrow_record_rows, serialize_book_rows,
+                                  serialize_borrow_record_rows)
+
+
+def _get_fieldset(query_string, shape):
+    request = Request(APIRequestFactory().get(f'/{query_string}'))
+    return get_fieldset(request, shape)
+
+
+class FieldsetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = LibraryUser.objects.create(username='NK', password='pass')
+        author = Author.objects.create(name='Guido van Rossum', is_popular=False)
+        book = Book.objects.create(title='An Introduction to Python', author=author)
+        copy = BookCopy.objects.create(book=book,
+                                       book_copy_type=BookCopy.BOOK_COPY_TYPE.HARDCOVER)
+        BorrowRecord.objects.create(borrow_date='2023-01-31T22:15:30.123456Z',
+                                    return_date='2023-02-14T22:15:30Z', book_copy=copy,
+                                    library_user=user)
+
+    def test_fully_expanded_fieldset_renders_like_default_rows(self):
+        renderer = JSONRenderer()
+        books = Book.objects.all()
+        fieldset = _get_fieldset('?expand=author', BOOK_SHAPE)
+        self.assertEqual(renderer.render(fieldset.serialize_rows(fieldset.get_rows(books))),
+                         renderer.render(serialize_book_rows(get_book_rows(books))))
+        borrow_records = BorrowRecord.objects.all()
+        fieldset = _get_fieldset('?expand=book_copy.book.author', BORROW_RECORD_SHAPE)
+        self.assertEqual(
+            renderer.render(fieldset.serialize_rows(fieldset.get_rows(borrow_records))),
+            renderer.render(serialize_borrow_record_rows(get_borrow_record_rows(
+                            borrow_records))))
+
+    def test_selects_only_lookups_of_selected_fields(self):
+        self.assertEqual(_get_fieldset('?fields=title,owl_id', BOOK_SHAPE).lookups,
+                         ['owl_id', 'title'])
+        self.assertEqual(_get_fieldset('?fields=author', BOOK_SHAPE).lookups, ['author'])
+        self.assertEqual(_get_fieldset('?fields=author&expand=author', BOOK_SHAPE).lookups,
+                         ['author__author_id', 'author__name', 'author__is_popular'])
+        fieldset = _get_fieldset('?fields=book_copy&expand=book_copy', BORROW_RECORD_SHAPE)
+        self.assertEqual(fieldset.lookups, ['book_copy__book_copy_id', 'book_copy__book',
+                                            'book_copy__book_copy_type'])
+
+    def test_unexpanded_relations_are_not_joined(self):
+        fieldset = _get_fieldset('?fields=owl_id,author', BOOK_SHAPE)
+        self.assertNotIn('JOIN', str(fieldset.get_rows(Book.objects.all()).query))
+
+    def test_extra_lookups_are_fetched_but_not_rendered(self):
+        fieldset = Fieldset(BOOK_SHAPE, fields=['owl_id'], extra_lookups=('title', 'owl_id'))
+        self.assertEqual(fieldset.lookups, ['owl_id', 'title'])
+        row = fieldset.get_rows(Book.objects.all())[0]
+        self.assertEqual(row.title, 'An Introduction to Python')
+        self.assertEqual(list(fieldset.serialize_rows([row])[0]), ['owl_id'])
+
+    def test_without_fields_and_expand_there_is_no_fieldset(self):
+        self.assertIsNone(_get_fieldset('', BOOK_SHAPE))
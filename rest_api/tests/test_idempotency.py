@@ -0,0 +1,133 @@
+from unittest import mock
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+from rest_framework.test import APITestCase
+
+import rest_api.services as services
+from base_app.models import Author, Book, BookCopy, BorrowRecord, LibraryUser
+from rest_api.idempotency import IdempotencyStore, idempotency_store
+
+
+class IdempotencyStoreTest(SimpleTestCase):
+    def test_first_request_claims_key_until_it_finishes_or_fails(self):
+        store = IdempotencyStore(max_entries=8, timeout=60)
+        self.assertEqual(store.begin('key', 'fingerprint'), True)
+        self.assertEqual(store.begin('key', 'fingerprint'), False)
+        self.assertEqual(store.get('key'), ('fingerprint', None, None))
+        store.finish('key', 'fingerprint', 200, {'detail': 'done'})
+        self.assertEqual(store.get('key'), ('fingerprint', 200, {'detail': 'done'}))
+        self.assertEqual(store.begin('other key', 'fingerprint'), True)
+        store.abandon('other key')
+        self.assertIsNone(store.get('other key'))
+
+    def test_keeps_at_most_max_entries(self):
+        store = IdempotencyStore(max_entries=2, timeout=60)
+        for key in ['a', 'b', 'c']:
+            store.begin(key, 'fingerprint')
+            store.finish(key, 'fingerprint', 200, key)
+        self.assertIsNone(store.get('a'))
+        self.assertEqual(store.get('c'), ('fingerprint', 200, 'c'))
+
+    def test_shared_cache_dedupes_between_processes(self):
+        shared_cache = LocMemCache('idempotency-test', {})
+        shared_cache.clear()
+        process_1 = IdempotencyStore(max_entries=8, timeout=60, shared_cache=shared_cache,
+                                     in_progress_timeout=10)
+        process_2 = IdempotencyStore(max_entries=8, timeout=60, shared_cache=shared_cache,
+                                     in_progress_timeout=10)
+        self.assertEqual(process_1.begin('key', 'fingerprint'), True)
+        self.assertEqual(process_2.begin('key', 'fingerprint'), False)
+        process_1.finish('key', 'fingerprint', 200, 'response')
+        self.assertEqual(process_2.get('key'), ('fingerprint', 200, 'response'))
+
+
+class IdempotentViewsTest(APITestCase):
+    def setUp(self):
+        idempotency_store.local.clear()
+        author = Author.objects.create(name='Guido van Rossum', is_popular=False)
+        self.book = Book.objects.create(title='An Introduction to Python', author=author)
+        BookCopy.objects.create(book=self.book,
+                                book_copy_type=BookCopy.BOOK_COPY_TYPE.HARDCOVER)
+        self.user = LibraryUser.objects.create(username='NK', password='pass')
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        idempotency_store.local.clear()
+
+    def _borrow(self, idempotency_key, owl_id=None):
+        owl_id = self.book.owl_id if owl_id is None else owl_id
+        return self.client.post('/accounts/borrow/', {'owl_id': f'{owl_id}'},
+                                HTTP_IDEMPOTENCY_KEY=idempotency_key)
+
+    def test_retried_borrow_is_answered_from_store(self):
+        response = self._borrow('kiosk-1-0001')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', response)
+        with mock.patch('rest_api.services.borrow_book') as mocked_func:
+            retried_response = self._borrow('kiosk-1-0001')
+            mocked_func.assert_not_called()
+        self.assertEqual(retried_response.status_code, 200)
+        self.assertEqual(retried_response['Idempotent-Replayed'], 'true')
+        self.assertEqual(retried_response.json(), response.json())
+        self.assertEqual(BorrowRecord.objects.count(), 1)
+
+    def test_retry_reaching_another_process_is_answered_from_store(self):
+        response = self._borrow('kiosk-1-0001')
+        self.assertEqual(response.status_code, 200)
+        # the store of another worker, which shares nothing with this one but the database
+        with mock.patch('rest_api.idempotency.idempotency_store',
+                        IdempotencyStore.from_settings()):
+            retried_response = self._borrow('kiosk-1-0001')
+        self.assertEqual(retried_response.status_code, 200)
+        self.assertEqual(retried_response['Idempotent-Replayed'], 'true')
+        self.assertEqual(BorrowRecord.objects.count(), 1)
+
+    def test_retried_return_is_answered_from_store(self):
+        services.borrow_book(owl_id=self.book.owl_id, user_id=self.user.pk)
+        for _ in range(2):
+            response = self.client.put('/accounts/return/', {'owl_id': f'{self.book.owl_id}'},
+                                       HTTP_IDEMPOTENCY_KEY='kiosk-1-0002')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, 'Book returned successfully')
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+
+    def test_key_is_scoped_to_user(self):
+        BookCopy.objects.create(book=self.book,
+                                book_copy_type=BookCopy.BOOK_COPY_TYPE.PAPERBACK)
+        self._borrow('kiosk-1-0003')
+        other_user = LibraryUser.objects.create(username='JD', password='pass')
+        self.client.force_authenticate(user=other_user)
+        response = self._borrow('kiosk-1-0003')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(BorrowRecord.objects.count(), 2)
+
+    def test_key_reused_with_different_payload_is_rejected(self):
+        self._borrow('kiosk-1-0004')
+        response = self._borrow('kiosk-1-0004', owl_id='00000000-0000-0000-0000-000000000000')
+        self.assertEqual(response.status_code, 422)
+
+    def test_retry_while_first_request_runs_is_rejected(self):
+        def borrow_book(owl_id, user_id):
+            self.retried_response = self._borrow('kiosk-1-0005')
+            return BorrowRecord.objects.none()
+        with mock.patch('rest_api.services.borrow_book', side_effect=borrow_book):
+            self._borrow('kiosk-1-0005')
+        self.assertEqual(self.retried_response.status_code, 409)
+
+    def test_failed_request_is_not_stored(self):
+        BookCopy.objects.update(is_lent=True)
+        self.assertEqual(self._borrow('kiosk-1-0006').status_code, 500)
+        BookCopy.objects.update(is_lent=False)
+        response = self._borrow('kiosk-1-0006')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_requests_without_key_are_not_deduplicated(self):
+        self.client.post('/accounts/borrow/', {'owl_id': f'{self.book.owl_id}'})
+        response = self.client.post('/accounts/borrow/', {'owl_id': f'{self.book.owl_id}'})
+        self.assertEqual(response.status_code, 500)
+
+    def test_overlong_key_is_rejected(self):
+        self.assertEqual(self._borrow('k'*256).status_code, 400)
@@ -0,0 +1,72 @@
+import io
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from rest_api.negotiation import FirstRendererContentNegotiation
+from rest_api.parsers import FastJSONParser
+from rest_api.renderers import FastJSONRenderer
+
+
+class FastJSONRendererTest(SimpleTestCase):
+    data = [{'owl_id': uuid.UUID('0f1e2d3c-4b5a-6978-8796-a5b4c3d2e1f0'),
+             'author': {'name': 'Jürgen “JS” Schmidt', 'is_popular': True},
+             'title': 'line\u2028separator \'"\\',
+             'copies': (1, 2),
+             'price': Decimal('9.99'),
+             'borrow_date': '2023-01-31T22:15:30.123456Z',
+             'return_date': None}]
+
+    def test_renders_like_json_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(self.data),
+                         JSONRenderer().render(self.data))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_renders_datetimes_natively_with_microseconds(self):
+        borrow_date = datetime(2023, 1, 31, 22, 15, 30, 123456, tzinfo=dt_timezone.utc)
+        self.assertEqual(FastJSONRenderer().render({'borrow_date': borrow_date}),
+                         b'{"borrow_date":"2023-01-31T22:15:30.123456Z"}')
+
+    def test_indented_output_is_left_to_json_renderer(self):
+        renderer_context = {'indent': 4}
+        self.assertEqual(FastJSONRenderer().render(self.data, 'application/json',
+                                                   renderer_context),
+                         JSONRenderer().render(self.data, 'application/json',
+                                               renderer_context))
+
+    @mock.patch('rest_api.renderers.orjson', None)
+    def test_falls_back_to_json_renderer_without_orjson(self):
+        self.assertEqual(FastJSONRenderer().render(self.data),
+                         JSONRenderer().render(self.data))
+
+
+class FastJSONParserTest(SimpleTestCase):
+    def test_parses_utf8_body(self):
+        body = '{"owl_ids": ["a", "b"], "name": "Jürgen"}'.encode()
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)),
+                         {'owl_ids': ['a', 'b'], 'name': 'Jürgen'})
+
+    def test_malformed_body_raises_parse_error(self):
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"owl_ids": ['))
+
+    def test_other_encodings_are_left_to_json_parser(self):
+        body = '{"name": "Jürgen"}'.encode('latin-1')
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body),
+                                                parser_context={'encoding': 'latin-1'}),
+                         {'name': 'Jürgen'})
+
+
+class FirstRendererContentNegotiationTest(SimpleTestCase):
+    def test_ignores_accept_header(self):
+        request = APIRequestFactory().get('/', HTTP_ACCEPT='text/html')
+        renderer, media_type = FirstRendererContentNegotiation().select_renderer(
+                               request, [FastJSONRenderer(), BrowsableAPIRenderer()])
+        self.assertIsInstance(renderer, FastJSONRenderer)
+        self.assertEqual(media_type, 'application/json')
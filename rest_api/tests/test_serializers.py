@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.test import TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+
+from base_app.models import Author, Book, BookCopy, BorrowRecord, LibraryUser
+from rest_api.serializers import (BookSerializer, BorrowRecordSerializer, get_book_rows,
+                                  get_borrow_record_rows, serialize_book_rows,
+                                  serialize_borrow_record_rows)
+
+
+class RowSerializersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = LibraryUser.objects.create(username='NK', password='pass')
+        authors = [Author.objects.create(name='Guido van Rossum', is_popular=False),
+                   Author.objects.create(name='Jürgen “JS” Schmidt', is_popular=True)]
+        borrow_date = datetime(2023, 1, 31, 22, 15, 30, 123456, tzinfo=dt_timezone.utc)
+        for i, book_copy_type in enumerate(BookCopy.BOOK_COPY_TYPE.values):
+            book = Book.objects.create(title=f'Book {i}   \'"', author=authors[i % 2])
+            copy = BookCopy.objects.create(book=book, book_copy_type=book_copy_type)
+            BorrowRecord.objects.create(borrow_date=borrow_date+timedelta(days=i),
+                                        return_date=borrow_date+timedelta(days=i+14),
+                                        is_returned=i % 2 == 0, book_copy=copy,
+                                        library_user=cls.user)
+
+    def assertRendersIdentically(self, data, expected_data):
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(data), renderer.render(expected_data))
+
+    def test_book_rows_render_like_book_serializer(self):
+        books = Book.objects.select_related('author').order_by('title')
+        self.assertRendersIdentically(serialize_book_rows(get_book_rows(books)),
+                                      BookSerializer(books, many=True).data)
+
+    def test_borrow_record_rows_render_like_borrow_record_serializer(self):
+        borrow_records = BorrowRecord.objects.select_related('book_copy__book__author') \
+                                             .order_by('borrow_date')
+        for time_zone in ['Asia/Kolkata', 'UTC']:
+            with self.subTest(time_zone=time_zone), override_settings(TIME_ZONE=time_zone):
+                self.assertRendersIdentically(
+                    serialize_borrow_record_rows(get_borrow_record_rows(borrow_records)),
+                    BorrowRecordSerializer(borrow_records, many=True).data)
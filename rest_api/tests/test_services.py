@@ -1,8 +1,13 @@
+import itertools
+import threading
+import uuid
 from datetime import timedelta
 from unittest import mock
 
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase
 from django.utils import timezone
 
 import rest_api.services as services
@@ -48,79 +53,21 @@ class HelperFunctionsTest(TestCase):
         Book.objects.all().delete()
         Author.objects.all().delete()
 
-    def test__is_author_popular_returns_valid_result(self):
-        result_1_should_be_true = services._is_author_popular('Jack Black')
-        result_2_should_be_true = services._is_author_popular('jonas brothers')
-        result_3_should_be_false = services._is_author_popular('Black Panther')
-        result_4_should_be_false = services._is_author_popular('')
-        self.assertEqual(result_1_should_be_true, True)
-        self.assertEqual(result_2_should_be_true, True)
-        self.assertEqual(result_3_should_be_false, False)
-        self.assertEqual(result_4_should_be_false, False)
-
-    def test__is_popular_raises_exception_for_invalid_arguments(self):
-        self.assertRaises(ValidationError, services._is_author_popular, 1)
-
-    def test__get_distinct_book_copy_ids_of_borrowed_books(self):
-        expected_ids = []
-        expected_ids.append(BookCopy.objects.get(book__title='A Tour of C++').book_copy_id)
-        expected_ids.append(
-            BookCopy.objects.get(book__title='An Introduction to Python').book_copy_id)
-        returned_ids = services._get_distinct_book_copy_ids_of_borrowed_books()
-        self.assertTrue(len(returned_ids), len(expected_ids))
-        for id in returned_ids:
-            self.assertTrue(id in expected_ids)
-
     def test__create_new_borrow_record(self):
-        created_record = services._create_new_borrow_record(
-                            self.popular_book.owl_id, self.user.username)
+        created_record = services._create_new_borrow_record(self.copy, self.user.pk)
         self.assertEqual(created_record.book_copy.book_copy_id, self.copy.book_copy_id)
         self.assertEqual(created_record.library_user.username, self.user.username)
         borrow_date = created_record.borrow_date
         expected_return_date = borrow_date+timedelta(days=self.return_days)
         self.assertEqual(created_record.return_date, expected_return_date)
-
-    def test__get_cool_down_period_of_popular_author_in_days(self):
-        expected_duration = self.popular_cd
-        returned_duration = services._get_cool_down_period_of_popular_author_in_days()
-        self.assertEqual(returned_duration, expected_duration)
-
-    def test__get_cool_down_period_of_normal_author_in_days(self):
-        expected_duration = self.normal_cd
-        returned_duration = services._get_cool_down_period_of_normal_author_in_days()
-        self.assertEqual(returned_duration, expected_duration)
-
-    def test__get_cool_down_period_in_days(self):
-        expected_duration = self.popular_cd
-        owl_id_of_book_with_popular_author = self.popular_book.owl_id
-        returned_duration = services._get_cool_down_period_in_days(
-                            owl_id=owl_id_of_book_with_popular_author)
-        self.assertEqual(returned_duration, expected_duration)
-        expected_duration = self.normal_cd
-        owl_id_of_book_with_normal_author = self.normal_book.owl_id
-        returned_duration = services._get_cool_down_period_in_days(
-                            owl_id=owl_id_of_book_with_normal_author)
-        self.assertEqual(returned_duration, expected_duration)
-
-    def test__get_cool_down_period_end_date(self):
-        borrow_date = timezone.now()
-        returned_date = services._get_cool_down_period_end_date(
-                        previous_borrow_date=borrow_date, owl_id=self.normal_book.owl_id)
-        self.assertEqual(returned_date, borrow_date+timedelta(days=self.normal_cd))
-
-    def test__can_borrow_book_again(self):
-        borrow_date = timezone.now()
-        result = services._can_borrow_book_again(
-                    previous_borrow_date=borrow_date, owl_id=self.normal_book.owl_id)
-        self.assertEqual(result, False)
-        borrow_date = timezone.now()-timedelta(days=self.normal_cd)
-        result = services._can_borrow_book_again(
-                    previous_borrow_date=borrow_date, owl_id=self.normal_book.owl_id)
-        self.assertEqual(result, True)
+        self.assertEqual(created_record.next_eligible_borrow_date,
+                         borrow_date+timedelta(days=self.popular_cd))
 
     def test__borrow_book_again(self):
         borrow_record = self.normal_borrow_record
-        updated_borrow_record = services._borrow_book_again(borrow_record.borrow_record_id)
+        updated_borrow_record = services._borrow_book_again(
+                                borrow_record.borrow_record_id, borrow_record.book_copy_id,
+                                borrow_record.book_id, self.normal_book.author.name)
         self.assertEqual(updated_borrow_record.book_copy.book_copy_id,
                          borrow_record.book_copy.book_copy_id)
         self.assertEqual(updated_borrow_record.library_user.username,
@@ -128,11 +75,23 @@ class HelperFunctionsTest(TestCase):
         borrow_date = updated_borrow_record.borrow_date
         self.assertEqual(updated_borrow_record.return_date,
                          borrow_date+timedelta(days=self.return_days))
+        self.assertEqual(updated_borrow_record.next_eligible_borrow_date,
+                         borrow_date+timedelta(days=self.normal_cd))
+
+    def test__get_next_eligible_borrow_date(self):
+        borrow_record = self.normal_borrow_record
+        self.assertEqual(services._get_next_eligible_borrow_date(
+                         borrow_record, self.normal_book.author.name),
+                         borrow_record.borrow_date+timedelta(days=self.normal_cd))
+        borrow_record.next_eligible_borrow_date = borrow_record.borrow_date
+        self.assertEqual(services._get_next_eligible_borrow_date(
+                         borrow_record, self.normal_book.author.name),
+                         borrow_record.borrow_date)
 
     def test__get_previous_borrow_record(self):
         borrow_record = self.normal_borrow_record
         returned_record = services._get_previous_borrow_record(
-                            owl_id=self.normal_book.owl_id, username=self.normal_user.username)
+                            owl_id=self.normal_book.owl_id, user_id=self.normal_user.pk)
         self.assertEqual(returned_record.borrow_date, borrow_record.borrow_date)
         self.assertEqual(returned_record.return_date, borrow_record.return_date)
         self.assertEqual(returned_record.book_copy.book_copy_id,
@@ -140,31 +99,23 @@ class HelperFunctionsTest(TestCase):
         self.assertEqual(returned_record.library_user.username,
                          borrow_record.library_user.username)
         returned_record = services._get_previous_borrow_record(
-                            owl_id=None, username=self.normal_user.username)
+                            owl_id=None, user_id=self.normal_user.pk)
         self.assertEqual(returned_record, None)
 
     @mock.patch('rest_api.services._borrow_book_again')
-    @mock.patch('rest_api.services._can_borrow_book_again')
-    def test__try_update_borrow_record_successful_updation(self, mocked_func_bottom,
-                                                           mocked_func_top):
-        mocked_func_bottom.return_value = True
-        owl_id = self.normal_book.owl_id
-        borrow_date = self.normal_borrow_record.borrow_date-timedelta(days=self.normal_cd)
-        borrow_record_id = self.normal_borrow_record.borrow_record_id
-        services._try_update_borrow_record(
-            owl_id=owl_id, borrow_date=borrow_date, borrow_record_id=borrow_record_id)
-        mocked_func_bottom.assert_called_with(borrow_date, owl_id)
-        mocked_func_top.assert_called_with(borrow_record_id)
-
-    @mock.patch('rest_api.services._can_borrow_book_again')
-    def test__try_update_borrow_record_raises_exception(self, mocked_func):
-        mocked_func.return_value = False
-        owl_id = self.normal_book.owl_id
-        borrow_date = self.normal_borrow_record.borrow_date-timedelta(days=self.normal_cd)
-        borrow_record_id = self.normal_borrow_record.borrow_record_id
+    def test__try_update_borrow_record_successful_updation(self, mocked_func):
+        borrow_record = self.normal_borrow_record
+        book_copy = borrow_record.book_copy
+        borrow_record.next_eligible_borrow_date = timezone.now()-timedelta(days=1)
+        services._try_update_borrow_record(book_copy=book_copy, borrow_record=borrow_record)
+        mocked_func.assert_called_with(borrow_record.borrow_record_id, book_copy.book_copy_id,
+                                       book_copy.book_id, self.normal_book.author.name)
+
+    def test__try_update_borrow_record_raises_exception(self):
+        borrow_record = self.normal_borrow_record
+        borrow_record.next_eligible_borrow_date = timezone.now()+timedelta(days=1)
         self.assertRaises(ValidationError, services._try_update_borrow_record,
-                          owl_id=owl_id, borrow_date=borrow_date,
-                          borrow_record_id=borrow_record_id)
+                          book_copy=borrow_record.book_copy, borrow_record=borrow_record)
 
     def test__validate_book_owl_id_does_not_raise_exception(self):
         self.assertEqual(services._validate_book_owl_id(self.normal_book.owl_id), None)
@@ -226,6 +177,20 @@ class HttpEndpointFunctionsTest(TestCase):
         for book in returned_books:
             self.assertTrue(book in expected_books)
 
+    def test_get_all_available_books_skips_books_without_copies(self):
+        author = Author.objects.create(name='Brian Kernighan', is_popular=False)
+        Book.objects.create(title='The C Programming Language', author=author)
+        returned_books = services.get_all_available_books()
+        self.assertEqual([book.owl_id for book in returned_books], [self.popular_book.owl_id])
+
+    def test_get_all_available_books_follows_borrow_and_return(self):
+        services.borrow_book(owl_id=self.popular_book.owl_id, user_id=self.user.pk)
+        self.assertEqual(len(services.get_all_available_books()), 0)
+        services.return_book(owl_id=self.normal_book.owl_id,
+                             user_id=self.normal_user.pk)
+        returned_books = services.get_all_available_books()
+        self.assertEqual([book.owl_id for book in returned_books], [self.normal_book.owl_id])
+
     def test_get_all_books_by_similar_author_name(self):
         expected_books = [self.normal_book]
         returned_books = services.get_all_books_by_similar_author_name('Guido van Rossum')
@@ -236,9 +201,9 @@ class HttpEndpointFunctionsTest(TestCase):
     @mock.patch('rest_api.services._get_previous_borrow_record', return_value=None)
     @mock.patch('rest_api.services._create_new_borrow_record')
     def test_borrow_book_creates_new_borrow_record(self, mocked_func_bottom, mocked_func_top):
-        services.borrow_book(owl_id=self.popular_book.owl_id, username=self.user.username)
-        mocked_func_top.assert_called_with(self.popular_book.owl_id, self.user.username)
-        mocked_func_bottom.assert_called_with(self.popular_book.owl_id, self.user.username)
+        services.borrow_book(owl_id=self.popular_book.owl_id, user_id=self.user.pk)
+        mocked_func_top.assert_called_with(self.popular_book.owl_id, self.user.pk)
+        mocked_func_bottom.assert_called_with(self.copy, self.user.pk)
 
     @mock.patch('rest_api.services._get_previous_borrow_record')
     @mock.patch('rest_api.services._try_update_borrow_record')
@@ -246,36 +211,74 @@ class HttpEndpointFunctionsTest(TestCase):
                                                         mocked_func_top):
         borrow_record = BorrowRecord.objects.get(
                         book_copy__book__owl_id=self.normal_book.owl_id)
+        borrow_record.is_returned = True
         mocked_func_top.return_value = borrow_record
-        services.borrow_book(owl_id=self.popular_book.owl_id, username=self.user.username)
-        mocked_func_top.assert_called_with(self.popular_book.owl_id, self.user.username)
-        mocked_func_bottom.assert_called_with(self.popular_book.owl_id,
-                                              borrow_record.borrow_date,
-                                              borrow_record.borrow_record_id)
+        services.borrow_book(owl_id=self.popular_book.owl_id, user_id=self.user.pk)
+        mocked_func_top.assert_called_with(self.popular_book.owl_id, self.user.pk)
+        mocked_func_bottom.assert_called_with(self.copy, borrow_record)
+
+    def test_borrow_book_raises_exception_for_book_already_borrowed(self):
+        self.assertRaises(ValidationError, services.borrow_book,
+                          owl_id=self.normal_book.owl_id, user_id=self.user.pk)
+
+    def test_borrow_book_renews_returned_borrow_record(self):
+        borrow_record_id = self.normal_borrow_record.borrow_record_id
+        BorrowRecord.objects.update_dates_and_status(
+            borrow_record_id=borrow_record_id,
+            borrow_date=timezone.now()-timedelta(days=self.normal_cd+1),
+            return_date=timezone.now()-timedelta(days=self.normal_cd+1-self.return_days),
+            return_status=True)
+        renewed_record = services.borrow_book(owl_id=self.normal_book.owl_id,
+                                              user_id=self.normal_user.pk)
+        self.assertEqual(renewed_record.borrow_record_id, borrow_record_id)
+        self.assertEqual(renewed_record.is_returned, False)
+        self.assertEqual(renewed_record.return_date,
+                         renewed_record.borrow_date+timedelta(days=self.return_days))
 
     def test_return_book_successfully(self):
         rows_affected = services.return_book(self.normal_book.owl_id,
-                                             self.normal_user.username)
+                                             self.normal_user.pk)
         self.assertEqual(rows_affected, True)
 
     def test_return_book_raises_exception_for_invalid_input(self):
-        self.assertRaises(Exception, services.return_book, None, self.normal_user.username)
+        self.assertRaises(Exception, services.return_book, None, self.normal_user.pk)
         self.assertRaises(Exception, services.return_book, None, None)
 
+    def test_borrow_and_return_book_write_copy_and_counter_directly(self):
+        owl_id = self.popular_book.owl_id
+        records_version = LibraryUser.objects.get(pk=self.user.pk).records_version
+        # lock and bump the user, previous record, free copy, insert, copy, counter and the
+        # catalog version, plus the savepoint of borrow_book and its release
+        with self.assertNumQueries(9):
+            borrow_record = services.borrow_book(owl_id=owl_id, user_id=self.user.pk)
+        self.assertEqual(BookCopy.objects.get(pk=self.copy.pk).is_lent, True)
+        self.assertEqual(Book.objects.get(owl_id=owl_id).available_copies, 0)
+        self.assertEqual(BorrowRecord.objects.get(pk=borrow_record.pk).book_id, owl_id)
+        # lock and bump the user, record, mark it returned, copy, counter, catalog version
+        with self.assertNumQueries(8):
+            self.assertEqual(services.return_book(owl_id=owl_id, user_id=self.user.pk), True)
+        self.assertEqual(BookCopy.objects.get(pk=self.copy.pk).is_lent, False)
+        self.assertEqual(Book.objects.get(owl_id=owl_id).available_copies, 1)
+        self.assertEqual(LibraryUser.objects.get(pk=self.user.pk).records_version,
+                         records_version+2)
+        # returning it again changes nothing
+        self.assertEqual(services.return_book(owl_id=owl_id, user_id=self.user.pk), True)
+        self.assertEqual(Book.objects.get(owl_id=owl_id).available_copies, 1)
+
     @mock.patch('rest_api.services._validate_book_owl_id')
     def test_get_next_borrow_date(self, mocked_func):
         owl_id = self.normal_book.owl_id
         popular_owl_id = self.popular_book.owl_id
-        username = self.normal_user.username
+        user_id = self.normal_user.pk
         borrow_record_id = self.normal_borrow_record.borrow_record_id
         borrow_date = self.normal_borrow_record.borrow_date
         return_date = self.normal_borrow_record.return_date
 
-        result = services.get_next_borrow_date(owl_id=popular_owl_id, username=username)
+        result = services.get_next_borrow_date(owl_id=popular_owl_id, user_id=user_id)
         mocked_func.assert_called_with(owl_id=popular_owl_id)
         self.assertEqual(result, 'You can borrow this book immediately')
 
-        result = services.get_next_borrow_date(owl_id=owl_id, username=username)
+        result = services.get_next_borrow_date(owl_id=owl_id, user_id=user_id)
         mocked_func.assert_called_with(owl_id=owl_id)
         self.assertEqual(result, 'You have not returned this book yet, kindly return it first')
 
@@ -283,7 +286,7 @@ class HttpEndpointFunctionsTest(TestCase):
                                                   return_status=True)
         d = borrow_date+timedelta(days=self.normal_cd)
         expected_date_string = f'{d.day}/{d.month}/{d.year}'
-        result = services.get_next_borrow_date(owl_id=owl_id, username=username)
+        result = services.get_next_borrow_date(owl_id=owl_id, user_id=user_id)
         self.assertEqual(result, f'You can borrow this book again on {expected_date_string}')
 
         BorrowRecord.objects.update_dates_and_status(
@@ -291,10 +294,235 @@ class HttpEndpointFunctionsTest(TestCase):
             borrow_date=borrow_date-timedelta(days=self.normal_cd),
             return_date=return_date-timedelta(days=self.normal_cd),
             return_status=True)
-        result = services.get_next_borrow_date(owl_id=owl_id, username=username)
+        result = services.get_next_borrow_date(owl_id=owl_id, user_id=user_id)
         self.assertEqual(result, 'Book is now available, you can borrow it immediately')
 
-    @mock.patch('base_app.models.BorrowRecord.objects.get_all_borrow_records_by_username')
+    def test_get_next_borrow_dates_agrees_with_get_next_borrow_date(self):
+        user_id = self.normal_user.pk
+        borrow_record_id = self.normal_borrow_record.borrow_record_id
+        borrow_date = self.normal_borrow_record.borrow_date
+        return_date = self.normal_borrow_record.return_date
+        owl_ids = [self.normal_book.owl_id, self.popular_book.owl_id, uuid.uuid4()]
+        borrow_dates = [borrow_date, borrow_date-timedelta(days=self.normal_cd)]
+        # between the two cool-down periods: over for normal, not yet for popular authors
+        BorrowRecord.objects.create(
+            borrow_date=borrow_date-timedelta(days=self.normal_cd+1), return_date=return_date,
+            is_returned=True, book_copy=BookCopy.objects.get(book=self.popular_book),
+            library_user=self.normal_user)
+
+        for is_returned, borrow_date in itertools.product([False, True], borrow_dates):
+            BorrowRecord.objects.update_dates_and_status(
+                borrow_record_id=borrow_record_id, borrow_date=borrow_date,
+                return_date=return_date, return_status=is_returned)
+            with self.assertNumQueries(2):
+                result = services.get_next_borrow_dates(owl_ids=owl_ids, user_id=user_id)
+            self.assertEqual(result, {
+                str(owl_id): services.get_next_borrow_date(owl_id=owl_id, user_id=user_id)
+                for owl_id in owl_ids[:2]} | {str(owl_ids[2]): 'Book does not exist'})
+
+    def test_get_next_borrow_dates_raises_exception_for_invalid_input(self):
+        user_id = self.normal_user.pk
+        self.assertRaises(ValidationError, services.get_next_borrow_dates, [], user_id)
+        self.assertRaises(ValidationError, services.get_next_borrow_dates, ['1'], user_id)
+        self.assertRaises(ValidationError, services.get_next_borrow_dates,
+                          [uuid.uuid4() for _ in range(101)], user_id)
+
+    @mock.patch('base_app.models.BorrowRecord.objects.get_all_borrow_records_by_user_id')
     def test_get_my_borrow_records(self, mocked_func):
-        services.get_my_borrow_records(username=self.normal_user.username)
-        mocked_func.assert_called_with(username=self.normal_user.username)
+        services.get_my_borrow_records(user_id=self.normal_user.pk)
+        mocked_func.assert_called_with(user_id=self.normal_user.pk)
+
+
+class BatchBorrowReturnTest(TestCase):
+    def setUp(self):
+        self.user = LibraryUser.objects.create(username='NK', password='pass')
+        self.books = []
+        for i in range(6):
+            author = Author.objects.create(name=f'Author {i}', is_popular=False)
+            book = Book.objects.create(title=f'Book {i}', author=author)
+            for _ in range(2):
+                BookCopy.objects.create(book=book,
+                                        book_copy_type=BookCopy.BOOK_COPY_TYPE.PAPERBACK)
+            self.books.append(book)
+
+    def _borrow_and_return(self, book, borrow_date):
+        borrow_record = services.borrow_book(owl_id=book.owl_id, user_id=self.user.pk)
+        services.return_book(owl_id=book.owl_id, user_id=self.user.pk)
+        BorrowRecord.objects.update_dates_and_status(
+            borrow_record_id=borrow_record.borrow_record_id, borrow_date=borrow_date,
+            return_date=borrow_date+timedelta(days=14), return_status=True)
+
+    def test_borrow_books_reports_result_per_book(self):
+        not_returned_book, renewable_book, too_frequent_book, lent_out_book = self.books[:4]
+        services.borrow_book(owl_id=not_returned_book.owl_id, user_id=self.user.pk)
+        self._borrow_and_return(renewable_book, timezone.now()-timedelta(days=91))
+        self._borrow_and_return(too_frequent_book, timezone.now()-timedelta(days=1))
+        for username in ['JD', 'JG']:
+            user = LibraryUser.objects.create(username=username, password='pass')
+            services.borrow_book(owl_id=lent_out_book.owl_id, user_id=user.pk)
+        missing_owl_id = uuid.uuid4()
+        owl_ids = [book.owl_id for book in self.books]+[missing_owl_id]
+
+        results = services.borrow_books(owl_ids=owl_ids, user_id=self.user.pk)
+        self.assertEqual(list(results), [str(owl_id) for owl_id in owl_ids])
+        details = {owl_id: result.get('detail') for owl_id, result in results.items()}
+        self.assertEqual(details[str(not_returned_book.owl_id)],
+                         'You have not returned this book yet, kindly return it first')
+        self.assertEqual(details[str(too_frequent_book.owl_id)],
+                         'Cannot borrow book again too frequently')
+        self.assertEqual(details[str(lent_out_book.owl_id)],
+                         'All copies of this book are borrowed, please try again later')
+        self.assertEqual(details[str(missing_owl_id)], 'Book does not exist')
+
+        borrowed_books = [renewable_book]+self.books[4:]
+        for book in borrowed_books:
+            result = results[str(book.owl_id)]
+            self.assertEqual(result['success'], True)
+            borrow_record = BorrowRecord.objects.get(borrow_record_id=(
+                                                     result['borrow_record'].borrow_record_id))
+            self.assertEqual(borrow_record.is_returned, False)
+            self.assertEqual(borrow_record.book_copy.is_lent, True)
+            self.assertEqual(borrow_record.book_copy.book_id, book.owl_id)
+            self.assertEqual(borrow_record.next_eligible_borrow_date,
+                             borrow_record.borrow_date+timedelta(days=90))
+            book.refresh_from_db()
+            self.assertEqual(book.available_copies, 1)
+        self.assertEqual(BorrowRecord.objects.filter(library_user=self.user,
+                                                     book_copy__is_lent=True).count(), 4)
+
+    def test_borrow_books_runs_constant_number_of_queries(self):
+        self._borrow_and_return(self.books[0], timezone.now()-timedelta(days=91))
+        self._borrow_and_return(self.books[1], timezone.now()-timedelta(days=91))
+        with CaptureQueriesContext(connection) as few_books:
+            services.borrow_books(owl_ids=[self.books[0].owl_id, self.books[2].owl_id],
+                                  user_id=self.user.pk)
+        services.return_books(owl_ids=[self.books[0].owl_id], user_id=self.user.pk)
+        BorrowRecord.objects.filter(library_user=self.user).update(
+            next_eligible_borrow_date=timezone.now()-timedelta(days=1))
+        with CaptureQueriesContext(connection) as many_books:
+            services.borrow_books(owl_ids=[book.owl_id for book in self.books],
+                                  user_id=self.user.pk)
+        self.assertEqual(len(many_books), len(few_books))
+
+    def test_return_books_reports_result_per_book(self):
+        borrowed_books = self.books[:3]
+        services.borrow_books(owl_ids=[book.owl_id for book in borrowed_books],
+                              user_id=self.user.pk)
+        owl_ids = [book.owl_id for book in self.books[:4]]
+        results = services.return_books(owl_ids=owl_ids, user_id=self.user.pk)
+        self.assertEqual([result['success'] for result in results.values()],
+                         [True, True, True, False])
+        self.assertEqual(BookCopy.objects.filter(is_lent=True).count(), 0)
+        for book in borrowed_books:
+            book.refresh_from_db()
+            self.assertEqual(book.available_copies, 2)
+        results = services.return_books(owl_ids=owl_ids[:1], user_id=self.user.pk)
+        self.assertEqual(results[str(owl_ids[0])],
+                         {'success': False, 'detail': 'You have already returned this book'})
+
+    def test_batch_services_raise_exception_for_invalid_input(self):
+        user_id = self.user.pk
+        self.assertRaises(ValidationError, services.borrow_books, None, user_id)
+        self.assertRaises(ValidationError, services.borrow_books, 'not a list', user_id)
+        self.assertRaises(ValidationError, services.return_books, ['1'], user_id)
+
+
+class BorrowBookConcurrencyTest(TransactionTestCase):
+    number_of_threads = 8
+    number_of_books = 4
+
+    def setUp(self):
+        self.books = []
+        for i in range(self.number_of_books):
+            author = Author.objects.create(name=f'Author {i}', is_popular=False)
+            book = Book.objects.create(title=f'Book {i}', author=author)
+            BookCopy.objects.create(book=book,
+                                    book_copy_type=BookCopy.BOOK_COPY_TYPE.PAPERBACK)
+            self.books.append(book)
+        self.users = [LibraryUser.objects.create(username=f'user{i}', password='pass')
+                      for i in range(self.number_of_threads)]
+
+    # runs target(index) on every thread at once, each thread uses its own db connection
+    def _run_concurrently(self, target):
+        barrier = threading.Barrier(self.number_of_threads)
+
+        def run(index):
+            try:
+                barrier.wait()
+                target(index)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(i,))
+                   for i in range(self.number_of_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_concurrent_borrowers_of_same_copy_never_double_borrow(self):
+        owl_id = self.books[0].owl_id
+        successes = []
+
+        def borrow(index):
+            try:
+                services.borrow_book(owl_id=owl_id, user_id=self.users[index].pk)
+                successes.append(index)
+            except Exception:
+                pass
+
+        self._run_concurrently(borrow)
+        self.assertEqual(len(successes), 1)
+        self.assertEqual(BorrowRecord.objects.filter(book_copy__book__owl_id=owl_id,
+                                                     is_returned=False).count(), 1)
+        self.assertEqual(Book.objects.get(owl_id=owl_id).available_copies, 0)
+
+    def test_concurrent_borrowers_of_same_title_get_distinct_copies(self):
+        book = self.books[0]
+        number_of_copies = 3
+        for i in range(number_of_copies-1):
+            BookCopy.objects.create(book=book,
+                                    book_copy_type=BookCopy.BOOK_COPY_TYPE.HARDCOVER)
+        borrow_records = []
+
+        def borrow(index):
+            try:
+                borrow_records.append(services.borrow_book(
+                    owl_id=book.owl_id, user_id=self.users[index].pk))
+            except Exception:
+                pass
+
+        self._run_concurrently(borrow)
+        self.assertEqual(len(borrow_records), number_of_copies)
+        lent_book_copy_ids = {borrow_record.book_copy_id for borrow_record in borrow_records}
+        self.assertEqual(len(lent_book_copy_ids), number_of_copies)
+        self.assertEqual(Book.objects.get(owl_id=book.owl_id).available_copies, 0)
+        self.assertEqual(BookCopy.objects.filter(book=book, is_lent=True).count(),
+                         number_of_copies)
+
+    # python -m benchmarks.borrow_contention reports the throughput of this workload
+    def test_borrow_and_return_under_contention_keeps_copies_consistent(self):
+        # every user walks over all books starting at a different offset, so threads keep
+        # colliding on the same copies while they borrow and immediately return them
+        successes = []
+        rejections = []
+
+        def borrow_and_return(index):
+            user_id = self.users[index].pk
+            for i in range(self.number_of_books):
+                owl_id = self.books[(index+i) % self.number_of_books].owl_id
+                try:
+                    services.borrow_book(owl_id=owl_id, user_id=user_id)
+                except Exception:
+                    rejections.append(index)
+                    continue
+                successes.append(index)
+                services.return_book(owl_id=owl_id, user_id=user_id)
+
+        self._run_concurrently(borrow_and_return)
+
+        attempts = len(successes)+len(rejections)
+        self.assertEqual(attempts, self.number_of_threads*self.number_of_books)
+        self.assertEqual(BorrowRecord.objects.count(), len(successes))
+        self.assertEqual(BorrowRecord.objects.filter(is_returned=False).count(), 0)
+        self.assertEqual(Book.objects.filter(available_copies=1).count(), self.number_of_books)
@@ -0,0 +1,71 @@
+import json
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from base_app.models import Author, Book, BookCopy, BorrowRecord, LibraryUser
+from rest_api.serializers import BookSerializer, get_book_rows, serialize_book_rows
+from rest_api.streaming import stream_response
+
+
+class StreamingResponseTest(APITestCase):
+    def setUp(self):
+        self.user = LibraryUser.objects.create(username='NK', password='pass')
+        for i in range(5):
+            author = Author.objects.create(name=f'Author {i}', is_popular=False)
+            book = Book.objects.create(title=f'Book {i}', author=author)
+            copy = BookCopy.objects.create(
+                    book=book, book_copy_type=BookCopy.BOOK_COPY_TYPE.PAPERBACK)
+            BorrowRecord.objects.create(borrow_date=timezone.now(),
+                                        return_date=timezone.now()+timedelta(days=14),
+                                        book_copy=copy, library_user=self.user)
+
+    def test_json_stream_matches_list_response(self):
+        # the catalog is unordered, a server-side cursor may return the rows in another order
+        def sorted_by_owl_id(books):
+            return sorted(books, key=lambda book: book['owl_id'])
+
+        expected_data = self.client.get('/', HTTP_ACCEPT='application/json').json()
+        for url in ['/?stream=1', '/?stream=json']:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                data = json.loads(b''.join(response.streaming_content))
+                self.assertEqual(sorted_by_owl_id(data), sorted_by_owl_id(expected_data))
+
+    def test_json_stream_joins_chunks_into_one_array(self):
+        books = Book.objects.select_related('author').order_by('title')
+        response = stream_response(get_book_rows(books), serialize_book_rows, 'json',
+                                   chunk_size=2)
+        content = b''.join(response.streaming_content)
+        self.assertEqual(json.loads(content),
+                         json.loads(json.dumps(BookSerializer(books, many=True).data,
+                                               default=str)))
+        response = stream_response(get_book_rows(Book.objects.none()), serialize_book_rows,
+                                   'json', chunk_size=2)
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+
+    def test_ndjson_stream_writes_one_object_per_line(self):
+        response = self.client.get('/books/available/?stream=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 0)
+        BorrowRecord.objects.all().delete()
+        response = self.client.get('/books/available/?stream=ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(sorted(json.loads(line)['title'] for line in lines),
+                         [f'Book {i}' for i in range(5)])
+
+    def test_records_stream_matches_list_response(self):
+        self.client.force_authenticate(user=self.user)
+        expected_data = self.client.get('/accounts/records/',
+                                        HTTP_ACCEPT='application/json').json()
+        response = self.client.get('/accounts/records/?stream=1')
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(sorted(data, key=lambda record: record['borrow_record_id']),
+                         sorted(expected_data, key=lambda record: record['borrow_record_id']))
+
+    def test_invalid_stream_format_is_rejected(self):
+        response = self.client.get('/?stream=xml')
+        self.assertEqual(response.status_code, 400)
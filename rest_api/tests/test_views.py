@@ -71,6 +71,19 @@ class ViewsHttpEndpointTest(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response_data_len, expected_value)
 
+    def test_search_books_api_matches_title_and_author_prefixes(self):
+        url = '/books/search/?q=rossum pyth'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['owl_id'] for book in response.json()],
+                         [str(self.normal_book.owl_id)])
+
+    def test_search_books_api_without_query_returns_no_books(self):
+        url = '/books/search/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+
     def test_borrow_book_api_successful_request(self):
         # force authenticate client
         self.client.force_authenticate(user=self.normal_user)
@@ -94,6 +107,39 @@ class ViewsHttpEndpointTest(APITestCase):
                         owl_id=self.normal_book.owl_id, username=self.normal_user.username)
         self.assertEqual(borrow_record.is_returned, True)
 
+    def test_borrow_books_api(self):
+        self.client.force_authenticate(user=self.normal_user)
+        owl_ids = [str(self.normal_book.owl_id), str(self.popular_book.owl_id)]
+        response = self.client.post('/accounts/borrow/batch/', {'owl_ids': owl_ids},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertEqual(results[owl_ids[0]], {
+            'success': False,
+            'detail': 'You have not returned this book yet, kindly return it first'})
+        self.assertEqual(results[owl_ids[1]]['success'], True)
+        self.assertEqual(results[owl_ids[1]]['borrow_record']['book_copy']['book']['owl_id'],
+                         owl_ids[1])
+        self.assertEqual(BorrowRecord.objects.all().count(), 3)
+
+    def test_borrow_books_api_rejects_invalid_owl_ids(self):
+        self.client.force_authenticate(user=self.normal_user)
+        response = self.client.post('/accounts/borrow/batch/', {'owl_ids': 'not a list'},
+                                    format='json')
+        self.assertEqual(response.status_code, 500)
+
+    def test_return_books_api(self):
+        self.client.force_authenticate(user=self.normal_user)
+        owl_ids = [str(self.normal_book.owl_id), str(self.popular_book.owl_id)]
+        response = self.client.put('/accounts/return/batch/', {'owl_ids': owl_ids},
+                                   format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            owl_ids[0]: {'success': True, 'detail': 'Book returned successfully'},
+            owl_ids[1]: {'success': False, 'detail': 'You have not borrowed this book'}})
+        self.normal_borrow_record.refresh_from_db()
+        self.assertEqual(self.normal_borrow_record.is_returned, True)
+
     @mock.patch('rest_api.services.get_next_borrow_date')
     def test_get_book_availability_api(self, mocked_func):
         self.client.force_authenticate(user=self.normal_user)
@@ -103,5 +149,142 @@ class ViewsHttpEndpointTest(APITestCase):
         url = f'/accounts/availability/{book_owl_id}'
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
-        mocked_func.assert_called_with(owl_id=f'{book_owl_id}',
-                                       username=self.normal_user.username)
+        mocked_func.assert_called_with(owl_id=f'{book_owl_id}', user_id=self.normal_user.pk)
+
+    def test_get_books_availability_api(self):
+        self.client.force_authenticate(user=self.normal_user)
+        owl_ids = [str(self.normal_book.owl_id), str(self.popular_book.owl_id)]
+        response = self.client.get(f'/accounts/availability/?owl_ids={",".join(owl_ids)}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            owl_ids[0]: 'You have not returned this book yet, kindly return it first',
+            owl_ids[1]: 'You can borrow this book immediately'})
+
+    def test_get_all_books_api_paginates_with_cursor(self):
+        url = '/?page_size=2'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['previous'], None)
+        titles = [book['title'] for book in response.data['results']]
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['next'], None)
+        titles += [book['title'] for book in response.data['results']]
+        expected_titles = list(Book.objects.order_by('title', 'owl_id')
+                                           .values_list('title', flat=True))
+        self.assertEqual(titles, expected_titles)
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['title'] for book in response.data['results']],
+                         expected_titles[:2])
+        self.assertEqual(response.data['previous'], None)
+
+    def test_get_all_books_api_pages_through_duplicate_titles(self):
+        author = Author.objects.create(name='Brian Kernighan', is_popular=False)
+        Book.objects.create(title='A Tour of C++', author=author)
+        ordered_ids = Book.objects.order_by('title', 'owl_id').values_list('owl_id', flat=True)
+        expected_ids = [str(owl_id) for owl_id in ordered_ids]
+        returned_ids = []
+        url = '/?page_size=1'
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            returned_ids += [book['owl_id'] for book in response.json()['results']]
+            url = response.data['next']
+        self.assertEqual(returned_ids, expected_ids)
+
+    def test_get_all_available_books_api_paginates_with_cursor(self):
+        url = '/books/available/?page_size=10'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['next'], None)
+        self.assertEqual(response.data['previous'], None)
+
+    def test_get_all_books_api_rejects_invalid_cursor(self):
+        url = '/?cursor=not-a-cursor'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_get_all_books_api_returns_sparse_fields(self):
+        response = self.client.get('/?fields=owl_id,title')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.json(), key=lambda book: book['title'])[1],
+                         {'owl_id': str(self.normal_book.owl_id),
+                          'title': 'An Introduction to Python'})
+
+    def test_get_all_books_api_expands_author_on_request_only(self):
+        url = '/books/author/rossum?fields=author'
+        self.assertEqual(self.client.get(url).json(),
+                         [{'author': str(self.normal_book.author_id)}])
+        self.assertEqual(self.client.get(f'{url}&expand=author').json(),
+                         [{'author': {'author_id': str(self.normal_book.author_id),
+                                      'name': 'Guido van Rossum', 'is_popular': False}}])
+
+    def test_get_all_books_api_pages_sparse_fields(self):
+        response = self.client.get('/?fields=owl_id&page_size=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.json()['results'],
+                         [{'owl_id': str(self.popular_book.owl_id)}])
+
+    def test_get_all_books_api_rejects_unknown_fields(self):
+        self.assertEqual(self.client.get('/?fields=owl_id,isbn').status_code, 400)
+        self.assertEqual(self.client.get('/?fields=').status_code, 400)
+        self.assertEqual(self.client.get('/?expand=book').status_code, 400)
+
+    def test_get_my_borrow_records_api_expands_nested_relations(self):
+        self.client.force_authenticate(user=self.normal_user)
+        url = '/accounts/records/?fields=book_copy,is_returned&expand=book_copy.book'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        book_copy = response.json()[0]['book_copy']
+        self.assertEqual(book_copy['book'], {'owl_id': str(self.normal_book.owl_id),
+                                             'author': str(self.normal_book.author_id),
+                                             'title': 'An Introduction to Python'})
+        self.assertEqual(book_copy['book_copy_type'], BookCopy.BOOK_COPY_TYPE.HARDCOVER)
+        self.assertEqual(response.json()[0]['is_returned'], False)
+
+
+# maximum number of sql queries each listing endpoint may run, independent of row count. One
+# of them is the catalog version lookup for the ETag
+QUERY_BUDGETS = {
+    '/': 2,
+    '/?page_size=5': 2,
+    '/books/available/': 2,
+    '/books/available/?page_size=5': 2,
+    '/books/author/author': 2,
+    '/books/search/?q=book': 2,
+    '/accounts/records/': 2,
+    '/?fields=owl_id,title&page_size=5': 2,
+    '/books/available/?expand=author': 2,
+    '/accounts/records/?expand=book_copy.book.author': 2,
+}
+
+
+class ViewsQueryBudgetTest(APITestCase):
+    def setUp(self):
+        d1 = timezone.now()
+        d2 = timezone.now()+timedelta(days=14)
+        self.user = LibraryUser.objects.create(username='NK', password='pass')
+        for i in range(20):
+            author = Author.objects.create(name=f'Author {i}', is_popular=False)
+            book = Book.objects.create(title=f'Book {i}', author=author)
+            copy = BookCopy.objects.create(
+                    book=book, book_copy_type=BookCopy.BOOK_COPY_TYPE.PAPERBACK)
+            if i % 2 == 0:
+                BorrowRecord.objects.create(borrow_date=d1, return_date=d2, book_copy=copy,
+                                            library_user=self.user)
+
+    def test_listing_endpoints_stay_within_query_budget(self):
+        self.client.force_authenticate(user=self.user)
+        for url, budget in QUERY_BUDGETS.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
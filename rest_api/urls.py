@@ -1,13 +1,27 @@
+from django.conf import settings
 from django.urls import path
-from . import views
-
-urlpatterns = [
-    path('', views.get_all_books_api),
-    path('books/available/', views.get_all_available_books_api),
-    path('books/author/<name>', views.get_all_books_by_author_name_api),
-    path('accounts/borrow/', views.borrow_book_api),
-    path('accounts/return/', views.return_book_api),
-    path('accounts/availability/<owl_id>', views.get_book_availability_api),
-    path('accounts/records/', views.get_my_borrow_records_api),
-    path('accounts/register/', views.LibraryUserCreate.as_view()),
-]
+
+from . import async_views, views
+
+
+# read_views provides the read endpoints, views or (API_SERVER=asgi) async_views
+def get_urlpatterns(read_views):
+    return [
+        path('', read_views.get_all_books_api),
+        path('books/available/', read_views.get_all_available_books_api),
+        path('books/author/<name>', read_views.get_all_books_by_author_name_api),
+        path('books/search/', read_views.search_books_api),
+        path('accounts/borrow/', views.borrow_book_api),
+        path('accounts/borrow/batch/', views.borrow_books_api),
+        path('accounts/return/', views.return_book_api),
+        path('accounts/return/batch/', views.return_books_api),
+        path('accounts/availability/', read_views.get_books_availability_api),
+        path('accounts/availability/<owl_id>', read_views.get_book_availability_api),
+        path('accounts/records/', read_views.get_my_borrow_records_api),
+        path('accounts/register/', views.LibraryUserCreate.as_view()),
+        path('accounts/token/', views.obtain_token_api),
+        path('cache/stats/', views.get_catalog_cache_stats_api),
+    ]
+
+
+urlpatterns = get_urlpatterns(async_views if settings.API_SERVER == 'asgi' else views)
@@ -1,57 +1,135 @@
 from rest_framework import generics
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.exceptions import APIException
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
 import rest_api.services as services
 from base_app.models import LibraryUser
 
-from .serializers import (BookSerializer, BorrowRecordSerializer,
-                          LibraryUserSerializer)
+from .authentication import create_token, get_token_max_age
+from .cache import cache_catalog_response, catalog_cache, catalog_etag, records_etag
+from .fieldsets import get_fieldset
+from .idempotency import idempotent
+from .pagination import BookKeysetPagination
+from .streaming import get_stream_format, stream_response
+from .serializers import (BOOK_SHAPE, BORROW_RECORD_SHAPE, BorrowRecordSerializer,
+                          LibraryUserSerializer, TokenObtainSerializer, get_book_rows,
+                          get_borrow_record_rows, serialize_book_rows,
+                          serialize_borrow_record_rows)
+
+# the paginator reads title and owl_id of the rows of a page for its cursors
+PAGINATION_LOOKUPS = ('title', 'owl_id')
+
+
+# returns get_rows(queryset) and serialize_rows(rows) of the representation the client asked
+# for, the full one unless it sent ?fields= or ?expand=
+def _get_book_row_functions(request, extra_lookups=()):
+    fieldset = get_fieldset(request, BOOK_SHAPE, extra_lookups=extra_lookups)
+    if fieldset is None:
+        return get_book_rows, serialize_book_rows
+    return fieldset.get_rows, fieldset.serialize_rows
+
+
+def _get_borrow_record_row_functions(request):
+    fieldset = get_fieldset(request, BORROW_RECORD_SHAPE)
+    if fieldset is None:
+        return get_borrow_record_rows, serialize_borrow_record_rows
+    return fieldset.get_rows, fieldset.serialize_rows
+
+
+# returns a stream or a cursor paginated page when the client asks for one, else the full
+# list
+def _book_list_response(request, books):
+    stream_format = get_stream_format(request)
+    if stream_format is not None:
+        get_rows, serialize_rows = _get_book_row_functions(request)
+        return stream_response(get_rows(books), serialize_rows, stream_format)
+    paginator = BookKeysetPagination()
+    if paginator.is_requested(request) is False:
+        get_rows, serialize_rows = _get_book_row_functions(request)
+        return Response(serialize_rows(get_rows(books)))
+    get_rows, serialize_rows = _get_book_row_functions(request, PAGINATION_LOOKUPS)
+    page = paginator.paginate_queryset(get_rows(books), request)
+    return paginator.get_paginated_response(serialize_rows(page))
 
 
 @api_view(['GET'])
+@catalog_etag
+@cache_catalog_response
 def get_all_books_api(request):
     books = services.get_all_books()
-    book_serializer = BookSerializer(books, many=True)
-    return Response(book_serializer.data)
+    return _book_list_response(request, books)
 
 
 @api_view(['GET'])
+@catalog_etag
+@cache_catalog_response
 def get_all_available_books_api(request):
     books = services.get_all_available_books()
-    book_serializer = BookSerializer(books, many=True)
-    return Response(book_serializer.data)
+    return _book_list_response(request, books)
 
 
 @api_view(['GET'])
+@catalog_etag
+@cache_catalog_response
 def get_all_books_by_author_name_api(request, name):
     books = services.get_all_books_by_similar_author_name(name)
-    book_serializer = BookSerializer(books, many=True)
-    return Response(book_serializer.data)
+    get_rows, serialize_rows = _get_book_row_functions(request)
+    return Response(serialize_rows(get_rows(books)))
+
+
+@api_view(['GET'])
+@catalog_etag
+@cache_catalog_response
+def search_books_api(request):
+    search_text = request.query_params.get('q', '')
+    books = services.search_books(search_text)
+    get_rows, serialize_rows = _get_book_row_functions(request)
+    return Response(serialize_rows(get_rows(books)))
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def borrow_book_api(request):
-    username = request.user.username
+    user_id = request.user.pk
     owl_id = request.data.get('owl_id', None)
     try:
-        borrow_record = services.borrow_book(owl_id=owl_id, username=username)
+        borrow_record = services.borrow_book(owl_id=owl_id, user_id=user_id)
         borrow_record_serializer = BorrowRecordSerializer(borrow_record, many=False)
         return Response(borrow_record_serializer.data)
     except Exception as e:
         raise APIException(detail=e)
 
 
+# {"owl_ids": [...]}, responds with {owl_id: {"success": true, "borrow_record": {...}}} or
+# {owl_id: {"success": false, "detail": reason}} per book
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def borrow_books_api(request):
+    user_id = request.user.pk
+    owl_ids = request.data.get('owl_ids', None)
+    try:
+        results = services.borrow_books(owl_ids=owl_ids, user_id=user_id)
+        for result in results.values():
+            if result['success'] is True:
+                result['borrow_record'] = BorrowRecordSerializer(result['borrow_record'],
+                                                                 many=False).data
+        return Response(results)
+    except Exception as e:
+        raise APIException(detail=e)
+
+
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def return_book_api(request):
-    username = request.user.username
+    user_id = request.user.pk
     owl_id = request.data.get('owl_id', None)
     try:
-        success = services.return_book(owl_id=owl_id, username=username)
+        success = services.return_book(owl_id=owl_id, user_id=user_id)
         if success is True:
             return Response('Book returned successfully')
         else:
@@ -60,24 +138,73 @@ def return_book_api(request):
         raise APIException(detail=e)
 
 
+# {"owl_ids": [...]}, responds with {owl_id: {"success": bool, "detail": message}}
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def return_books_api(request):
+    user_id = request.user.pk
+    owl_ids = request.data.get('owl_ids', None)
+    try:
+        results = services.return_books(owl_ids=owl_ids, user_id=user_id)
+        return Response(results)
+    except Exception as e:
+        raise APIException(detail=e)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_book_availability_api(request, owl_id):
-    username = request.user.username
+    user_id = request.user.pk
     try:
-        info = services.get_next_borrow_date(owl_id=owl_id, username=username)
+        info = services.get_next_borrow_date(owl_id=owl_id, user_id=user_id)
         return Response(info)
     except Exception as e:
         raise APIException(detail=e)
 
 
+# ?owl_ids=<owl_id>,<owl_id>,...
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+def get_books_availability_api(request):
+    user_id = request.user.pk
+    owl_ids = [owl_id for owl_id in request.query_params.get('owl_ids', '').split(',')
+               if owl_id != '']
+    try:
+        info = services.get_next_borrow_dates(owl_ids=owl_ids, user_id=user_id)
+        return Response(info)
+    except Exception as e:
+        raise APIException(detail=e)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@records_etag
 def get_my_borrow_records_api(request):
-    username = request.user.username
-    borrow_records = services.get_my_borrow_records(username=username)
-    borrow_records_serializer = BorrowRecordSerializer(borrow_records, many=True)
-    return Response(borrow_records_serializer.data)
+    user_id = request.user.pk
+    get_rows, serialize_rows = _get_borrow_record_row_functions(request)
+    borrow_record_rows = get_rows(services.get_my_borrow_records(user_id=user_id))
+    stream_format = get_stream_format(request)
+    if stream_format is not None:
+        return stream_response(borrow_record_rows, serialize_rows, stream_format)
+    return Response(serialize_rows(borrow_record_rows))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_catalog_cache_stats_api(request):
+    return Response(catalog_cache.stats())
+
+
+# {"username": ..., "password": ...}, responds with a signed token for the Authorization:
+# Bearer <token> header and the number of seconds it is valid for
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def obtain_token_api(request):
+    serializer = TokenObtainSerializer(data=request.data, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    return Response({'token': create_token(serializer.validated_data['user']),
+                     'expires_in': get_token_max_age()})
 
 
 # class based library user create view, temporary untested code